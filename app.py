@@ -1,14 +1,11 @@
 import re
 import math
 import unicodedata
+import os
 import time
 from typing import Any, Dict, List, Optional
-import pandas as pd
-import numpy as np
 import streamlit as st
-import fair_value_calc_y4 as fv  # 計算エンジン
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import warmup  # 重いモジュールの先読み（計算エンジン・plotly などはログイン後に使う）
 
 # ==========================================
 # 🔑 パスワード設定
@@ -20,6 +17,12 @@ ADMIN_CODE = "777777"
 # UI設定
 # ==========================================
 st.set_page_config(page_title="フヤセルブレイン - AI理論株価分析ツール", page_icon="📈", layout="wide")
+LIVE_TABLE_INTERVAL = 0.5  # 分析中の途中経過の表を描き直す最短間隔（秒）
+SCREENER_MAX_ROWS = 500  # スクリーナーの表に出す最大件数
+SCREENER_MC_MAX = 10000  # 時価総額スライダーの上限（億円。上限にした場合は上限なし）
+
+# ログイン画面を出している間に計算エンジン・plotly などを別スレッドで読み込み、先回り更新のワーカーも起動する
+warmup.start()
 
 hide_streamlit_style = """
             <style>
@@ -104,126 +107,37 @@ def check_password():
 
 check_password()
 
+# ここから先はログイン後だけ（先読みが済んでいれば読み込み待ちは無い）
+import pandas as pd
+import fair_value_calc_y4 as fv  # 計算エンジン
+import screener  # 全銘柄スクリーナー
+import scheduler  # 先回り更新のワーカー
+from charts import build_wall_chart, clear_chart_cache, get_chart_cache_stats
+from result_table import (
+    bundle_to_df, fmt_yen_values, fmt_pct_values, fmt_market_cap_values, fmt_big_prob_values,
+    highlight_errors, highlight_rank_color,
+)
+
 # -----------------------------
 # 📈 チャート描画関数（スマホ対策・用語修正済み）
 # -----------------------------
-def draw_wall_chart(ticker_data: Dict[str, Any]):
-    hist = ticker_data.get("hist_data")
-    if hist is None or hist.empty:
+def draw_wall_chart(ticker_data: fv.StockResult):
+    fig = build_wall_chart(ticker_data)
+    if fig is None:
         st.warning("チャートデータがありません（取得失敗）")
         return
-
-    name = ticker_data.get("name", "Unknown")
-    code = ticker_data.get("code", "----")
-    current_price = ticker_data.get("price", 0)
-
-    hist = hist.reset_index()
-    hist['Date'] = pd.to_datetime(hist.iloc[:, 0]).dt.tz_localize(None)
-
-    # --- 1. 価格帯別出来高の集計 ---
-    bins = 50
-    p_min = min(hist['Close'].min(), current_price * 0.9)
-    p_max = max(hist['Close'].max(), current_price * 1.1)
-    bin_edges = np.linspace(p_min, p_max, bins)
-    hist['bin'] = pd.cut(hist['Close'], bins=bin_edges)
-    vol_profile = hist.groupby('bin', observed=False)['Volume'].sum()
-
-    # --- 2. 抵抗線・支持線のロジック ---
-    upper_candidates = []
-    lower_candidates = []
-
-    for interval, volume in vol_profile.items():
-        mid_price = interval.mid
-        if volume == 0: continue
-        
-        if mid_price > current_price:
-            upper_candidates.append({'vol': volume, 'price': mid_price})
-        else:
-            lower_candidates.append({'vol': volume, 'price': mid_price})
-
-    # 赤（上値抵抗線）：出来高最大 > 価格低い方
-    if upper_candidates:
-        best_red = sorted(upper_candidates, key=lambda x: (-x['vol'], x['price']))[0]
-        resistance_price = best_red['price']
-    else:
-        resistance_price = hist['High'].max()
-
-    # 青（下値支持線）：出来高最大 > 価格高い方
-    if lower_candidates:
-        best_blue = sorted(lower_candidates, key=lambda x: (-x['vol'], -x['price']))[0]
-        support_price = best_blue['price']
-    else:
-        support_price = hist['Low'].min()
-
-    # --- バーの色分け ---
-    bar_colors = []
-    for interval in vol_profile.index:
-        if interval.mid > current_price:
-            bar_colors.append('rgba(255, 82, 82, 0.4)')
-        else:
-            bar_colors.append('rgba(33, 150, 243, 0.4)')
-
-    fig = make_subplots(
-        rows=1, cols=2, 
-        shared_yaxes=True, 
-        column_widths=[0.75, 0.25], 
-        horizontal_spacing=0.02,
-        subplot_titles=("📉 トレンド分析", "🧱 需給の壁")
-    )
-
-    # 1. ローソク足
-    fig.add_trace(go.Candlestick(
-        x=hist['Date'], open=hist['Open'], high=hist['High'], low=hist['Low'], close=hist['Close'], 
-        name='株価'
-    ), row=1, col=1)
-
-    # 2. 出来高プロファイル
-    fig.add_trace(go.Bar(
-        x=vol_profile.values, y=[i.mid for i in vol_profile.index], 
-        orientation='h', marker_color=bar_colors, name='出来高'
-    ), row=1, col=2)
-
-    # --- ライン描画 ---
-    fig.add_hline(
-        y=resistance_price, 
-        line_color="#ef4444", 
-        line_width=2,
-        annotation_text="🟥 上値抵抗線（抜ければ激アツ）", 
-        annotation_position="top left",
-        annotation_font_color="#ef4444",
-        row=1, col=1
-    )
-
-    # ★修正ポイント：文言を「下値支持線」に変更
-    fig.add_hline(
-        y=support_price, 
-        line_color="#3b82f6", 
-        line_width=2,
-        annotation_text="🟦 下値支持線（割れれば即逃げ）", 
-        annotation_position="bottom left",
-        annotation_font_color="#3b82f6",
-        row=1, col=1
-    )
-
-    # レイアウトで「強制ホワイト化」を指定
-    fig.update_layout(
-        title=f"📊 {name} ({code})", 
-        height=450, 
-        showlegend=False, 
-        xaxis_rangeslider_visible=False, 
-        margin=dict(l=10, r=10, t=60, b=10), 
-        dragmode=False,
-        template="plotly_white",  # ベースを白テーマに
-        paper_bgcolor='white',    # グラフの外側の背景を白に
-        plot_bgcolor='white',     # グラフの内側の背景を白に
-        font=dict(color='black')  # 文字色を黒に強制
-    )
-    fig.update_xaxes(fixedrange=True) 
-    fig.update_yaxes(fixedrange=True)
-
     # theme=None を追加してStreamlitの自動テーマ適用を無効化
     st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False, 'staticPlot': False, 'scrollZoom': False}, theme=None)
 
+def draw_live_table(placeholder, partial: Dict[str, Any], codes: List[str]):
+    """分析中の途中経過の表（出来ている銘柄だけ、入力順）"""
+    done_codes = [c for c in codes if c in partial]
+    live_df = bundle_to_df(partial, done_codes).drop(columns=["詳細"])
+    placeholder.dataframe(
+        live_df.style.map(highlight_errors, subset=["銘柄名"]).map(highlight_rank_color, subset=["ランク"]),
+        use_container_width=True, hide_index=True
+    )
+
 # ==========================================
 # メイン処理
 # ==========================================
@@ -242,180 +156,6 @@ def sanitize_codes(raw_codes: List[str]) -> List[str]:
         if c not in uniq: uniq.append(c)
     return uniq
 
-# ★フォーマット関数
-def fmt_yen(x):
-    if x is None or pd.isna(x) or str(x).lower() == 'nan': return "—"
-    try: return f"{float(x):,.0f} 円"
-    except: return "—"
-def fmt_pct(x):
-    if x is None or pd.isna(x) or str(x).lower() == 'nan': return "—"
-    try: return f"{float(x):.2f}%"
-    except: return "—"
-def fmt_market_cap(x):
-    if x is None or pd.isna(x) or str(x).lower() == 'nan': return "—"
-    try:
-        v = float(x)
-        if v >= 1e12: return f"{v/1e12:.2f} 兆円"
-        elif v >= 1e8: return f"{v/1e8:.0f} 億円"
-        else: return f"{v:,.0f} 円"
-    except: return "—"
-def fmt_big_prob(x):
-    if x is None or pd.isna(x) or str(x).lower() == 'nan': return "—"
-    try:
-        v = float(x)
-        if v >= 80: return f"🔥 {v:.0f}%" 
-        if v >= 60: return f"⚡ {v:.0f}%" 
-        if v >= 40: return f"👀 {v:.0f}%" 
-        return f"{v:.0f}%"
-    except: return "—"
-def calc_rating_from_upside(upside_pct):
-    if upside_pct is None or pd.isna(upside_pct): return 0
-    if upside_pct >= 50: return 5
-    if upside_pct >= 30: return 4
-    if upside_pct >= 15: return 3
-    if upside_pct >= 5: return 2
-    if upside_pct >= 0: return 1
-    return 0
-def to_stars(n):
-    n = max(0, min(5, int(n or 0)))
-    return "★" * n + "☆" * (5 - n)
-def highlight_errors(val):
-    if val == "存在しない銘柄" or val == "エラー":
-        return 'color: #ff4b4b; font-weight: bold;'
-    return ''
-
-# ★ランクの色分け関数
-def highlight_rank_color(val):
-    if val == "SSS":
-        return 'background-color: #FFD700; color: #000000; font-weight: bold;'
-    elif val == "SS":
-        return 'background-color: #FF4500; color: #ffffff; font-weight: bold;'
-    elif val == "S":
-        return 'background-color: #FF69B4; color: #ffffff; font-weight: bold;'
-    elif val == "A":
-        return 'background-color: #22c55e; color: #ffffff; font-weight: bold;'
-    elif val == "B":
-        return 'background-color: #3b82f6; color: #ffffff; font-weight: bold;'
-    elif val == "C":
-        return 'background-color: #94a3b8; color: #ffffff; font-weight: bold;'
-    elif val in ["D", "E"]:
-        return 'background-color: #a855f7; color: #ffffff; font-weight: bold;'
-    return ''
-
-# ★ランク付け用のスコア計算関数
-def calculate_score_and_rank(row):
-    score = 0
-    up = row.get('upside_pct_num', 0)
-    if pd.isna(up): up = 0
-    if up >= 50: score += 40
-    elif up >= 30: score += 30
-    elif up >= 15: score += 20
-    elif up > 0: score += 10
-    
-    prob = row.get('prob_num', 0)
-    if pd.isna(prob): prob = 0
-    if prob >= 80: score += 30
-    elif prob >= 60: score += 20
-    elif prob >= 40: score += 10
-    
-    growth = row.get('growth_num', 0)
-    if pd.isna(growth): growth = 0
-    if growth >= 30: score += 20
-    elif growth >= 10: score += 10
-    
-    weather = row.get('weather', '')
-    if weather == '☀': score += 10
-    elif weather == '☁': score += 5
-    
-    if score >= 95: return "SSS"
-    if score >= 90: return "SS"
-    if score >= 85: return "S"
-    if score >= 75: return "A"
-    if score >= 60: return "B"
-    if score >= 45: return "C"
-    if score >= 30: return "D"
-    return "E"
-
-def bundle_to_df(bundle: Any, codes: List[str]) -> pd.DataFrame:
-    rows: List[Dict[str, Any]] = []
-    if isinstance(bundle, dict):
-        for code in codes:
-            v = bundle.get(code)
-            if isinstance(v, dict):
-                if v.get("note") == "データ取得不可(Yahoo拒否)" or v.get("name") == "エラー" or v.get("name") == "計算エラー":
-                     v["name"] = "存在しない銘柄"
-                     v["note"] = "—"
-                     v["volume_wall"] = "—"
-                     v["signal_icon"] = "—"
-                     v["weather"] = "—"
-                if v.get("note") == "ETF/REIT対象外":
-                     v["note"] = "ETF/REITのため対象外"
-                row = {"ticker": code, **v}
-            else:
-                row = {"ticker": code, "name": "存在しない銘柄", "note": "—", "value": v}
-            rows.append(row)
-    else:
-        rows.append({"ticker": ",".join(codes), "name": "存在しない銘柄", "note": "—", "value": bundle})
-
-    df = pd.DataFrame(rows)
-    cols = ["name", "weather", "price", "fair_value", "upside_pct", "dividend", "dividend_amount", "growth", "market_cap", "big_prob", "note", "signal_icon", "volume_wall"]
-    for col in cols:
-        if col not in df.columns: df[col] = None
-
-    def _as_float(x):
-        try: return float(x)
-        except: return None
-        
-    df["price_num"] = df["price"].apply(_as_float)
-    df["fair_value_num"] = df["fair_value"].apply(_as_float)
-    df["upside_pct_num"] = df["upside_pct"].apply(_as_float)
-    df["upside_yen_num"] = df["fair_value_num"] - df["price_num"]
-    df["div_num"] = df["dividend"].apply(_as_float)
-    df["div_amount_num"] = df["dividend_amount"].apply(_as_float)
-    df["growth_num"] = df["growth"].apply(_as_float)
-    df["mc_num"] = df["market_cap"].apply(_as_float)
-    df["prob_num"] = df["big_prob"].apply(_as_float)
-    
-    df["rating"] = df["upside_pct_num"].apply(calc_rating_from_upside)
-    df["stars"] = df["rating"].apply(to_stars)
-    
-    error_mask = df["name"] == "存在しない銘柄"
-    df.loc[error_mask, "stars"] = "—"
-    df.loc[error_mask, "price"] = None
-    df.loc[error_mask, "fair_value"] = None 
-    df.loc[error_mask, "note"] = "—"
-
-    df["ランク"] = df.apply(calculate_score_and_rank, axis=1)
-    df.loc[error_mask, "ランク"] = "—"
-    
-    df["根拠【グレアム数】"] = df["note"].fillna("—")
-
-    df["証券コード"] = df["ticker"]
-    df["銘柄名"] = df["name"].fillna("—")
-    df["業績"] = df["weather"].fillna("—")
-    df["現在値"] = df["price"].apply(fmt_yen)
-    df["理論株価"] = df["fair_value"].apply(fmt_yen)
-    df["上昇余地"] = df["upside_pct_num"].apply(fmt_pct)
-    df["評価"] = df["stars"]
-    df["売買"] = df["signal_icon"].fillna("—")
-    df["需給の壁"] = df["volume_wall"].fillna("—")
-    df["配当利回り"] = df["div_num"].apply(fmt_pct)
-    df["年間配当"] = df["div_amount_num"].apply(fmt_yen)
-    df["事業の勢い"] = df["growth_num"].apply(fmt_pct)
-    df["時価総額"] = df["mc_num"].apply(fmt_market_cap)
-    df["大口介入"] = df["prob_num"].apply(fmt_big_prob)
-
-    df.index = df.index + 1
-    df["詳細"] = False
-    
-    show_cols = [
-        "ランク", "証券コード", "銘柄名", "現在値", "理論株価", "上昇余地", "評価", "売買", "需給の壁",
-        "詳細", 
-        "配当利回り", "年間配当", "事業の勢い", "業績", "時価総額", "大口介入", "根拠【グレアム数】"
-    ]
-    
-    return df[show_cols]
-
 # ==========================================
 # メイン画面構築
 # ==========================================
@@ -481,10 +221,29 @@ if run_btn:
     if not codes:
         st.error("証券コードが入力されていません。")
         st.stop()
+    scheduler.record_request(codes)
 
     with st.spinner(f"🚀 高速分析中..."):
         try:
-            bundle = fv.calc_fuyaseru_bundle(codes)
+            # 出来た銘柄から表に追加していく（並びは入力順のまま差し込む）
+            progress_bar = st.progress(0) if len(codes) > 1 else None
+            live_table = st.empty()
+            partial: Dict[str, Any] = {}
+            last_draw = 0.0
+            # 速報（現在値・理論株価・上昇余地）と本計算（株価履歴を使う列も埋める）を同時に走らせ、
+            # 届いた方から表を更新する（速報の後に本計算が届くと置き換わる）
+            done = 0
+            for code, result, final in fv.iter_quick_and_full(codes):
+                partial[code] = result
+                if final:
+                    done += 1
+                    if progress_bar: progress_bar.progress(done / len(codes))
+                if done < len(codes) and time.time() - last_draw >= LIVE_TABLE_INTERVAL:
+                    draw_live_table(live_table, partial, codes)
+                    last_draw = time.time()
+            live_table.empty()
+            if progress_bar: progress_bar.empty()
+            bundle = {code: partial[code] for code in codes}
             st.session_state["analysis_bundle"] = bundle
             st.session_state["analysis_codes"] = codes
         except Exception as e:
@@ -531,9 +290,9 @@ if st.session_state["analysis_bundle"]:
             selected_code = row["証券コード"]
             ticker_data = bundle.get(selected_code)
             
-            if ticker_data and ticker_data.get("name") != "存在しない銘柄" and ticker_data.get("hist_data") is not None:
+            if ticker_data and not ticker_data.is_missing and ticker_data.has_history:
                 st.divider()
-                st.markdown(f"### 📉 詳細分析チャート：{ticker_data.get('name')}")
+                st.markdown(f"### 📉 詳細分析チャート：{ticker_data.name}")
                 draw_wall_chart(ticker_data)
 
     st.info("""
@@ -542,6 +301,55 @@ if st.session_state["analysis_bundle"]:
     ただし、**「今は赤字だが来期は黒字予想」の場合は、自動的に『予想EPS』を使って理論株価を算出**しています。
     """)
 
+# -----------------------------
+# 🔭 全銘柄スクリーナー
+# -----------------------------
+st.divider()
+st.subheader("🔭 全銘柄スクリーナー")
+screener_status = screener.get_status()
+if screener_status["running"]:
+    st.progress(screener_status["done"] / max(1, screener_status["total"]), text=f"全銘柄を計算中... {screener_status['done']:,} / {screener_status['total']:,}")
+screener_df = screener.load_results()
+if screener_df is None or screener_df.empty:
+    st.info("全銘柄の計算結果はまだありません。（管理者メニューから計算を開始できます）")
+else:
+    f1, f2, f3, f4 = st.columns(4)
+    min_rank = f1.selectbox("ランク（以上）", ["指定なし"] + screener.RANKS, index=0)
+    max_pbr = f2.number_input("PBR（未満・0で指定なし）", min_value=0.0, max_value=10.0, value=0.0, step=0.1)
+    mc_range = f3.slider("時価総額（億円）", 0, SCREENER_MC_MAX, (0, SCREENER_MC_MAX), step=50)
+    min_upside = f4.number_input("上昇余地（%以上）", value=None, step=5.0)
+
+    market_cap_oku = None
+    if mc_range != (0, SCREENER_MC_MAX):
+        market_cap_oku = (mc_range[0], mc_range[1] if mc_range[1] < SCREENER_MC_MAX else float("inf"))
+    hit_df = screener.filter_results(
+        screener_df,
+        min_rank=None if min_rank == "指定なし" else min_rank,
+        max_pbr=max_pbr or None,
+        market_cap_oku=market_cap_oku,
+        min_upside=min_upside,
+    )
+    st.caption(f"該当 {len(hit_df):,} 銘柄 / 全 {len(screener_df):,} 銘柄（スコア順・上位 {SCREENER_MAX_ROWS} 件まで表示）")
+
+    hit_df = hit_df.head(SCREENER_MAX_ROWS)
+    view = pd.DataFrame({
+        "ランク": hit_df["rank"],
+        "証券コード": hit_df["code"],
+        "銘柄名": hit_df["name"],
+        "現在値": fmt_yen_values(hit_df["price"].to_numpy(dtype=float)),
+        "理論株価": fmt_yen_values(hit_df["fair_value"].to_numpy(dtype=float)),
+        "上昇余地": fmt_pct_values(hit_df["upside_pct"].to_numpy(dtype=float)),
+        "PBR": hit_df["pbr"].map(lambda x: "—" if pd.isna(x) else f"{x:.2f}倍"),
+        "時価総額": fmt_market_cap_values(hit_df["market_cap"].to_numpy(dtype=float)),
+        "配当利回り": fmt_pct_values(hit_df["dividend"].to_numpy(dtype=float)),
+        "事業の勢い": fmt_pct_values(hit_df["growth"].to_numpy(dtype=float)),
+        "大口介入": fmt_big_prob_values(hit_df["big_prob"].to_numpy(dtype=float)),
+        "売買": hit_df["signal_icon"],
+        "需給の壁": hit_df["volume_wall"],
+        "業績": hit_df["weather"],
+    })
+    st.dataframe(view.style.map(highlight_rank_color, subset=["ランク"]), use_container_width=True, hide_index=True)
+
 # -----------------------------
 # ★豆知識コーナー
 # -----------------------------
@@ -607,8 +415,125 @@ with st.expander("🔧 管理者専用メニュー"):
     admin_input = st.text_input("管理者コード", type="password", key="admin_pass_bottom")
     if admin_input == ADMIN_CODE:
         st.success("認証OK")
+
+        cache_stats = fv.get_cache_stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("キャッシュ銘柄数", cache_stats["entries"])
+        c2.metric("ヒット", cache_stats["hits"])
+        c3.metric("ミス", cache_stats["misses"])
+        hit_rate = cache_stats["hit_rate"]
+        c4.metric("ヒット率", f"{hit_rate * 100:.1f}%" if hit_rate is not None else "—")
+        c5, c6, c7, _ = st.columns(4)
+        c5.metric("使用量", f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB", help=f"上限 {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB（FUYASERU_RESULT_CACHE_MB）")
+        c6.metric("追い出し", cache_stats["evictions"])
+        c7.metric("期限切れ", cache_stats["expired"])
+
         if st.button("🗑️ キャッシュ全削除", type="primary"):
             st.cache_data.clear()
+            fv.clear_cache()
+            clear_chart_cache()
             st.success("削除完了！再読み込みします...")
             time.sleep(1)
             st.rerun()
+
+        chart_stats = get_chart_cache_stats()
+        st.caption(f"📈 チャート：{chart_stats['entries']} 枚保持 / ヒット {chart_stats['hits']} / ミス {chart_stats['misses']}")
+        flight_stats = fv.get_singleflight_stats()
+        st.caption(f"🤝 同時取得の合流：{flight_stats['shared']} 件（取得 {flight_stats['leaders']} 件 / 取得中 {flight_stats['in_flight']} 件）")
+        missing_stats = fv.get_missing_stats()
+        st.caption(
+            f"🚫 存在しない銘柄：{missing_stats['entries']} 件を記憶（{missing_stats['ttl'] / 3600:.0f} 時間）/ "
+            f"取得せずに判定 {missing_stats['hits'] + missing_stats['unlisted']} 件（うち上場銘柄一覧に無い {missing_stats['unlisted']} 件）"
+        )
+
+        fund_stats = fv.get_fundamentals_stats()
+        st.caption(f"📑 財務データ：{fund_stats['entries']} 銘柄保存 / ヒット {fund_stats['hits']} / ミス {fund_stats['misses']}（有効期限 {fv.FUNDAMENTALS_TTL / 86400:.0f} 日）")
+        if st.button("🗑️ 財務データの保存データ削除"):
+            fv.local_store.clear_fundamentals()
+            st.success("削除完了！次回の分析で財務データを取り直します。")
+
+        master_stats = fv.master.stats()
+        st.caption(
+            f"🏷️ 上場銘柄一覧：{master_stats['entries']:,} 銘柄（うち ETF/REIT など {master_stats['funds']:,}）/ {fv.master.MASTER_FILE}"
+            + ("" if master_stats["loaded_at"] else "（ファイルが無いため銘柄名は Yahoo!ファイナンスから取得）")
+        )
+        if st.button("🔄 上場銘柄一覧を読み直す"):
+            st.success(f"{fv.master.reload():,} 銘柄を読み込みました。")
+
+        last_run = fv.metrics.last_run()
+        if last_run is not None:
+            elapsed = (last_run.finished_at or time.time()) - last_run.started_at
+            st.caption(
+                f"⏱️ 直近の分析：{last_run.total} 銘柄（キャッシュ {last_run.cache_hits} 件 / 合流 {last_run.shared} 件 / 存在しない {last_run.rejected} 件）/ {elapsed:.1f} 秒"
+                + ("" if last_run.finished_at else "（実行中）")
+            )
+            timing = last_run.summary()
+            if not timing.empty:
+                st.dataframe(
+                    timing.rename(columns={"scope": "単位", "stage": "段階", "count": "件数", "sum": "合計(秒)", "p50": "p50(秒)", "p95": "p95(秒)", "max": "最大(秒)"}),
+                    use_container_width=True, hide_index=True,
+                )
+            d1, d2 = st.columns(2)
+            d1.download_button("⬇️ 段階別の時間（CSV）", fv.metrics.export_csv(), file_name="fuyaseru_timings.csv", mime="text/csv")
+            d2.download_button("⬇️ 段階別の時間（JSON）", fv.metrics.export_json(), file_name="fuyaseru_timings.json", mime="application/json")
+
+        prefetch = scheduler.get_status()
+        next_run = prefetch["next_run_at"]
+        st.caption(
+            f"⏰ 先回り更新：毎{'平日' if scheduler.PREFETCH_WEEKDAYS_ONLY else '日'} {', '.join(prefetch['times']) or '—'}（日本時間）"
+            + (f" / 次回 {time.strftime('%m/%d %H:%M', time.localtime(next_run))}" if next_run else "")
+            + f" / 対象 {len(scheduler.prefetch_codes())} 銘柄"
+        )
+        if prefetch["current"] is not None:
+            current = prefetch["current"]
+            st.progress(current["done"] / max(1, current["codes"]), text=f"先回り更新中... {current['done']} / {current['codes']}")
+        if prefetch["history"]:
+            st.dataframe(pd.DataFrame([{
+                "開始": time.strftime("%m/%d %H:%M", time.localtime(h["started_at"])),
+                "銘柄数": h["codes"],
+                "失敗": h["failed"],
+                "所要時間(秒)": round(h["duration"], 1),
+                "エラー": h["error"] or "",
+            } for h in reversed(prefetch["history"])]), use_container_width=True, hide_index=True)
+        if st.button("⏰ 今すぐ先回り更新", disabled=prefetch["running"]):
+            if scheduler.run_now():
+                st.success("バックグラウンドで更新を開始しました。")
+
+        watchlists = scheduler.load_watchlists()
+        if watchlists:
+            st.caption("📋 ウォッチリスト：" + " / ".join(f"{name}（{len(codes)}銘柄）" for name, codes in watchlists.items()))
+        w1, w2 = st.columns([1, 3])
+        watchlist_name = w1.text_input("ウォッチリスト名", key="watchlist_name")
+        watchlist_codes = w2.text_input("証券コード（空で保存すると削除）", key="watchlist_codes")
+        if st.button("📋 ウォッチリストを保存") and watchlist_name.strip():
+            scheduler.save_watchlist(watchlist_name.strip(), sanitize_codes(watchlist_codes.split()))
+            st.success("保存しました。")
+
+        universe_size = len(screener.load_universe())
+        screener_age = fv.local_store.screener_age()
+        st.caption(
+            f"🔭 全銘柄スクリーナー：対象 {universe_size:,} 銘柄（{screener.UNIVERSE_FILE if os.path.exists(screener.UNIVERSE_FILE) else fv.master.MASTER_FILE}）"
+            + (f" / 前回の計算から {screener_age / 3600:.1f} 時間" if screener_age is not None else " / 未計算")
+        )
+        if screener_status["error"]:
+            st.error(f"前回のスクリーナー計算でエラー: {screener_status['error']}")
+        if st.button("🔭 全銘柄スクリーナーを計算", disabled=screener_status["running"] or universe_size == 0):
+            if screener.start_screening():
+                st.success("バックグラウンドで計算を開始しました。（ページを再読み込みすると進み具合が表示されます）")
+
+        store_stats = fv.local_store.ohlcv_stats()
+        st.caption(f"📦 保存済み株価履歴：{store_stats['tickers']} 銘柄 / {store_stats['bytes'] / 1024 / 1024:.1f} MB")
+        if st.button("🗑️ 株価履歴の保存データ削除"):
+            fv.local_store.clear_ohlcv()
+            st.success("削除完了！次回の分析で6ヶ月分を取り直します。")
+
+        warmup_report = warmup.get_report()
+        st.caption(
+            f"🚀 起動時の先読み：{warmup_report['total']:.2f} 秒"
+            + ("（読み込み中）" if warmup_report["running"] else "")
+        )
+        if warmup_report["modules"]:
+            st.dataframe(pd.DataFrame([{
+                "モジュール": row["module"], "秒": round(row["seconds"], 3),
+                "備考": "読み込み済み" if row["loaded"] else (row["error"] or ""),
+            } for row in warmup_report["modules"]]), use_container_width=True, hide_index=True)
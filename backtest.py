@@ -0,0 +1,365 @@
+"""売買シグナル（signal_icon）とランクのバックテスト。
+
+全銘柄・全営業日のシグナルとランクを (日付 × 銘柄) の NumPy パネルでまとめて計算し、
+その日の終値で買って h 営業日後の終値で売った時のリターンを、シグナル別・ランク別に集計する。
+
+    python backtest.py                                  # ローカル保存の日足（分析したことのある銘柄）
+    python backtest.py --universe universe.csv          # 上場銘柄一覧の銘柄（ローカル保存にある分だけ）
+    python backtest.py --universe universe.csv --start 2019-01-01   # 保存に無い期間の日足を先に取得してから
+    python backtest.py --synthetic 4000 --years 5       # 合成データ（速度の確認用）
+    python backtest.py --horizons 5 20 60 --out bt.csv
+
+注意:
+- シグナルは各日までの日足だけで計算する（calc_signal_panel と同じ RSI・75日線・ボリンジャーバンド）。
+  窓は日付ではなく各銘柄自身の足で数える（売買停止の日をまたいでも、その銘柄の日足で計算した値と同じ）。
+- ランクに使う財務データ（EPS・BPS・ROE など）は保存済みの最新値を全期間に使う（過去の値は持っていないため先読みが入る）。
+  日々変わるのは株価から決まる上昇余地・PBR・時価総額と、出来高比（当日 ÷ 直近63日平均）。
+- アプリ・batch.py が保存する日足は初回に取った6ヶ月分＋その後の差分だけ。それより長い期間で検証する時は --start を付ける。
+- 保有期間が重なるリターンも全部数えるので、件数は独立な試行の数ではない。
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import fair_value_calc_y4 as fv
+import local_store
+from result_table import RANKS, calc_rank_scores, score_to_rank
+
+HORIZONS = [5, 20, 60]            # 何営業日後のリターンを見るか
+VOLUME_AVG_WINDOW = 63            # 出来高比の分母（yfinance の averageVolume と同じく約3ヶ月）
+SIGNAL_LABELS = fv.SIGNAL_ICONS + ["↓✖"]
+START_SLACK_DAYS = 7              # --start の日からこの日数以内に最初の足があれば取り直さない
+
+# ==========================================
+# 🧱 パネル（日付 × 銘柄）
+# ==========================================
+def build_panels(hists: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
+    """銘柄ごとの日足を日付で揃えて終値・出来高のパネルにする（その日に足が無い所は NaN）。
+    present はその銘柄自身の足がある所（終値が NaN の足も含む）。休場・売買停止の日は False。"""
+    codes, closes, volumes = [], {}, {}
+    for code, hist in hists.items():
+        if hist is None or hist.empty: continue
+        index = pd.DatetimeIndex(hist.index)
+        if index.tz is not None: index = index.tz_localize(None)
+        index = index.normalize()
+        closes[code] = pd.Series(hist["Close"].to_numpy(dtype=float), index=index)
+        volumes[code] = pd.Series(hist["Volume"].to_numpy(dtype=float), index=index)
+        codes.append(code)
+    if not codes:
+        empty = np.empty((0, 0))
+        return {"dates": pd.DatetimeIndex([]), "codes": [], "close": empty, "volume": empty, "present": empty.astype(bool)}
+    close = pd.concat(closes, axis=1).sort_index()
+    volume = pd.concat(volumes, axis=1).reindex(close.index)
+    present = pd.concat({code: pd.Series(True, index=s.index) for code, s in closes.items()}, axis=1).reindex(close.index)
+    return {
+        "dates": close.index, "codes": codes,
+        "close": close[codes].to_numpy(dtype=float), "volume": volume[codes].to_numpy(dtype=float),
+        "present": present[codes].notna().to_numpy(),
+    }
+
+def _own_bars(panel: np.ndarray, present: np.ndarray):
+    """日付パネルから各銘柄自身の足だけを抜き出し、fv._close_panel と同じく最終足で右詰めにする。
+    rolling の窓が休場・売買停止の日（present が False）をまたいでも、銘柄ごとの日足で計算した値と同じになる。
+    (右詰めのパネル, 日付パネルでの行, 列, 右詰めのパネルでの行) を返す。"""
+    counts = present.sum(axis=0)
+    rows = int(counts.max()) if counts.size else 0
+    r, c = np.nonzero(present)
+    own_rows = rows - counts[c] + (np.cumsum(present, axis=0) - 1)[r, c]
+    own = np.full((rows, panel.shape[1]), np.nan)
+    own[own_rows, c] = panel[r, c]
+    return own, r, c, own_rows
+
+def _to_dates(own: np.ndarray, shape, r: np.ndarray, c: np.ndarray, own_rows: np.ndarray) -> np.ndarray:
+    """_own_bars で右詰めにしたパネルの値を日付パネルの位置に戻す（足が無い日は NaN）。"""
+    out = np.full(shape, np.nan)
+    out[r, c] = own[own_rows, c]
+    return out
+
+def _signal_scores(close: np.ndarray, rsi_period: int, ma_window: int, bb_window: int, num_std: float) -> np.ndarray:
+    padding = np.cumsum(~np.isnan(close), axis=0) == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = np.diff(close, axis=0, prepend=np.nan)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        gain[padding] = np.nan
+        loss[padding] = np.nan
+        rsi = 100 - (100 / (1 + fv._rolling_panel(gain, rsi_period) / fv._rolling_panel(loss, rsi_period)))
+        ma75 = fv._rolling_panel(close, ma_window)
+        bb_mean = fv._rolling_panel(close, bb_window)
+        bb_std = fv._rolling_panel(close, bb_window, "std")
+        upper = bb_mean + (bb_std * num_std)
+        lower = bb_mean - (bb_std * num_std)
+
+        score = np.select([rsi <= 30, rsi <= 40, rsi >= 70, rsi >= 60], [2, 1, -2, -1], 0)
+        score = score + np.where(close > ma75, 1, -1)
+        score = score + np.select([close <= lower, close >= upper], [2, -2], 0)
+    return score
+
+def signal_score_history(close: np.ndarray, present: Optional[np.ndarray] = None,
+                         rsi_period=14, ma_window=75, bb_window=20, num_std=2) -> np.ndarray:
+    """calc_signal_panel の全日版。各日の売買スコア（その日の終値を現在値とする）。
+    present（build_panels の present）を渡すと、各銘柄自身の足だけで計算してから日付に戻すので、
+    その日までの日足で calc_signal_icons を呼んだのと同じ判定になる。
+    その日までの足が SIGNAL_MIN_BARS 本に満たない・終値が無い日は NaN。"""
+    if present is None:
+        score = _signal_scores(close, rsi_period, ma_window, bb_window, num_std)
+        bars = np.cumsum(~np.isnan(close), axis=0)
+    else:
+        own, r, c, own_rows = _own_bars(close, present)
+        score = _to_dates(_signal_scores(own, rsi_period, ma_window, bb_window, num_std), close.shape, r, c, own_rows)
+        # calc_signal_icons と同じく、終値が NaN の足も本数に数える
+        bars = np.cumsum(present, axis=0)
+    return np.where((bars >= fv.SIGNAL_MIN_BARS) & ~np.isnan(close), score, np.nan)
+
+def signal_buckets(score: np.ndarray) -> np.ndarray:
+    """スコアを SIGNAL_LABELS の番号にする（_signal_icons と同じ区切り）。NaN は -1。"""
+    ids = np.select([score >= 3, score >= 1, score == 0, score >= -2], [0, 1, 2, 3], 4)
+    return np.where(np.isnan(score), -1, ids)
+
+def rank_score_history(close: np.ndarray, volume: np.ndarray, codes: List[str],
+                       fundamentals: Dict[str, Dict[str, Any]], present: Optional[np.ndarray] = None) -> np.ndarray:
+    """各日のランク用スコア（calc_rank_scores と同じ配点）。財務データが無い銘柄・終値が無い日は NaN。
+    present を渡すと、出来高の平均は各銘柄自身の足だけで計算する。"""
+    rows, cols = close.shape
+    fair_value = np.full(cols, np.nan)
+    market_cap = np.full(cols, np.nan)
+    ref_price = np.full(cols, np.nan)
+    bps = np.full(cols, np.nan)
+    growth = np.full(cols, np.nan)
+    weather = np.full(cols, "—", dtype=object)
+    known = np.zeros(cols, dtype=bool)
+    for j, code in enumerate(codes):
+        fund = fundamentals.get(code)
+        if not fund: continue
+        price = fv._safe_float(fund.get("price"), None)
+        if price is None:
+            valid = close[:, j][~np.isnan(close[:, j])]
+            price = float(valid[-1]) if len(valid) else None
+        values = fv._valuation(price, fund, code)
+        known[j] = True
+        ref_price[j] = price if price else np.nan
+        fair_value[j] = values["fair_value"] if values["fair_value"] is not None else np.nan
+        market_cap[j] = values["market_cap"] if values["market_cap"] is not None else np.nan
+        bps[j] = fv._safe_float(fund["info"].get("bookValue"), np.nan)
+        growth[j] = values["growth"] if values["growth"] is not None else np.nan
+        weather[j] = values["weather"]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        upside = np.round((fair_value / close - 1.0) * 100.0, 2)
+        pbr = np.where(bps > 0, close / bps, np.nan)
+        if present is None:
+            avg_volume = fv._rolling_panel(volume, VOLUME_AVG_WINDOW)
+        else:
+            own, r, c, own_rows = _own_bars(volume, present)
+            avg_volume = _to_dates(fv._rolling_panel(own, VOLUME_AVG_WINDOW), volume.shape, r, c, own_rows)
+        volume_ratio = np.where(avg_volume > 0, volume / avg_volume, 0.0)
+    big_prob = fv.calc_big_player_scores(market_cap * (close / ref_price), pbr, volume_ratio)
+    score = calc_rank_scores(
+        upside.ravel(), big_prob.ravel(), np.broadcast_to(growth, close.shape).ravel(),
+        np.broadcast_to(weather, close.shape).ravel(),
+    ).reshape(rows, cols).astype(float)
+    score[:, ~known] = np.nan
+    score[np.isnan(close)] = np.nan
+    return score
+
+def rank_buckets(score: np.ndarray) -> np.ndarray:
+    """スコアを RANKS の番号にする（score_to_rank と同じ区切り）。NaN は -1。"""
+    ids = np.full(score.shape, -1)
+    ok = ~np.isnan(score)
+    ids[ok] = pd.Index(RANKS).get_indexer(score_to_rank(score[ok]))
+    return ids
+
+def forward_returns(close: np.ndarray, horizon: int) -> np.ndarray:
+    """h 営業日後の終値 ÷ 当日の終値 − 1（後ろが足りない・どちらかが NaN の所は NaN）"""
+    out = np.full(close.shape, np.nan)
+    if horizon < len(close):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[:-horizon] = close[horizon:] / close[:-horizon] - 1.0
+    return out
+
+# ==========================================
+# 📊 集計
+# ==========================================
+def bucket_stats(buckets: np.ndarray, labels: List[str], returns: Dict[int, np.ndarray]) -> pd.DataFrame:
+    """区分ごと・保有日数ごとのリターンの件数・平均・中央値・勝率と、全体平均との差（%）"""
+    rows = []
+    ids = buckets.ravel()
+    for horizon, fwd in returns.items():
+        fwd = fwd.ravel()
+        valid = (ids >= 0) & ~np.isnan(fwd)
+        base = float(fwd[valid].mean()) if valid.any() else np.nan
+        b, r = ids[valid], fwd[valid]
+        count = np.bincount(b, minlength=len(labels))
+        total = np.bincount(b, weights=r, minlength=len(labels))
+        wins = np.bincount(b, weights=(r > 0).astype(float), minlength=len(labels))
+        order = np.argsort(b, kind="stable")
+        groups = np.split(r[order], np.cumsum(count)[:-1])
+        for k, label in enumerate(labels):
+            n = int(count[k])
+            mean = total[k] / n if n else np.nan
+            rows.append({
+                "bucket": label, "horizon": horizon, "count": n,
+                "mean_pct": mean * 100, "median_pct": float(np.median(groups[k])) * 100 if n else np.nan,
+                "win_rate_pct": wins[k] / n * 100 if n else np.nan, "excess_pct": (mean - base) * 100,
+            })
+    return pd.DataFrame(rows, columns=["bucket", "horizon", "count", "mean_pct", "median_pct", "win_rate_pct", "excess_pct"])
+
+def run_backtest(hists: Dict[str, pd.DataFrame], fundamentals: Optional[Dict[str, Dict[str, Any]]] = None,
+                 horizons: Optional[List[int]] = None) -> Dict[str, Any]:
+    """シグナル別（signal）・ランク別（rank）の集計表と、各段階の所要時間（timings、秒）を返す。"""
+    horizons = HORIZONS if horizons is None else horizons
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    panels = build_panels(hists)
+    timings["panels"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    returns = {h: forward_returns(panels["close"], h) for h in horizons}
+    signal = signal_buckets(signal_score_history(panels["close"], panels["present"]))
+    timings["signal"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    rank = rank_buckets(rank_score_history(panels["close"], panels["volume"], panels["codes"], fundamentals or {}, panels["present"]))
+    timings["rank"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    out = {
+        "signal": bucket_stats(signal, SIGNAL_LABELS, returns),
+        "rank": bucket_stats(rank, RANKS, returns),
+    }
+    timings["stats"] = time.perf_counter() - t0
+    dates = panels["dates"]
+    out["meta"] = {
+        "tickers": len(panels["codes"]), "days": len(dates),
+        "start": dates[0].strftime("%Y-%m-%d") if len(dates) else None,
+        "end": dates[-1].strftime("%Y-%m-%d") if len(dates) else None,
+    }
+    out["timings"] = timings
+    return out
+
+# ==========================================
+# 📥 入力
+# ==========================================
+def _stored_codes() -> List[str]:
+    if not os.path.isdir(local_store.OHLCV_DIR): return []
+    return sorted(name[:-len(".parquet")] for name in os.listdir(local_store.OHLCV_DIR) if name.endswith(".parquet"))
+
+def _since(hist: pd.DataFrame, start: str) -> pd.DataFrame:
+    return hist[hist.index >= pd.Timestamp(start, tz=hist.index.tz)]
+
+def _starts_after(hist: pd.DataFrame, start: str) -> bool:
+    # 年末年始・連休で start の日に足が無いだけなら「足りている」とみなす
+    return hist.index[0] > pd.Timestamp(start, tz=hist.index.tz) + pd.Timedelta(days=START_SLACK_DAYS)
+
+def fill_store(codes: List[str], start: str) -> List[str]:
+    """start の日から日足が保存されていない銘柄を、取得元から start 以降まとめて取り直して保存する。
+    （アプリ・batch.py の保存は6ヶ月分から始まるので、数年分で検証する時はこれで埋める）取れなかった銘柄を返す。"""
+    need = []
+    for code in codes:
+        stored = local_store.load_ohlcv(code)
+        if stored is None or stored.empty or _starts_after(stored, start): need.append(code)
+    failed = []
+    size = max(1, fv.BATCH_SIZE)
+    for i in range(0, len(need), size):
+        chunk = need[i:i + size]
+        fetched = fv._download_history_batch(chunk, start=start)
+        for code in chunk:
+            hist = fetched.get(code)
+            # 過去の調整後株価は取り直した方に揃える（保存済みに足すと分割の前後で混ざる）
+            if hist is None or hist.empty: failed.append(code)
+            else: local_store.replace_ohlcv(code, hist)
+    return failed
+
+def load_store(codes: Optional[List[str]] = None) -> Dict[str, Any]:
+    """ローカル保存の日足と財務データ（期限切れでも使う）。codes 未指定なら保存されている全銘柄。"""
+    if codes is None: codes = _stored_codes()
+    hists, funds = {}, {}
+    for code in codes:
+        hist = local_store.load_ohlcv(code)
+        if hist is None: continue
+        hists[code] = hist
+        fund = local_store.load_fundamentals(code, float("inf"))
+        if fund is not None: funds[code] = fund
+    return {"hists": hists, "fundamentals": funds}
+
+def make_synthetic(n: int, years: float, seed: int) -> Dict[str, Any]:
+    """bench.py と同じ分布の合成データ（n 銘柄 × years 年。日付は全銘柄共通）"""
+    import bench
+    rng = np.random.default_rng(seed)
+    bars = int(round(years * 245))
+    index = pd.bdate_range(end="2026-10-16", periods=bars, tz="Asia/Tokyo", name="Date")
+    close = rng.uniform(300, 5000, n) * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, n)), axis=0))
+    volume = rng.integers(10_000, 3_000_000, (bars, n)).astype("int64")
+    hists, funds = {}, {}
+    for j, code in enumerate(bench._codes(n)):
+        hists[code] = pd.DataFrame({"Close": close[:, j], "Volume": volume[:, j]}, index=index)
+        info = bench.make_info(rng, code)
+        funds[code] = {"info": info, "name": info["longName"], "price": float(close[-1, j])}
+    return {"hists": hists, "fundamentals": funds}
+
+def _print_table(title: str, df: pd.DataFrame) -> None:
+    print(f"\n{title}")
+    for horizon, part in df.groupby("horizon", sort=False):
+        print(f"  {horizon} 営業日後")
+        for row in part.itertuples():
+            if not row.count: continue
+            print(f"    {row.bucket:>4}  件数 {row.count:>10,}  平均 {row.mean_pct:+7.2f}%  中央値 {row.median_pct:+7.2f}%"
+                  f"  勝率 {row.win_rate_pct:5.1f}%  全体との差 {row.excess_pct:+6.2f}%")
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="売買シグナル・ランクのバックテスト")
+    parser.add_argument("codes", nargs="*", help="証券コード（未指定ならローカル保存の全銘柄）")
+    parser.add_argument("--universe", help="上場銘柄一覧のCSV")
+    parser.add_argument("--synthetic", type=int, help="合成データの銘柄数（指定時はローカル保存を使わない）")
+    parser.add_argument("--years", type=float, default=5, help="合成データの年数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", help="この日（YYYY-MM-DD）からの日足で検証する（保存に無い分は先に取得元から取る）")
+    parser.add_argument("--horizons", type=int, nargs="+", default=HORIZONS, help="保有する営業日数（複数指定可）")
+    parser.add_argument("--out", help="集計表の保存先（.csv。signal / rank を1つの表にまとめる）")
+    args = parser.parse_args(argv)
+
+    if args.start:
+        if args.synthetic: parser.error("--start はローカル保存の日足を使う時だけ指定できます（合成データは --years）")
+        try: pd.Timestamp(args.start)
+        except ValueError: parser.error(f"--start の日付が読めません: {args.start}")
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        data = make_synthetic(args.synthetic, args.years, args.seed)
+    else:
+        codes = list(args.codes)
+        if args.universe:
+            import screener
+            codes.extend(screener.load_universe(args.universe))
+        codes = list(dict.fromkeys(codes)) or _stored_codes()
+        if args.start:
+            failed = fill_store(codes, args.start)
+            if failed: print(f"⚠️ {args.start} からの日足を取得できなかった銘柄: {len(failed):,}（{' '.join(failed[:10])}{' …' if len(failed) > 10 else ''}）")
+        data = load_store(codes)
+        if args.start:
+            data["hists"] = {code: hist for code, hist in ((c, _since(h, args.start)) for c, h in data["hists"].items()) if not hist.empty}
+    loaded = time.perf_counter() - t0
+    if not data["hists"]:
+        parser.error("日足がありません（先にアプリか batch.py で分析して保存するか --start / --synthetic を指定）")
+    if args.start:
+        short = [code for code, hist in data["hists"].items() if _starts_after(hist, args.start)]
+        if short: print(f"⚠️ {args.start} より後からの日足しか無い銘柄: {len(short):,}（上場が後・取得できず）")
+
+    result = run_backtest(data["hists"], data["fundamentals"], args.horizons)
+    meta = result["meta"]
+    print(f"{meta['tickers']:,} 銘柄 × {meta['days']:,} 日（{meta['start']} 〜 {meta['end']}）"
+          f"  読み込み {loaded:.1f} 秒 / 計算 {sum(result['timings'].values()):.1f} 秒"
+          f"（{', '.join(f'{k} {v:.1f}' for k, v in result['timings'].items())}）")
+    _print_table("📈 売買シグナル別", result["signal"])
+    _print_table("👑 ランク別", result["rank"])
+    if args.out:
+        table = pd.concat([result["signal"].assign(kind="signal"), result["rank"].assign(kind="rank")], ignore_index=True)
+        table[["kind"] + [c for c in table.columns if c != "kind"]].to_csv(args.out, index=False, encoding="utf-8-sig")
+        print(f"\n保存しました: {args.out}")
+    return result
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Streamlit を使わずに計算エンジンをまとめて実行する（cron・夜間の全銘柄計算用）。
+
+    python batch.py 7203 9984 6758                        # 証券コードを直接指定
+    python batch.py --universe universe.csv               # 上場銘柄一覧（screener.load_universe と同じ形式）
+    python batch.py --universe universe.csv --workers 8 --out results.parquet --save-screener
+
+銘柄を小さなチャンクに分けてプロセスプールで計算する（取得・指標・理論株価まで各プロセスで行い、全コアを使う）。
+全プロセス合計のリクエスト数が FUYASERU_REQUESTS_PER_SEC（瞬間的には FUYASERU_RATE_BURST）を超えないよう、各プロセスには 1/プロセス数 ずつ割り当てる。
+出力は --out の拡張子で決まる（.parquet / .csv）。--save-screener を付けるとアプリのスクリーナーの表も置き換える。
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+import fair_value_calc_y4 as fv
+import local_store
+import screener
+
+CHUNK_SIZE = fv._env_int("FUYASERU_BATCH_CHUNK", 100)  # 1タスクで計算する銘柄数
+
+# ==========================================
+# 🧮 プロセスごとの計算
+# ==========================================
+def _init_worker(requests_per_sec: float, burst: int) -> None:
+    # プロセスごとにレート制限を持つので、全体の上限（毎秒の数・瞬間的に許す数）をプロセス数で割った分だけ使う
+    fv._rate_limiter = fv._RateLimiter(requests_per_sec, burst)
+    # missing.json はプロセスごとに書くと最後に書いたものだけが残るので、親がまとめて書く
+    fv._missing_cache.persist = False
+
+def run_chunk(codes: List[str]) -> List[Dict[str, Any]]:
+    """codes を計算して結果を辞書で返す（プロセス間で受け渡すので需給の集計配列は除く）。"""
+    rows = []
+    for _, result in fv.iter_fuyaseru_bundle(codes, use_cache=False):
+        row = result.to_dict()
+        row["volume_profile"] = None
+        row["has_history"] = result.has_history
+        rows.append(row)
+    return rows
+
+def _run_chunk_in_worker(codes: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """ワーカー用の run_chunk。存在しないと判定した銘柄も一緒に返す。"""
+    rows = run_chunk(codes)
+    return rows, fv._missing_cache.take_added()
+
+def _chunks(codes: List[str], size: int) -> List[List[str]]:
+    size = max(1, size)
+    return [codes[i:i + size] for i in range(0, len(codes), size)]
+
+def run(codes: List[str], workers: int, chunk_size: int = CHUNK_SIZE, verbose: bool = True) -> List[fv.StockResult]:
+    """全銘柄を計算して StockResult の一覧を返す（並びは codes の順）。workers <= 1 ならこのプロセスだけで計算する。"""
+    started = time.time()
+    rows: Dict[str, Dict[str, Any]] = {}
+
+    def report() -> None:
+        if verbose: print(f"{len(rows):,}/{len(codes):,} 銘柄  {time.time() - started:.1f} 秒", file=sys.stderr, flush=True)
+
+    if workers <= 1:
+        for chunk in _chunks(codes, chunk_size):
+            rows.update((row["code"], row) for row in run_chunk(chunk))
+            report()
+    else:
+        rate = fv.REQUESTS_PER_SEC / workers if fv.REQUESTS_PER_SEC > 0 else 0.0
+        burst = max(1, fv.RATE_BURST // workers)
+        missing: Dict[str, float] = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rate, burst)) as pool:
+            futures = [pool.submit(_run_chunk_in_worker, chunk) for chunk in _chunks(codes, chunk_size)]
+            for future in as_completed(futures):
+                chunk_rows, chunk_missing = future.result()
+                rows.update((row["code"], row) for row in chunk_rows)
+                missing.update(chunk_missing)
+                report()
+        fv._missing_cache.merge(missing)
+    return [fv.StockResult(**rows[code]) if code in rows else fv.StockResult(code) for code in codes]
+
+# ==========================================
+# 💾 出力
+# ==========================================
+def write_frame(df: pd.DataFrame, path: str) -> None:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        df.to_csv(path, index=False, encoding="utf-8-sig")  # Excel で文字化けしないように BOM 付き
+    elif ext == ".parquet":
+        if not local_store.PARQUET_OK: raise RuntimeError("Parquet の書き出しには pyarrow が必要です")
+        df.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"出力形式が分かりません（.parquet / .csv）: {path}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="フヤセルブレインの一括計算（Streamlit 不要）")
+    parser.add_argument("codes", nargs="*", help="証券コード（4桁）")
+    parser.add_argument("--universe", help="上場銘柄一覧のCSV（「コード」または「code」列）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="プロセス数（1 でこのプロセスだけ）")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="1タスクで計算する銘柄数")
+    parser.add_argument("--out", default="fuyaseru_results.parquet", help="出力先（.parquet / .csv）")
+    parser.add_argument("--save-screener", action="store_true", help="アプリのスクリーナーの表としても保存する")
+    parser.add_argument("--quiet", action="store_true", help="進み具合を表示しない")
+    args = parser.parse_args(argv)
+
+    codes = list(args.codes)
+    if args.universe: codes.extend(screener.load_universe(args.universe))
+    codes = list(dict.fromkeys(c.strip().upper() for c in codes if c.strip()))
+    if not codes: parser.error("証券コードか --universe を指定してください")
+
+    results = run(codes, args.workers, args.chunk_size, verbose=not args.quiet)
+    df = screener.results_to_frame(results)
+    write_frame(df, args.out)
+    if args.save_screener: local_store.save_screener(df)
+    missing = sum(r.is_missing for r in results)
+    print(f"保存しました: {args.out}（{len(df):,} 銘柄 / 取得できず {missing:,} 銘柄）")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
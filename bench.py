@@ -0,0 +1,227 @@
+"""計算の重い処理のベンチマーク。
+
+    python bench.py                         # 10 / 100 / 1,000 / 4,000 銘柄の合成データ
+    python bench.py --fixtures DIR          # 記録済みフィクスチャ（providers.RecordingProvider）の日足を使う
+    python bench.py --out new.json --compare old.json
+
+結果は JSON で保存し、--compare で前回の JSON と比べた倍率を表示する。
+通信は一切しない（取得元は合成データかフィクスチャの再生のみ）。
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import glob
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 保存先はベンチ専用の一時ディレクトリにする（local_store の読み込み前に設定）
+os.environ.setdefault("FUYASERU_DATA_DIR", tempfile.mkdtemp(prefix="fuyaseru_bench_"))
+os.environ.setdefault("FUYASERU_REQUESTS_PER_SEC", "0")
+
+import numpy as np
+import pandas as pd
+import fair_value_calc_y4 as fv
+import providers
+from charts import build_wall_chart
+from result_table import bundle_to_df
+
+DEFAULT_SIZES = [10, 100, 1000, 4000]
+BARS = 125  # 6ヶ月分の営業日
+CHART_SAMPLE = 200  # チャートは1枚ずつ作る処理なので、この枚数だけ作って1銘柄あたりを測る
+
+# ==========================================
+# 🧪 データ（合成 or フィクスチャ）
+# ==========================================
+def _codes(n: int) -> List[str]:
+    return [str(1300 + i) for i in range(n)]
+
+def make_history(rng: np.random.Generator, bars: int = BARS, end: str = "2026-10-16") -> pd.DataFrame:
+    idx = pd.bdate_range(end=end, periods=bars, tz="Asia/Tokyo", name="Date")
+    close = rng.uniform(300, 5000) * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    spread = rng.uniform(0.002, 0.02, bars)
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.005, bars)),
+        "High": close * (1 + spread),
+        "Low": close * (1 - spread),
+        "Close": close,
+        "Volume": rng.integers(10_000, 3_000_000, bars).astype("int64"),
+    }, index=idx)
+
+def make_info(rng: np.random.Generator, code: str) -> Dict[str, Any]:
+    return {
+        "trailingEps": float(rng.uniform(-50, 300)),
+        "forwardEps": float(rng.uniform(-20, 320)),
+        "bookValue": float(rng.uniform(100, 4000)),
+        "returnOnEquity": float(rng.uniform(-0.1, 0.3)),
+        "returnOnAssets": float(rng.uniform(-0.05, 0.15)),
+        "marketCap": float(rng.uniform(5e9, 5e12)),
+        "averageVolume": float(rng.uniform(1e4, 2e6)),
+        "dividendRate": float(rng.uniform(0, 150)),
+        "revenueGrowth": float(rng.uniform(-0.2, 0.5)),
+        "quoteType": "EQUITY", "longName": f"ベンチ{code}", "shortName": f"BENCH{code}",
+    }
+
+class SyntheticProvider(providers.MarketDataProvider):
+    """シード固定の合成データを返す取得元（同じシードなら毎回同じデータ）"""
+
+    def __init__(self, hists: Dict[str, pd.DataFrame], infos: Dict[str, Dict[str, Any]]):
+        self.hists = hists
+        self.infos = infos
+
+    def history(self, symbol, period="6mo"):
+        return self.hists.get(symbol[:4])
+
+    def download(self, symbols, start=None, threads=1):
+        return {s: self.hists[s[:4]] for s in symbols if s[:4] in self.hists}
+
+    def info(self, symbol):
+        return dict(self.infos.get(symbol[:4], {}))
+
+    def market_cap(self, symbol):
+        return self.infos.get(symbol[:4], {}).get("marketCap")
+
+    def name(self, code):
+        return f"ベンチ{code}"
+
+def load_fixture_histories(fixture_dir: str) -> List[pd.DataFrame]:
+    hists = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "history", "*.pkl"))):
+        with open(path, "rb") as f:
+            hist = pickle.load(f)
+        if hist is not None and not hist.empty: hists.append(hist)
+    return hists
+
+def make_dataset(n: int, seed: int, fixtures: Optional[List[pd.DataFrame]] = None):
+    """n 銘柄分の日足（6ヶ月）と財務データ。フィクスチャがあれば日足はそれを順番に使い回す。"""
+    rng = np.random.default_rng(seed)
+    codes = _codes(n)
+    hists: Dict[str, pd.DataFrame] = {}
+    infos: Dict[str, Dict[str, Any]] = {}
+    for i, code in enumerate(codes):
+        hists[code] = fv._last_six_months(fixtures[i % len(fixtures)]) if fixtures else make_history(rng)
+        infos[code] = make_info(rng, code)
+    return codes, hists, infos
+
+# ==========================================
+# ⏱️ 計測
+# ==========================================
+def _time(fn: Callable[[], Any], repeat: int) -> List[float]:
+    fn()  # 初回だけ発生する読み込み・キャッシュ作成は計測から外す
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return runs
+
+def run_size(n: int, repeat: int, seed: int, fixtures: Optional[List[pd.DataFrame]] = None,
+             chart_sample: int = CHART_SAMPLE) -> List[Dict[str, Any]]:
+    codes, hists, infos = make_dataset(n, seed, fixtures)
+    closes = [hists[c]["Close"] for c in codes]
+    prices = {c: float(hists[c]["Close"].iloc[-1]) for c in codes}
+    graham_args = [
+        (prices[c], infos[c]["bookValue"], infos[c]["trailingEps"], infos[c]["forwardEps"]) for c in codes
+    ]
+
+    # 表・チャートの入力になる StockResult は実際のパイプラインで作る（取得元だけ合成データ）
+    fv.set_provider(SyntheticProvider(hists, infos))
+    fv.clear_cache()
+    fv.local_store.clear_fundamentals()
+    fv.local_store.clear_ohlcv()
+    signals = fv.calc_signal_icons(hists)
+    bundle = {c: fv._fetch_single_stock(c, hists[c], signals.get(c, "—")) for c in codes}
+
+    chart_codes = codes[:max(1, min(n, chart_sample))]
+    # 名前: (処理, 実際に処理する銘柄数)
+    cases = {
+        "volume_profile_wall": (lambda: [fv._calc_volume_profile_wall(hists[c], prices[c]) for c in codes], n),
+        "rsi": (lambda: [fv._calc_rsi(s) for s in closes], n),
+        "bollinger_bands": (lambda: [fv._calc_bollinger_bands(s) for s in closes], n),
+        "signal_scoring": (lambda: fv.calc_signal_icons(hists), n),
+        "graham": (lambda: [fv.calc_graham_fair_value(*args) for args in graham_args], n),
+        "bundle_to_df": (lambda: bundle_to_df(bundle, codes), n),
+        "wall_chart_figure": (lambda: [build_wall_chart(bundle[c], use_cache=False) for c in chart_codes], len(chart_codes)),
+        "wall_chart_cached": (lambda: [build_wall_chart(bundle[c]) for c in chart_codes], len(chart_codes)),
+    }
+    out = []
+    for name, (fn, measured) in cases.items():
+        runs = _time(fn, repeat)
+        out.append({
+            "name": name, "n": n, "measured_n": measured, "runs": runs,
+            "min": min(runs), "median": statistics.median(runs),
+            "per_ticker_us": min(runs) / measured * 1e6,
+        })
+        note = f"  ({measured} 銘柄分を計測)" if measured != n else ""
+        print(f"{name:>22} n={n:>5}  min {min(runs) * 1000:10.2f} ms  median {statistics.median(runs) * 1000:10.2f} ms{note}", flush=True)
+    return out
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(new: Dict[str, Any], old: Dict[str, Any]) -> None:
+    """前回の結果との比較（中央値の倍率。1 より小さければ速くなっている）"""
+    before = {(r["name"], r["n"]): r for r in old.get("results", [])}
+    print(f"\n比較: {old.get('meta', {}).get('commit')} → {new['meta'].get('commit')}")
+    for r in new["results"]:
+        prev = before.get((r["name"], r["n"]))
+        if prev is None or prev.get("measured_n", prev["n"]) != r["measured_n"]: continue
+        print(f"{r['name']:>22} n={r['n']:>5}  {prev['median'] * 1000:10.2f} ms → {r['median'] * 1000:10.2f} ms  (x{r['median'] / prev['median']:.2f})")
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="フヤセルブレインの計算ベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="銘柄数（複数指定可）")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の繰り返し回数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures", help="記録済みフィクスチャのディレクトリ（日足をこれで置き換える）")
+    parser.add_argument("--chart-sample", type=int, default=CHART_SAMPLE, help="チャートを実際に作る最大枚数")
+    parser.add_argument("--out", default="bench_results.json", help="結果のJSONの保存先")
+    parser.add_argument("--compare", help="比較する前回の結果JSON")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixture_histories(args.fixtures) if args.fixtures else None
+    if args.fixtures and not fixtures:
+        parser.error(f"フィクスチャに日足がありません: {args.fixtures}")
+
+    results: List[Dict[str, Any]] = []
+    for n in args.sizes:
+        results.extend(run_size(n, args.repeat, args.seed, fixtures, args.chart_sample))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "source": f"fixtures:{args.fixtures}" if args.fixtures else "synthetic",
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "chart_sample": args.chart_sample,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n保存しました: {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from collections import OrderedDict
+import threading
+import numpy as np
+import fair_value_calc_y4 as fv
+import local_store
+
+# plotly はチャートを初めて作る時に読み込む（ログイン画面の表示を待たせないため）
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# ==========================================
+# ⚙️ 設定
+# ==========================================
+CHART_CACHE_SIZE = fv._env_int("FUYASERU_CHART_CACHE_SIZE", 256)  # 作ったチャートを保持する枚数
+CHART_MAX_BARS = fv._env_int("FUYASERU_CHART_MAX_BARS", 0)        # ローソク足の本数の上限（超えたら数日ずつまとめる。0以下でまとめない）
+
+# ==========================================
+# 🗜️ ローソク足の間引き（長い期間を数日ずつ1本にまとめる）
+# ==========================================
+def downsample_ohlcv(ohlcv: local_store.OhlcvArrays, max_bars: int) -> local_store.OhlcvArrays:
+    """max_bars 本以下になるように連続する日足をまとめる（始値は最初・高値は最大・安値は最小・終値は最後・出来高は合計）。"""
+    n = len(ohlcv)
+    if max_bars <= 0 or n <= max_bars: return ohlcv
+    step = -(-n // max_bars)
+    starts = np.arange(0, n, step)
+    ends = np.minimum(starts + step, n) - 1
+    return local_store.OhlcvArrays(
+        dates=ohlcv.dates[starts],
+        open=ohlcv.open[starts],
+        high=np.fmax.reduceat(ohlcv.high, starts),
+        low=np.fmin.reduceat(ohlcv.low, starts),
+        close=ohlcv.close[ends],
+        volume=np.add.reduceat(ohlcv.volume, starts),
+    )
+
+# ==========================================
+# 🗃️ 作ったチャートのキャッシュ（銘柄・日足の最終日ごと）
+# ==========================================
+_figures: "OrderedDict[Tuple, go.Figure]" = OrderedDict()
+_figures_lock = threading.Lock()
+_figure_stats = {"hits": 0, "misses": 0}
+
+def _figure_key(ticker_data: fv.StockResult, max_bars: int) -> Optional[Tuple]:
+    # 線の位置・タイトルは現在値と銘柄名でも変わるのでキーに含める
+    if not ticker_data.last_date: return None
+    return (ticker_data.code, ticker_data.last_date, ticker_data.price, ticker_data.name, max_bars)
+
+def get_chart_cache_stats() -> Dict[str, Any]:
+    with _figures_lock:
+        return {"entries": len(_figures), **_figure_stats}
+
+def clear_chart_cache() -> None:
+    with _figures_lock:
+        _figures.clear()
+        _figure_stats.update(hits=0, misses=0)
+
+# ==========================================
+# 📈 需給の壁チャート（スマホ対策・用語修正済み）
+# ==========================================
+def build_wall_chart(ticker_data: fv.StockResult, max_bars: Optional[int] = None, use_cache: bool = True) -> Optional[go.Figure]:
+    """ローソク足＋需給の壁のチャートを組み立てる。日足が無ければ None。
+    同じ銘柄・同じ最終日のチャートは作り直さずに同じ Figure を返すので、受け取った側で書き換えないこと。"""
+    max_bars = CHART_MAX_BARS if max_bars is None else max_bars
+    key = _figure_key(ticker_data, max_bars) if use_cache else None
+    if key is not None:
+        with _figures_lock:
+            fig = _figures.get(key)
+            if fig is not None:
+                _figures.move_to_end(key)
+                _figure_stats["hits"] += 1
+                return fig
+            _figure_stats["misses"] += 1
+    fig = _build_wall_chart(ticker_data, max_bars)
+    if key is not None and fig is not None:
+        with _figures_lock:
+            _figures[key] = fig
+            while len(_figures) > max(0, CHART_CACHE_SIZE): _figures.popitem(last=False)
+    return fig
+
+def _build_wall_chart(ticker_data: fv.StockResult, max_bars: int) -> Optional[go.Figure]:
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    ohlcv = ticker_data.ohlcv
+    if ohlcv is None or len(ohlcv) == 0:
+        return None
+
+    name = ticker_data.name or "Unknown"
+    code = ticker_data.code or "----"
+    current_price = ticker_data.price or 0
+
+    # --- 1. 価格帯別出来高の集計（分析時に計算済みならそれを使う） ---
+    profile = ticker_data.volume_profile
+    if profile is None:
+        profile = fv.calc_volume_profile(ohlcv.close, ohlcv.volume, current_price)
+    mids = profile["mids"]
+    volumes = profile["volumes"]
+
+    # --- 2. 抵抗線・支持線のロジック ---
+    is_upper = mids > current_price
+    upper_candidates = is_upper & (volumes != 0)
+    lower_candidates = ~is_upper & (volumes != 0)
+
+    # 赤（上値抵抗線）：出来高最大 > 価格低い方
+    if upper_candidates.any():
+        top = upper_candidates & (volumes == volumes[upper_candidates].max())
+        resistance_price = mids[top].min()
+    else:
+        resistance_price = float(np.nanmax(ohlcv.high))
+
+    # 青（下値支持線）：出来高最大 > 価格高い方
+    if lower_candidates.any():
+        top = lower_candidates & (volumes == volumes[lower_candidates].max())
+        support_price = mids[top].max()
+    else:
+        support_price = float(np.nanmin(ohlcv.low))
+
+    # 需給の壁は全日足で集計済み。描くローソク足だけ間引く
+    ohlcv = downsample_ohlcv(ohlcv, max_bars)
+
+    # --- バーの色分け ---
+    bar_colors = np.where(is_upper, 'rgba(255, 82, 82, 0.4)', 'rgba(33, 150, 243, 0.4)').tolist()
+
+    fig = make_subplots(
+        rows=1, cols=2, 
+        shared_yaxes=True, 
+        column_widths=[0.75, 0.25], 
+        horizontal_spacing=0.02,
+        subplot_titles=("📉 トレンド分析", "🧱 需給の壁")
+    )
+
+    # 1. ローソク足
+    fig.add_trace(go.Candlestick(
+        x=ohlcv.dates, open=ohlcv.open, high=ohlcv.high, low=ohlcv.low, close=ohlcv.close, 
+        name='株価'
+    ), row=1, col=1)
+
+    # 2. 出来高プロファイル
+    fig.add_trace(go.Bar(
+        x=volumes, y=mids, 
+        orientation='h', marker_color=bar_colors, name='出来高'
+    ), row=1, col=2)
+
+    # --- ライン描画 ---
+    fig.add_hline(
+        y=resistance_price, 
+        line_color="#ef4444", 
+        line_width=2,
+        annotation_text="🟥 上値抵抗線（抜ければ激アツ）", 
+        annotation_position="top left",
+        annotation_font_color="#ef4444",
+        row=1, col=1
+    )
+
+    # ★修正ポイント：文言を「下値支持線」に変更
+    fig.add_hline(
+        y=support_price, 
+        line_color="#3b82f6", 
+        line_width=2,
+        annotation_text="🟦 下値支持線（割れれば即逃げ）", 
+        annotation_position="bottom left",
+        annotation_font_color="#3b82f6",
+        row=1, col=1
+    )
+
+    # レイアウトで「強制ホワイト化」を指定
+    fig.update_layout(
+        title=f"📊 {name} ({code})", 
+        height=450, 
+        showlegend=False, 
+        xaxis_rangeslider_visible=False, 
+        margin=dict(l=10, r=10, t=60, b=10), 
+        dragmode=False,
+        template="plotly_white",  # ベースを白テーマに
+        paper_bgcolor='white',    # グラフの外側の背景を白に
+        plot_bgcolor='white',     # グラフの内側の背景を白に
+        font=dict(color='black')  # 文字色を黒に強制
+    )
+    fig.update_xaxes(fixedrange=True) 
+    fig.update_yaxes(fixedrange=True)
+    return fig
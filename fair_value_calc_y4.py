@@ -1,30 +1,94 @@
 from __future__ import annotations
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Iterator, Tuple
 import math
+import os
+import queue
+import sys
 import time
 import random
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
-import streamlit as st
-import requests
-
-try:
-    import yfinance as yf
-except Exception:
-    yf = None
+from pandas.api.indexers import BaseIndexer
+import indicators
+import local_store
+import master
+import metrics
+import providers
 
 # ==========================================
 # ⚙️ 設定
 # ==========================================
-MAX_RETRIES = 3
-RETRY_DELAY = 5.0
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-}
+def _env_float(name: str, default: float) -> float:
+    try: return float(os.environ.get(name, default))
+    except (TypeError, ValueError): return default
+
+def _env_int(name: str, default: int) -> int:
+    try: return int(os.environ.get(name, default))
+    except (TypeError, ValueError): return default
+
+# 取得スループットは環境変数で調整できる（コード修正不要）
+MAX_RETRIES = _env_int("FUYASERU_MAX_RETRIES", 3)
+RETRY_DELAY = _env_float("FUYASERU_RETRY_DELAY", 1.0)          # リトライ待ちの基準秒数（指数的に伸ばす）
+RETRY_MAX_DELAY = _env_float("FUYASERU_RETRY_MAX_DELAY", 20.0)  # リトライ待ちの上限秒数
+MAX_WORKERS = _env_int("FUYASERU_MAX_WORKERS", 4)              # 並列取得のスレッド数
+REQUESTS_PER_SEC = _env_float("FUYASERU_REQUESTS_PER_SEC", 2.0) # 全スレッド合計の上限（0以下で無制限）
+RATE_BURST = _env_int("FUYASERU_RATE_BURST", 4)                # 瞬間的に許すリクエスト数
+BATCH_SIZE = _env_int("FUYASERU_BATCH_SIZE", 50)               # 株価履歴を一括取得する銘柄数
+OHLCV_FRESH_SEC = _env_float("FUYASERU_OHLCV_FRESH_SEC", 900)   # 保存してからこの秒数以内の日足は取り直さない
+RESULT_CACHE_TTL = 43200  # 銘柄ごとの計算結果を保持する秒数（12時間）
+RESULT_CACHE_MAX_MB = _env_float("FUYASERU_RESULT_CACHE_MB", 256)  # 計算結果キャッシュの上限（超えたら古く使われた順に捨てる）
+MISSING_TTL = _env_float("FUYASERU_MISSING_TTL", 24 * 3600)     # 「存在しない銘柄」と判定した銘柄を取りに行かない秒数
+
+# ==========================================
+# 🔌 取得元（既定は Yahoo。FUYASERU_PROVIDER=record / replay でフィクスチャの記録・再生）
+# ==========================================
+_provider: providers.MarketDataProvider = providers.from_env(os.path.join(local_store.DATA_DIR, "fixtures"))
 
-def get_sleep_time():
-    return random.uniform(2.0, 4.0)
+def get_provider() -> providers.MarketDataProvider:
+    return _provider
+
+def set_provider(provider: providers.MarketDataProvider) -> None:
+    """取得元を差し替える（ベンチマーク・負荷試験でフィクスチャを再生する時など）"""
+    global _provider
+    _provider = provider
+
+# ==========================================
+# 🚦 レート制限（全スレッド共通のトークンバケット）
+# ==========================================
+class _RateLimiter:
+    """1秒あたり rate 回までリクエストを通す。burst 回までは溜めておける。"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0: return
+        with metrics.stage("wait"):
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                time.sleep(wait)
+
+_rate_limiter = _RateLimiter(REQUESTS_PER_SEC, RATE_BURST)
+
+def _backoff_delay(attempt: int) -> float:
+    # 指数バックオフ＋ジッター（複数スレッドが同時に再試行して詰まらないようにばらす）
+    delay = min(RETRY_MAX_DELAY, RETRY_DELAY * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
 
 def _safe_float(x, default=None):
     try:
@@ -52,59 +116,194 @@ def _calc_bollinger_bands(series, window=20, num_std=2):
     lower_band = rolling_mean - (rolling_std * num_std)
     return upper_band, lower_band
 
-def _calc_volume_profile_wall(hist, current_price, bins=50):
-    try:
-        if hist is None or hist.empty:
-            return "—"
-        
-        p_min = min(hist['Close'].min(), current_price * 0.9)
-        p_max = max(hist['Close'].max(), current_price * 1.1)
-        
-        bin_edges = np.linspace(p_min, p_max, bins)
-        hist['bin'] = pd.cut(hist['Close'], bins=bin_edges)
-        
-        vol_profile = hist.groupby('bin', observed=False)['Volume'].sum()
-        
-        wall_df = pd.DataFrame({
-            'price': [b.mid for b in vol_profile.index],
-            'volume': vol_profile.values
-        })
+# ==========================================
+# ⚡ 売買シグナルの一括計算（全銘柄をまとめてNumPyで計算）
+# ==========================================
+SIGNAL_MIN_BARS = 76  # len(hist) > 75 の銘柄だけシグナルを出す
+SIGNAL_ICONS = ["↑◎", "↗〇", "→△", "↘▲"]
 
-        upper_zone = wall_df[wall_df['price'] > current_price]
-        lower_zone = wall_df[wall_df['price'] < current_price]
-        
-        upper_wall = None
-        lower_wall = None
+def _close_panel(closes: List[np.ndarray]) -> np.ndarray:
+    """各銘柄の終値を最終足で右詰め（下詰め）にして (足 × 銘柄) の2次元配列に並べる。上側の足りない所は NaN。
+    日付ではなく各銘柄自身の足で揃えるので、列ごとの rolling が銘柄ごとの rolling と同じ窓・同じ値になる。"""
+    rows = max((len(c) for c in closes), default=0)
+    panel = np.full((rows, len(closes)), np.nan)
+    for j, close in enumerate(closes):
+        if len(close): panel[rows - len(close):, j] = close
+    return panel
+
+class _PanelWindowIndexer(BaseIndexer):
+    """パネルを銘柄ごとに縦につないだ1本の配列用。rolling の窓が隣の銘柄にまたがらないようにする。"""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = end - self.window_size
+        column_start = end - 1 - (end - 1) % self.rows
+        return np.maximum(start, column_start), end
+
+def _rolling_panel(panel: np.ndarray, window: int, how: str = "mean") -> np.ndarray:
+    """(足 × 銘柄) パネルの各列に rolling(window).mean()/.std() をかけた同じ形のパネルを返す。
+    pandas の rolling 本体を全銘柄まとめて1回だけ呼ぶので、1銘柄ずつ Series.rolling した値とビット単位で一致する。"""
+    rows, cols = panel.shape
+    if rows == 0 or cols == 0: return np.full(panel.shape, np.nan)
+    flat = pd.Series(np.ascontiguousarray(panel.T).ravel())
+    indexer = _PanelWindowIndexer(window_size=window, rows=rows)
+    roller = flat.rolling(window=indexer, min_periods=window)
+    out = roller.std() if how == "std" else roller.mean()
+    return out.to_numpy().reshape(cols, rows).T
+
+def calc_signal_panel(panel: np.ndarray, prices: np.ndarray, rsi_period=14, ma_window=75, bb_window=20, num_std=2) -> Dict[str, np.ndarray]:
+    """終値パネルの最終足について RSI・75日線・ボリンジャーバンド・売買スコアを全銘柄一括で計算する。
+    _calc_rsi / _calc_bollinger_bands で1銘柄ずつ計算した最終値と同じ値になる。"""
+    prices = np.asarray(prices, dtype=float)
+    # 上詰めの NaN は「その銘柄にはまだ足が無い」所。rolling は NaN を飛ばすので結果に影響しない
+    padding = np.cumsum(~np.isnan(panel), axis=0) == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # 差分が NaN の所は 0 扱い（Series.where と同じ）
+        delta = np.diff(panel, axis=0, prepend=np.nan)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        gain[padding] = np.nan
+        loss[padding] = np.nan
+        rs = _rolling_panel(gain, rsi_period)[-1] / _rolling_panel(loss, rsi_period)[-1]
+        rsi = 100 - (100 / (1 + rs))
+
+        ma75 = _rolling_panel(panel, ma_window)[-1]
+        bb_mean = _rolling_panel(panel, bb_window)[-1]
+        bb_std = _rolling_panel(panel, bb_window, "std")[-1]
+        upper = bb_mean + (bb_std * num_std)
+        lower = bb_mean - (bb_std * num_std)
+
+        # NaN との比較は False（スカラー版の if/elif と同じ挙動）
+        score = np.select([rsi <= 30, rsi <= 40, rsi >= 70, rsi >= 60], [2, 1, -2, -1], 0)
+        score = score + np.where(prices > ma75, 1, -1)
+        score = score + np.select([prices <= lower, prices >= upper], [2, -2], 0)
+    return {"rsi": rsi, "ma75": ma75, "upper": upper, "lower": lower, "score": score}
+
+def _signal_icons(score: np.ndarray) -> np.ndarray:
+    return np.select([score >= 3, score >= 1, score == 0, score >= -2], SIGNAL_ICONS, "↓✖")
+
+def calc_signal_icons(hists: Dict[str, pd.DataFrame]) -> Dict[str, str]:
+    """銘柄ごとの日足から売買シグナル（signal_icon）をまとめて判定する。"""
+    codes, closes, prices = [], [], []
+    for code, hist in hists.items():
+        if hist is None or len(hist) < SIGNAL_MIN_BARS: continue
+        close = hist["Close"].to_numpy(dtype=float)
+        valid = close[~np.isnan(close)]
+        if not len(valid): continue
+        codes.append(code)
+        closes.append(close)
+        prices.append(valid[-1])
+    if not codes: return {}
+    res = calc_signal_panel(_close_panel(closes), np.array(prices))
+    return dict(zip(codes, _signal_icons(res["score"]).tolist()))
+
+def calc_signal_icons_incremental(hists: Dict[str, pd.DataFrame]) -> Dict[str, str]:
+    """calc_signal_icons と同じ判定を、銘柄ごとに保存した指標の途中状態（indicators.IndicatorState）から出す。
+    前回から増えた足だけを足すので1銘柄あたり O(新しい足の本数)。状態を合わせられない銘柄と、
+    直近の終値が横ばいの銘柄（IndicatorState.flat_window）は従来の一括計算に回す。"""
+    codes, scores = [], []
+    rest: Dict[str, pd.DataFrame] = {}
+    for code, hist in hists.items():
+        if hist is None or len(hist) < SIGNAL_MIN_BARS: continue
+        saved = local_store.load_indicator_state(code)
+        state = indicators.IndicatorState.from_dict(saved) if saved else None
+        before = (state.last_date, state.closes[-1]) if state is not None and state.closes else None
+        # 状態を合わせるのに使うのは直近の足だけ。日付は文字列にせず DatetimeIndex の整数値で照合する
+        tail = -indicators.KEEP_BARS
+        dates = pd.DatetimeIndex(hist.index).asi8[tail:].tolist()
+        state = indicators.sync_state(state, dates, hist["Close"].to_numpy(dtype=float)[tail:])
+        if state is None:
+            rest[code] = hist
+            continue
+        if (state.last_date, state.closes[-1]) != before: local_store.save_indicator_state(code, state.to_dict())
+        # 横ばいの窓はボリンジャーバンドの判定が rolling の誤差で決まるので、一括計算と同じ値を使う
+        if state.flat_window():
+            rest[code] = hist
+            continue
+        codes.append(code)
+        scores.append(state.signal_score())
+    out = dict(zip(codes, _signal_icons(np.array(scores, dtype=int)).tolist())) if codes else {}
+    if rest: out.update(calc_signal_icons(rest))
+    return out
+
+# ==========================================
+# 🧱 価格帯別出来高（需給の壁）
+# ==========================================
+def _round_frac(x: np.ndarray, digits: int) -> np.ndarray:
+    # 整数部がある値は小数 digits 桁、1未満の値は有効数字 digits 桁に丸める
+    frac, whole = np.modf(x)
+    out = x.copy()
+    target = np.isfinite(x) & (x != 0)
+    below_one = target & (whole == 0)
+    out[target & ~below_one] = np.around(x[target & ~below_one], digits)
+    for i in np.flatnonzero(below_one):
+        out[i] = np.around(x[i], -int(np.floor(np.log10(abs(frac[i])))) - 1 + digits)
+    return out
+
+def _cut_label_edges(edges: np.ndarray, precision: int = 3) -> np.ndarray:
+    """pd.cut が区間ラベルを作る時と同じ丸め（重複してしまう場合は桁を増やす）"""
+    for digits in range(precision, 20):
+        labels = _round_frac(edges, digits)
+        if np.unique(labels).size == edges.size: return labels
+    return _round_frac(edges, precision)
+
+def calc_volume_profile(close, volume, current_price: float, bins: int = 50) -> Dict[str, Any]:
+    """終値の価格帯ごとに出来高を集計する（pd.cut + groupby と同じ区間・同じ合計）。
+    各帯の中央値 mids・出来高 volumes と、現在値より上／下で出来高最大の帯 upper_wall / lower_wall を返す。"""
+    close = np.asarray(close, dtype=float)
+    volume = np.nan_to_num(np.asarray(volume, dtype=float))
+    p_min = min(np.nanmin(close), current_price * 0.9)
+    p_max = max(np.nanmax(close), current_price * 1.1)
+    edges = np.linspace(p_min, p_max, bins)
+    if np.unique(edges).size != edges.size: raise ValueError("Bin edges must be unique")
+
+    # 右閉区間 (a, b]。一番下の境界ちょうどの値は pd.cut と同じくどの帯にも入れない
+    ids = np.searchsorted(edges, close, side="left")
+    valid = ~np.isnan(close) & (ids > 0) & (ids < len(edges))
+    volumes = np.bincount(ids[valid] - 1, weights=volume[valid], minlength=len(edges) - 1)
+    labels = _cut_label_edges(edges)
+    mids = 0.5 * (labels[:-1] + labels[1:])
+
+    upper = mids > current_price
+    lower = mids < current_price
+    upper_wall = float(mids[upper][np.argmax(volumes[upper])]) if upper.any() else None
+    lower_wall = float(mids[lower][np.argmax(volumes[lower])]) if lower.any() else None
+    return {"mids": mids, "volumes": volumes, "upper_wall": upper_wall, "lower_wall": lower_wall}
+
+def _volume_wall_label(profile: Dict[str, Any], current_price: float) -> str:
+    upper_wall = profile["upper_wall"]
+    lower_wall = profile["lower_wall"]
+
+    threshold = 0.03
+    is_upper_battle = False
+    if upper_wall:
+        diff = abs(upper_wall - current_price) / current_price
+        if diff < threshold: is_upper_battle = True
         
-        if not upper_zone.empty:
-            upper_wall = upper_zone.loc[upper_zone['volume'].idxmax(), 'price']
-        if not lower_zone.empty:
-            lower_wall = lower_zone.loc[lower_zone['volume'].idxmax(), 'price']
-            
-        threshold = 0.03
-        is_upper_battle = False
+    is_lower_battle = False
+    if lower_wall:
+        diff = abs(lower_wall - current_price) / current_price
+        if diff < threshold: is_lower_battle = True
+    
+    if is_upper_battle:
+        return f"🔥上壁激戦中 ({upper_wall:,.0f}円)"
+    elif is_lower_battle:
+        return f"⚠️下壁激戦中 ({lower_wall:,.0f}円)"
+    else:
+        parts = []
         if upper_wall:
-            diff = abs(upper_wall - current_price) / current_price
-            if diff < threshold: is_upper_battle = True
-            
-        is_lower_battle = False
+            parts.append(f"🚧上壁 {upper_wall:,.0f}円")
         if lower_wall:
-            diff = abs(lower_wall - current_price) / current_price
-            if diff < threshold: is_lower_battle = True
-        
-        if is_upper_battle:
-            return f"🔥上壁激戦中 ({upper_wall:,.0f}円)"
-        elif is_lower_battle:
-            return f"⚠️下壁激戦中 ({lower_wall:,.0f}円)"
-        else:
-            parts = []
-            if upper_wall:
-                parts.append(f"🚧上壁 {upper_wall:,.0f}円")
-            if lower_wall:
-                parts.append(f"🛡️下壁 {lower_wall:,.0f}円")
-            if not parts: return "壁なし"
-            return " / ".join(parts)
+            parts.append(f"🛡️下壁 {lower_wall:,.0f}円")
+        if not parts: return "壁なし"
+        return " / ".join(parts)
 
+def _calc_volume_profile_wall(hist, current_price, bins=50):
+    try:
+        if hist is None or hist.empty:
+            return "—"
+        profile = calc_volume_profile(hist["Close"].to_numpy(), hist["Volume"].to_numpy(), current_price, bins)
+        return _volume_wall_label(profile, current_price)
     except Exception:
         return "—"
 
@@ -125,122 +324,122 @@ def _calc_big_player_score(market_cap, pbr, volume_ratio):
         elif volume_ratio >= 1.5: score += 10
     return min(95, score)
 
+def calc_big_player_scores(market_cap, pbr, volume_ratio) -> np.ndarray:
+    """_calc_big_player_score の配列版（NaN は None と同じく加点なし）"""
+    with np.errstate(invalid="ignore"):
+        mc_oku = np.asarray(market_cap, dtype=float) / 100000000
+        pbr = np.asarray(pbr, dtype=float)
+        volume_ratio = np.asarray(volume_ratio, dtype=float)
+        score = np.select(
+            [(1000 <= mc_oku) & (mc_oku <= 2000), (500 <= mc_oku) & (mc_oku < 1000), (2000 < mc_oku) & (mc_oku <= 3000),
+             (300 <= mc_oku) & (mc_oku < 500), (3000 < mc_oku) & (mc_oku <= 10000)],
+            [50, 40, 35, 20, 10], 0)
+        score = score + np.where((0 < pbr) & (pbr < 1.0), 20, 0)
+        score = score + np.select([volume_ratio >= 3.0, volume_ratio >= 2.0, volume_ratio >= 1.5], [30, 20, 10], 0)
+    return np.minimum(95, score)
+
 def _fetch_with_retry(ticker_symbol):
+    """6ヶ月分の日足を取る。空のデータが返った時は再試行せずに None（存在しない銘柄。取得元がそう答えたので聞き直しても同じ）、
+    最後まで例外（通信エラー・拒否など一時的な失敗）だった時はその例外を投げる。"""
+    error: Optional[Exception] = None
     for attempt in range(MAX_RETRIES):
         try:
-            t = yf.Ticker(ticker_symbol)
-            hist = t.history(period="6mo")
-            if hist is not None and not hist.empty:
-                return t, hist
-            else:
-                raise ValueError("Empty Data")
-        except Exception:
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
-            else:
-                return None, None
-    return None, None
+            _rate_limiter.acquire()
+            with metrics.stage("history"):
+                hist = _provider.history(ticker_symbol, period="6mo")
+            return hist if hist is not None and not hist.empty else None
+        except Exception as e:
+            error = e
+        if attempt < MAX_RETRIES - 1:
+            metrics.count_retry()
+            with metrics.stage("backoff"):
+                time.sleep(_backoff_delay(attempt))
+    if error is not None: raise error
+    return None
 
-def _scrape_yahoo_name(code: str) -> Optional[str]:
+def _download_history_batch(codes: List[str], start: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """複数銘柄の株価履歴（start 指定が無ければ6ヶ月分）をまとめて取得し、銘柄ごとのDataFrameに分けて返す。
+    取れなかった銘柄は結果に含めない（呼び出し側で個別取得に回す）。"""
+    if not codes: return {}
+    symbols = [f"{c}.T" for c in codes]
+    for _ in symbols: _rate_limiter.acquire()
     try:
-        url = f"https://finance.yahoo.co.jp/quote/{code}.T"
-        res = requests.get(url, headers=HEADERS, timeout=5)
-        if res.status_code == 200:
-            text = res.text
-            match = re.search(r'<title>(.*?)【', text)
-            if match:
-                return match.group(1).strip()
+        with metrics.stage("download"):
+            fetched = _provider.download(symbols, start=start, threads=min(MAX_WORKERS, len(symbols)))
     except Exception:
-        pass
-    return None
+        return {}
+    return {code: fetched[sym] for code, sym in zip(codes, symbols) if sym in fetched}
 
-def _fetch_single_stock(code4: str) -> dict:
-    time.sleep(get_sleep_time())
-    ticker = f"{code4}.T"
-    
-    t, hist = _fetch_with_retry(ticker)
-    
-    # ★ここを修正：データが取れない＝「存在しない銘柄」として統一
-    if t is None or hist is None:
-         return {
-            "code": code4, "name": "存在しない銘柄", "weather": "—", "price": None, 
-            "fair_value": None, "upside_pct": None, "note": "—", 
-            "dividend": None, "dividend_amount": None, "growth": None, 
-            "market_cap": None, "big_prob": None,
-            "signal_icon": "—", "volume_wall": "—",
-            "hist_data": None
-        }
+def _last_six_months(hist: pd.DataFrame) -> pd.DataFrame:
+    # period="6mo" で取った時と同じ範囲に揃える（保存データはそれより長いことがある）
+    cutoff = (pd.Timestamp.now(tz=hist.index.tz) - pd.DateOffset(months=6)).normalize()
+    return hist[hist.index >= cutoff]
 
-    try:
-        price = _safe_float(hist["Close"].dropna().iloc[-1], None)
-        current_volume = _safe_float(hist["Volume"].dropna().iloc[-1], 0)
-        
-        volume_wall = "—"
-        if len(hist) > 30 and price:
-            volume_wall = _calc_volume_profile_wall(hist, price)
-
-        signal_icon = "—"
-        if len(hist) > 75:
-            score = 0
-            rsi_series = _calc_rsi(hist["Close"])
-            rsi_val = rsi_series.iloc[-1] if not rsi_series.empty else 50
-            if rsi_val <= 30: score += 2
-            elif rsi_val <= 40: score += 1
-            elif rsi_val >= 70: score -= 2
-            elif rsi_val >= 60: score -= 1
-            
-            ma75 = hist["Close"].rolling(window=75).mean().iloc[-1]
-            if price > ma75: score += 1
-            else: score -= 1
-            
-            upper, lower = _calc_bollinger_bands(hist["Close"])
-            ub_val = upper.iloc[-1]
-            lb_val = lower.iloc[-1]
-            
-            if price <= lb_val: score += 2
-            elif price >= ub_val: score -= 2
-            
-            if score >= 3: signal_icon = "↑◎"
-            elif score >= 1: signal_icon = "↗〇"
-            elif score == 0: signal_icon = "→△"
-            elif score >= -2: signal_icon = "↘▲"
-            else: signal_icon = "↓✖"
-            
-    except Exception:
-        # 計算中のエラーも「存在しない」扱いに倒すか、計算エラーとする
-        # ここでは安全のため「存在しない」扱いにします
-        return {
-            "code": code4, "name": "存在しない銘柄", "weather": "—", "price": None, 
-            "fair_value": None, "upside_pct": None, "note": "—", 
-            "dividend": None, "dividend_amount": None, "growth": None, 
-            "market_cap": None, "big_prob": None,
-            "signal_icon": "—", "volume_wall": "—",
-            "hist_data": None
-        }
+def _load_history_batch(codes: List[str]) -> Dict[str, pd.DataFrame]:
+    """ローカル保存済みの日足に、前回保存以降の差分だけを取得して追記し、6ヶ月分を返す。"""
+    out: Dict[str, pd.DataFrame] = {}
+    full: List[str] = []
+    delta: Dict[str, pd.DataFrame] = {}
+    for code in codes:
+        stored = local_store.load_ohlcv(code)
+        if stored is None or len(stored) < 2:
+            full.append(code)
+            continue
+        age = local_store.ohlcv_age(code)
+        if age is not None and age < OHLCV_FRESH_SEC:
+            out[code] = stored
+        else:
+            delta[code] = stored
 
-    info = {}
-    try: info = t.info
-    except: pass
+    if delta:
+        # 最終足は取得時点で場中だった可能性があるので、最後から2本目の足から取り直す
+        start = min(df.index[-2] for df in delta.values()).strftime("%Y-%m-%d")
+        fetched = _download_history_batch(list(delta), start=start)
+        for code, stored in delta.items():
+            new = fetched.get(code)
+            if new is None: continue
+            check_date = stored.index[-2]
+            if check_date in new.index:
+                old_close = stored.at[check_date, "Close"]
+                new_close = new.at[check_date, "Close"]
+                if not np.isclose(old_close, new_close, rtol=1e-6, equal_nan=True):
+                    # 分割・配当で過去の調整後株価が変わった → 丸ごと取り直す
+                    full.append(code)
+                    continue
+            out[code] = local_store.save_ohlcv(code, new)
 
-    fast_info = {}
-    try: fast_info = t.fast_info
-    except: pass
+    if full:
+        fetched = _download_history_batch(full)
+        for code, hist in fetched.items():
+            out[code] = local_store.replace_ohlcv(code, hist)
 
-    def get_val(key_info, key_fast=None):
-        val = info.get(key_info)
-        if val is None and key_fast and fast_info:
-            try: val = getattr(fast_info, key_fast, None)
-            except: val = None
-        return _safe_float(val, None)
+    return {code: _last_six_months(hist) for code, hist in out.items() if hist is not None}
 
-    eps_trail  = get_val("trailingEps")
-    eps_fwd    = get_val("forwardEps")
-    bps        = get_val("bookValue")
-    roe        = get_val("returnOnEquity")
-    roa        = get_val("returnOnAssets")
-    market_cap = get_val("marketCap", "market_cap")
-    avg_volume = get_val("averageVolume")
-    
+def _scrape_yahoo_name(code: str) -> Optional[str]:
+    try:
+        _rate_limiter.acquire()
+        with metrics.stage("scrape"):
+            return _provider.name(code)
+    except Exception:
+        return None
+
+# ==========================================
+# 📑 財務データ（t.info）の取得と長期キャッシュ
+# ==========================================
+FUNDAMENTALS_TTL = _env_float("FUYASERU_FUNDAMENTALS_TTL", 7 * 24 * 3600)  # 決算期までほぼ変わらないので長め
+# グレアム数・スコア計算・銘柄名の判定で実際に使う項目だけを保存する
+FUNDAMENTAL_FIELDS = [
+    "trailingEps", "forwardEps", "bookValue", "returnOnEquity", "returnOnAssets",
+    "marketCap", "averageVolume", "dividendRate", "revenueGrowth",
+    "quoteType", "longName", "shortName",
+]
+_fundamentals_stats = {"hits": 0, "misses": 0}
+_fundamentals_lock = threading.Lock()
+
+def _resolve_name(info: dict, code4: str) -> str:
+    # 上場銘柄一覧にあれば通信せずにその銘柄名を使う
+    listing = master.get(code4)
+    if listing is not None and listing.name: return listing.name
     long_name = info.get("longName", info.get("shortName", None))
     need_scrape = False
     if not long_name: need_scrape = True
@@ -251,29 +450,54 @@ def _fetch_single_stock(code4: str) -> dict:
         if jp_name: long_name = jp_name
         else:
             if not long_name: long_name = f"({code4})"
+    return long_name
 
-    pbr = (price / bps) if (price and bps and bps > 0) else None
-    volume_ratio = 0
-    if avg_volume and avg_volume > 0: volume_ratio = current_volume / avg_volume
-    big_prob = _calc_big_player_score(market_cap, pbr, volume_ratio)
-    
-    div_rate = None
-    raw_div = info.get("dividendRate")
-    if raw_div is not None and price and price > 0: div_rate = (raw_div / price) * 100.0
+def _fetch_fundamentals(ticker: str, code4: str, price: Optional[float]) -> Dict[str, Any]:
+    info = {}
+    try:
+        _rate_limiter.acquire()
+        with metrics.stage("info"):
+            info = _provider.info(ticker)
+    except: pass
 
-    rev_growth = get_val("revenueGrowth")
-    if rev_growth: rev_growth *= 100.0
-    weather = _get_weather_icon(roe, roa)
+    fields = {key: info[key] for key in FUNDAMENTAL_FIELDS if key in info}
+    if fields.get("marketCap") is None:
+        try:
+            for _ in range(_provider.market_cap_requests): _rate_limiter.acquire()
+            with metrics.stage("fast_info"):
+                fields["marketCap"] = _provider.market_cap(ticker)
+        except: pass
+
+    fundamentals = {"info": fields, "name": _resolve_name(info, code4), "price": price}
+    # 取れなかった時（空の info）は保存せず、次回また取りに行く
+    if info:
+        local_store.save_fundamentals(code4, fundamentals)
+    return fundamentals
+
+def _get_fundamentals(ticker: str, code4: str, price: Optional[float]) -> Dict[str, Any]:
+    """財務データを返す。FUNDAMENTALS_TTL 以内に保存したものがあれば t.info は呼ばない。"""
+    cached = local_store.load_fundamentals(code4, FUNDAMENTALS_TTL)
+    with _fundamentals_lock:
+        _fundamentals_stats["hits" if cached is not None else "misses"] += 1
+    if cached is not None: return cached
+    return _fetch_fundamentals(ticker, code4, price)
 
+def get_fundamentals_stats() -> Dict[str, Any]:
+    with _fundamentals_lock:
+        stats = dict(_fundamentals_stats)
+    stats["entries"] = local_store.fundamentals_stats()["tickers"]
+    return stats
+
+# ==========================================
+# 🧙 理論株価（グレアム数）
+# ==========================================
+def calc_graham_fair_value(price: Optional[float], bps: Optional[float], eps_trail: Optional[float],
+                           eps_fwd: Optional[float], is_fund: bool = False) -> Tuple[Optional[float], str]:
+    """グレアム数 √(22.5 × EPS × BPS) による理論株価と、その根拠（または算出できない理由）を返す。"""
     fair_value = None
     note = "OK"
     calc_eps = None
     is_forecast = False
-    q_type = info.get("quoteType", "").upper()
-    short_name = info.get("shortName", "").upper()
-    is_fund = False
-    if q_type in ["ETF", "MUTUALFUND"]: is_fund = True
-    elif "ETF" in short_name or "REIT" in short_name or "リート" in str(long_name): is_fund = True
 
     if is_fund: note = "ETF/REITのため対象外"
     elif not price: note = "現在値不明"
@@ -297,41 +521,607 @@ def _fetch_single_stock(code4: str) -> dict:
                 if is_forecast: note = f"※予想EPS {calc_eps:,.1f} × BPS {bps:,.0f}"
                 else: note = f"EPS {calc_eps:,.1f} × BPS {bps:,.0f}"
             else: note = "資産毀損リスクあり"
+    return fair_value, note
+
+def _valuation(price: Optional[float], fundamentals: Dict[str, Any], code4: Optional[str] = None) -> Dict[str, Any]:
+    """財務データと現在値だけで出せる値（株価履歴は使わない）。大口介入の計算用に averageVolume も返す。
+    code4 が上場銘柄一覧にあれば、銘柄名と ETF/REIT の判定は一覧の方を使う。"""
+    info = fundamentals["info"]
+    listing = master.get(code4) if code4 else None
+
+    def get_val(key_info):
+        return _safe_float(info.get(key_info), None)
+
+    eps_trail  = get_val("trailingEps")
+    eps_fwd    = get_val("forwardEps")
+    bps        = get_val("bookValue")
+    roe        = get_val("returnOnEquity")
+    roa        = get_val("returnOnAssets")
+    market_cap = get_val("marketCap")
+    # 時価総額は財務データ取得時の株価からの変化分だけ補正する
+    ref_price = _safe_float(fundamentals.get("price"), None)
+    if market_cap and price and ref_price: market_cap = market_cap * (price / ref_price)
+    
+    long_name = listing.name if listing is not None and listing.name else fundamentals["name"]
+    pbr = (price / bps) if (price and bps and bps > 0) else None
+    
+    div_rate = None
+    raw_div = info.get("dividendRate")
+    if raw_div is not None and price and price > 0: div_rate = (raw_div / price) * 100.0
+
+    rev_growth = get_val("revenueGrowth")
+    if rev_growth: rev_growth *= 100.0
+    weather = _get_weather_icon(roe, roa)
+
+    if listing is not None and listing.market:
+        is_fund = listing.is_fund
+    else:
+        # 一覧に無い銘柄は quoteType と銘柄名から推測する
+        q_type = info.get("quoteType", "").upper()
+        short_name = info.get("shortName", "").upper()
+        is_fund = False
+        if q_type in ["ETF", "MUTUALFUND"]: is_fund = True
+        elif "ETF" in short_name or "REIT" in short_name or "リート" in str(long_name): is_fund = True
+
+    with metrics.stage("indicators"):
+        fair_value, note = calc_graham_fair_value(price, bps, eps_trail, eps_fwd, is_fund)
     
     upside_pct = None
     if price and fair_value: upside_pct = round((fair_value / price - 1.0) * 100.0, 2)
-
     return {
-        "code": code4, "name": long_name, "weather": weather, "price": price,
-        "fair_value": fair_value, "upside_pct": upside_pct, "note": note, 
-        "dividend": div_rate, "dividend_amount": raw_div,
-        "growth": rev_growth, "market_cap": market_cap, "big_prob": big_prob,
-        "signal_icon": signal_icon,
-        "volume_wall": volume_wall,
-        "hist_data": hist
+        "name": long_name, "weather": weather, "fair_value": fair_value, "upside_pct": upside_pct, "note": note,
+        "dividend": div_rate, "dividend_amount": raw_div, "growth": rev_growth, "market_cap": market_cap,
+        "pbr": pbr, "avg_volume": get_val("averageVolume"),
     }
 
-@st.cache_data(ttl=43200, show_spinner=False)
-def calc_fuyaseru_bundle(codes: List[str]) -> Dict[str, Dict[str, Any]]:
-    out = {}
-    total = len(codes)
-    progress_bar = None
+def _fetch_single_stock(code4: str, hist: Optional[pd.DataFrame] = None, signal_icon: Optional[str] = None) -> StockResult:
+    ticker = f"{code4}.T"
+    
+    if hist is None or hist.empty:
+        # 一括取得で取れなかった銘柄だけ個別に取り直す
+        try: hist = _fetch_with_retry(ticker)
+        except Exception:
+            # 一時的な失敗は「存在しない」とは決めない（ネガティブキャッシュに入れない）
+            return StockResult(code4, name=ERROR_NAME)
+        signal_icon = None
+        if hist is not None:
+            hist = _last_six_months(local_store.replace_ohlcv(code4, hist))
+    
+    # ★ここを修正：データが取れない＝「存在しない銘柄」として統一
+    if hist is None:
+         return StockResult(code4)
+
     try:
-        if total > 1: progress_bar = st.progress(0)
-    except: pass
+        price = _safe_float(hist["Close"].dropna().iloc[-1], None)
+        current_volume = _safe_float(hist["Volume"].dropna().iloc[-1], 0)
+        
+        with metrics.stage("indicators"):
+            volume_wall = "—"
+            volume_profile = None
+            if price:
+                # チャート側でも同じ集計を使い回すので結果に持たせる
+                try: volume_profile = calc_volume_profile(hist["Close"].to_numpy(), hist["Volume"].to_numpy(), price)
+                except Exception: volume_profile = None
+            if len(hist) > 30 and volume_profile is not None:
+                volume_wall = _volume_wall_label(volume_profile, price)
+
+            if signal_icon is None:
+                signal_icon = calc_signal_icons_incremental({code4: hist}).get(code4, "—")
+            
+    except Exception:
+        # 日足はあるので銘柄は存在する。計算エラーとして返す（表では「存在しない銘柄」と同じ表示）
+        return StockResult(code4, name=ERROR_NAME)
+
+    fundamentals = _get_fundamentals(ticker, code4, price)
+    values = _valuation(price, fundamentals, code4)
+    avg_volume = values.pop("avg_volume")
+    volume_ratio = 0
+    if avg_volume and avg_volume > 0: volume_ratio = current_volume / avg_volume
+    big_prob = _calc_big_player_score(values["market_cap"], values["pbr"], volume_ratio)
+
+    # 株価履歴はローカル保存を参照する。保存できていない時だけ配列で持たせる
+    ohlcv = None if local_store.has_ohlcv(code4) else local_store.OhlcvArrays.from_frame(hist)
+    return StockResult(
+        code=code4, price=price, **values, big_prob=big_prob,
+        signal_icon=signal_icon,
+        volume_wall=volume_wall,
+        volume_profile=volume_profile,
+        last_date=pd.Timestamp(hist.index[-1]).strftime("%Y-%m-%d"),
+        has_history=True, ohlcv=ohlcv
+    )
+
+# ==========================================
+# 📋 1銘柄分の分析結果
+# ==========================================
+MISSING_NAME = "存在しない銘柄"
+ERROR_NAME = "エラー"  # 一時的な取得失敗・計算エラー（表示は result_table で「存在しない銘柄」にそろえる）
+
+class StockResult:
+    """1銘柄分の分析結果。表に出すスカラー値と需給の壁の集計だけを持つ軽量レコード。
+    株価履歴（チャート用）は ohlcv を参照した時にローカル保存から読み込む。"""
+    __slots__ = (
+        "code", "name", "weather", "price", "fair_value", "upside_pct", "note",
+        "dividend", "dividend_amount", "growth", "market_cap", "pbr", "big_prob",
+        "signal_icon", "volume_wall", "volume_profile", "last_date", "has_history", "_ohlcv",
+    )
+    FIELDS = __slots__[:-2]
+
+    code: str
+    name: str
+    weather: str
+    price: Optional[float]
+    fair_value: Optional[float]
+    upside_pct: Optional[float]
+    note: str
+    dividend: Optional[float]
+    dividend_amount: Optional[float]
+    growth: Optional[float]
+    market_cap: Optional[float]
+    pbr: Optional[float]
+    big_prob: Optional[float]
+    signal_icon: str
+    volume_wall: str
+    volume_profile: Optional[Dict[str, Any]]
+    last_date: Optional[str]  # 日足の最終日（YYYY-MM-DD）。チャートのキャッシュキーに使う
+    has_history: bool
+
+    def __init__(self, code: str, name: str = MISSING_NAME, weather: str = "—", price=None,
+                 fair_value=None, upside_pct=None, note: str = "—", dividend=None, dividend_amount=None,
+                 growth=None, market_cap=None, pbr=None, big_prob=None, signal_icon: str = "—", volume_wall: str = "—",
+                 volume_profile=None, last_date: Optional[str] = None, has_history: bool = False, ohlcv: Optional[local_store.OhlcvArrays] = None):
+        self.code = code
+        self.name = name
+        self.weather = weather
+        self.price = price
+        self.fair_value = fair_value
+        self.upside_pct = upside_pct
+        self.note = note
+        self.dividend = dividend
+        self.dividend_amount = dividend_amount
+        self.growth = growth
+        self.market_cap = market_cap
+        self.pbr = pbr
+        self.big_prob = big_prob
+        self.signal_icon = signal_icon
+        self.volume_wall = volume_wall
+        self.volume_profile = volume_profile
+        self.last_date = last_date
+        self.has_history = has_history or ohlcv is not None
+        self._ohlcv = ohlcv
+
+    @property
+    def is_missing(self) -> bool:
+        """結果が無い（存在しない銘柄・取得/計算エラー）"""
+        return self.name == MISSING_NAME or self.name == ERROR_NAME
+
+    @property
+    def is_error(self) -> bool:
+        """一時的な失敗。次回また取りに行く"""
+        return self.name == ERROR_NAME
+
+    @property
+    def ohlcv(self) -> Optional[local_store.OhlcvArrays]:
+        """チャート用の6ヶ月分の日足。保存できなかった銘柄だけはメモリ上に持っている。"""
+        if self._ohlcv is not None: return self._ohlcv
+        if not self.has_history: return None
+        hist = local_store.load_ohlcv(self.code)
+        if hist is None: return None
+        return local_store.OhlcvArrays.from_frame(_last_six_months(hist))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+# ==========================================
+# 🗃️ 銘柄ごとの結果キャッシュ
+# ==========================================
+def _result_nbytes(result: StockResult) -> int:
+    """キャッシュ1エントリのおおよそのメモリ量（バイト）。配列は nbytes、それ以外は sys.getsizeof の合計。"""
+    size = sys.getsizeof(result)
+    for key in StockResult.FIELDS:
+        value = getattr(result, key)
+        if isinstance(value, dict):
+            size += sys.getsizeof(value) + sum(v.nbytes if isinstance(v, np.ndarray) else sys.getsizeof(v) for v in value.values())
+        elif value is not None:
+            size += sys.getsizeof(value)
+    if result._ohlcv is not None: size += result._ohlcv.nbytes
+    return size
+
+class _ResultCache:
+    """銘柄コード1つにつき1エントリを持つTTL付きキャッシュ（プロセス内で共有）。
+    合計サイズが max_bytes を超えたら、最後に使われたのが古い順に捨てる（LRU）。"""
+
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # code -> (保存時刻, 結果, バイト数)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def _drop(self, code: str) -> None:
+        self.bytes -= self._data.pop(code)[2]
+
+    def get(self, code: str) -> Optional[StockResult]:
+        with self._lock:
+            entry = self._data.get(code)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self._data.move_to_end(code)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(code)
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def peek(self, code: str) -> Optional[StockResult]:
+        """ヒット・ミスの集計に数えずに有効なエントリを返す"""
+        with self._lock:
+            entry = self._data.get(code)
+            if entry is not None and time.time() - entry[0] < self.ttl: return entry[1]
+            return None
+
+    def put(self, code: str, result: StockResult) -> None:
+        size = _result_nbytes(result)
+        with self._lock:
+            if code in self._data: self._drop(code)
+            # 1件で上限を超えるものは入れない（入れると他が全部追い出される）
+            if size > self.max_bytes: return
+            self._data[code] = (time.time(), result, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
 
-    for i, code in enumerate(codes):
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expired = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else None,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+_result_cache = _ResultCache(RESULT_CACHE_TTL, int(RESULT_CACHE_MAX_MB * 1024 * 1024))
+
+def get_cache_stats() -> Dict[str, Any]:
+    return _result_cache.stats()
+
+def clear_cache() -> None:
+    _result_cache.clear()
+    _missing_cache.clear()
+
+# ==========================================
+# 🚫 存在しない銘柄（上場銘柄一覧で即判定 ＋ 取得元が存在しないと返した銘柄のネガティブキャッシュ）
+# ==========================================
+class _MissingCache:
+    """取得元が空のデータを返した銘柄を ttl 秒のあいだ覚えておく（DATA_DIR/missing.json に保存）。
+    一時的な失敗（例外）は入れない。"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, float]] = None  # 初回に保存済みを読み込む
+        self._added: Dict[str, float] = {}  # take_added() で渡していない追加分
+        self.persist = True  # False ならファイルに書かない（バッチのワーカーは親にまとめて書かせる）
+        self.hits = 0
+
+    def _codes(self) -> Dict[str, float]:
+        if self._data is None: self._data = local_store.load_missing_codes()
+        return self._data
+
+    def contains(self, code: str, count: bool = True) -> bool:
+        with self._lock:
+            ts = self._codes().get(code)
+            if ts is None: return False
+            if time.time() - ts >= self.ttl:
+                del self._data[code]
+                return False
+            if count: self.hits += 1
+            return True
+
+    def add(self, code: str) -> None:
+        with self._lock:
+            data = self._codes()
+            now = time.time()
+            # 保存するついでに期限切れを掃除する
+            for old in [c for c, ts in data.items() if now - ts >= self.ttl]: del data[old]
+            data[code] = self._added[code] = now
+            if self.persist: local_store.save_missing_codes(dict(data))
+
+    def take_added(self) -> Dict[str, float]:
+        """前回呼んでから add() された銘柄と時刻を返す。"""
+        with self._lock:
+            added, self._added = self._added, {}
+            return added
+
+    def merge(self, codes: Dict[str, float]) -> None:
+        """ほかのプロセスで見つかった銘柄をまとめて取り込み、1回だけ保存する。"""
+        if not codes: return
+        with self._lock:
+            data = self._codes()
+            now = time.time()
+            for old in [c for c, ts in data.items() if now - ts >= self.ttl]: del data[old]
+            for code, ts in codes.items(): data[code] = max(ts, data.get(code, 0.0))
+            if self.persist: local_store.save_missing_codes(dict(data))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data = {}
+            self._added = {}
+            self.hits = 0
+            local_store.save_missing_codes({})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            return {"entries": sum(1 for ts in self._codes().values() if now - ts < self.ttl), "hits": self.hits}
+
+_missing_cache = _MissingCache(MISSING_TTL)
+_unlisted_stats = {"hits": 0}
+_unlisted_lock = threading.Lock()
+
+def is_known_missing(code: str, count: bool = True) -> bool:
+    """取りに行かなくても「存在しない銘柄」と分かるか（上場銘柄一覧に無い・最近存在しないと判定した）。
+    count=False ならヒット数に数えない（同じ銘柄を速報と本計算の両方で調べるとき）。"""
+    if master.is_listed(code) is False:
+        if count:
+            with _unlisted_lock: _unlisted_stats["hits"] += 1
+        return True
+    return _missing_cache.contains(code, count)
+
+def get_missing_stats() -> Dict[str, Any]:
+    stats = _missing_cache.stats()
+    with _unlisted_lock: stats["unlisted"] = _unlisted_stats["hits"]
+    stats["ttl"] = MISSING_TTL
+    return stats
+
+def _fetch_and_cache(code: str, hist: Optional[pd.DataFrame] = None, signal_icon: Optional[str] = None) -> StockResult:
+    try:
+        res = _fetch_single_stock(code, hist, signal_icon)
+    except Exception:
+        return StockResult(code, name=ERROR_NAME)
+    # 取得失敗は結果キャッシュに入れない。存在しない銘柄だけはネガティブキャッシュで覚えておく
+    if res.is_error: return res
+    if res.is_missing: _missing_cache.add(code)
+    else: _result_cache.put(code, res)
+    return res
+
+# ==========================================
+# 🤝 同じ銘柄の同時取得をまとめる（プロセス内で共有）
+# ==========================================
+class _SingleFlight:
+    """銘柄ごとに取得中の Future を1つだけ持つ。後から来たセッションは同じ Future の結果を受け取る。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def claim(self, code: str) -> Tuple[Future, bool]:
+        """(Future, 自分が取得役か) を返す。取得役は finish() で必ず結果を渡すこと。"""
+        with self._lock:
+            flight = self._flights.get(code)
+            if flight is not None:
+                self.shared += 1
+                return flight, False
+            flight = Future()
+            self._flights[code] = flight
+            self.leaders += 1
+            return flight, True
+
+    def finish(self, code: str, flight: Future, result: Optional[StockResult] = None,
+               error: Optional[BaseException] = None) -> None:
+        if error is not None: flight.set_exception(error)
+        else: flight.set_result(result)
+        with self._lock:
+            if self._flights.get(code) is flight: del self._flights[code]
+
+    def relay(self, code: str, flight: Future) -> Callable[[Future], None]:
+        """実際の取得（executor の Future）が終わったら、その結果を flight に渡すコールバック"""
+        def _done(task: Future) -> None:
+            try: self.finish(code, flight, task.result())
+            except BaseException as e: self.finish(code, flight, error=e)
+        return _done
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._flights), "leaders": self.leaders, "shared": self.shared}
+
+_single_flight = _SingleFlight()
+
+def get_singleflight_stats() -> Dict[str, Any]:
+    return _single_flight.stats()
+
+def _fetch_in_run(run: metrics.RunMetrics, code: str, hist: Optional[pd.DataFrame], signal_icon: Optional[str]) -> StockResult:
+    # ワーカースレッド内の各段階の時間をこの銘柄の分として記録する
+    with metrics.bind(run, code), metrics.stage("total"):
+        return _fetch_and_cache(code, hist, signal_icon)
+
+# ==========================================
+# ⚡ 速報（現在値・理論株価・上昇余地だけ先に出す）
+# ==========================================
+QUICK_NAME = "取得中…"  # 財務データが未保存で銘柄名もまだ分からない行の表示
+
+def quick_quote(code4: str) -> StockResult:
+    """現在値と保存済みの財務データだけで作る速報。株価履歴を使う列（売買・需給の壁・大口介入）は空のまま。
+    財務データが未保存なら保存済みの日足の終値と銘柄名だけを返す（取得はせず、本計算で埋まる）。
+    財務データがあれば、保存済みの日足が古いときだけ直近の終値を軽く取得して（リクエスト1回）時価総額まで出す。
+    計算結果がキャッシュにあればそれを返す。取得に失敗しても「存在しない銘柄」にはしない（判定は本計算に任せる）。
+    ただし上場銘柄一覧に無い・最近存在しないと判定した銘柄は、取りに行かずに「存在しない銘柄」を返す
+    （ネガティブキャッシュのヒットは本計算の方で数える）。"""
+    cached = _result_cache.peek(code4)
+    if cached is not None: return cached
+    if is_known_missing(code4, count=False): return StockResult(code4)
+    age = local_store.ohlcv_age(code4)
+    stored = local_store.load_ohlcv(code4) if age is not None else None
+    close = stored["Close"].dropna() if stored is not None else None
+    stored_price = _safe_float(close.iloc[-1], None) if close is not None and not close.empty else None
+
+    fundamentals = local_store.load_fundamentals(code4, FUNDAMENTALS_TTL)
+    if fundamentals is None:
+        # 本計算がすぐ日足を取り直すので、ここで取得しても同じ銘柄に2回リクエストするだけになる
+        listing = master.get(code4)
+        name = listing.name if listing is not None and listing.name else QUICK_NAME
+        return StockResult(code4, name=name, price=stored_price)
+    price = stored_price if age is not None and age < OHLCV_FRESH_SEC else None
+    if price is None:
         try:
-            res = _fetch_single_stock(code)
-            out[code] = res
+            _rate_limiter.acquire()
+            price = _safe_float(_provider.quote(f"{code4}.T").get("price"), None)
         except Exception:
-            out[code] = {
-                "code": code, "name": "存在しない銘柄", "weather": "—", "price": None,
-                "fair_value": None, "upside_pct": None, "note": "—",
-                "dividend": None, "dividend_amount": None, "growth": None,
-                "market_cap": None, "big_prob": None, "signal_icon": "—", "volume_wall": "—",
-                "hist_data": None
-            }
-        if progress_bar: progress_bar.progress((i + 1) / total)
+            pass
+    # 取れなければ古い日足の終値で代用する
+    if price is None: price = stored_price
+    values = _valuation(price, fundamentals, code4)
+    values.pop("avg_volume")
+    return StockResult(code4, price=price, **values)
+
+def iter_quick_quotes(codes: List[str]) -> Iterator[Tuple[str, StockResult]]:
+    """quick_quote を並列に実行し、終わった銘柄から (code, 速報) を返す。"""
+    if not codes: return
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(codes)))) as executor:
+        futures = {executor.submit(quick_quote, code): code for code in codes}
+        for future in as_completed(futures):
+            code = futures[future]
+            try: yield code, future.result()
+            except Exception: yield code, StockResult(code, name=QUICK_NAME)
+
+def _flight_result(code: str, future: Future) -> StockResult:
+    try: return future.result()
+    except Exception: return StockResult(code, name=ERROR_NAME)
+
+def iter_fuyaseru_bundle(codes: List[str], use_cache: bool = True) -> Iterator[Tuple[str, StockResult]]:
+    """calc_fuyaseru_bundle の逐次版。出来た銘柄から (コード, 結果) を返す（順番は完了順）。
+    use_cache=False なら結果キャッシュを見ずに計算し直し、キャッシュを新しい結果で置き換える。"""
+    run = metrics.start_run(len(codes))
+    pending = []
+    for code in codes:
+        # 存在しないと分かっている銘柄は取りに行かない（リトライ待ちで何秒も止まらないように）
+        if is_known_missing(code):
+            run.rejected += 1
+            yield code, StockResult(code)
+            continue
+        cached = _result_cache.get(code) if use_cache else None
+        if cached is not None:
+            run.cache_hits += 1
+            yield code, cached
+        else:
+            pending.append(code)
+    if not pending:
+        run.finish()
+        return
+
+    # キャッシュに無い銘柄だけを並列取得（リクエスト間隔は _rate_limiter が全体で管理）
+    # 株価履歴は BATCH_SIZE 件ずつ一括取得し、チャンクごとに投入 → 終わった分からすぐ返す
+    # 他のセッションが取得中の銘柄は取りに行かず、その結果を待って受け取る
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(pending)))) as executor:
+        futures: Dict[Future, str] = {}
+        for start in range(0, len(pending), max(1, BATCH_SIZE)):
+            chunk = []
+            for code in pending[start:start + max(1, BATCH_SIZE)]:
+                flight, is_leader = _single_flight.claim(code)
+                if not is_leader:
+                    run.shared += 1
+                    futures[flight] = code
+                    continue
+                # 直前に他のセッションが取り終えていたらそれを使う
+                cached = _result_cache.peek(code) if use_cache else None
+                if cached is not None:
+                    _single_flight.finish(code, flight, cached)
+                    futures[flight] = code
+                    continue
+                chunk.append((code, flight))
+            if not chunk: continue
+            try:
+                # 一括処理の時間はチャンク単位で記録（history_batch は wait / download を含む）
+                with metrics.bind(run):
+                    with metrics.stage("history_batch"):
+                        hists = _load_history_batch([code for code, _ in chunk])
+                    with metrics.stage("signals"):
+                        signals = calc_signal_icons_incremental(hists)
+            except BaseException as e:
+                # 取得役のまま放置すると待っている他のセッションが止まるので必ず終わらせる
+                for code, flight in chunk: _single_flight.finish(code, flight, error=e)
+                raise
+            for code, flight in chunk:
+                hist = hists.get(code)
+                signal = signals.get(code, "—") if hist is not None else None
+                task = executor.submit(_fetch_in_run, run, code, hist, signal)
+                task.add_done_callback(_single_flight.relay(code, flight))
+                futures[flight] = code
+            # 次のチャンクを取りに行く前に、終わっている分は先に返す
+            for future in [f for f in futures if f.done()]:
+                code = futures.pop(future)
+                yield code, _flight_result(code, future)
+        for future in as_completed(futures):
+            code = futures[future]
+            yield code, _flight_result(code, future)
+    run.finish()
+
+def iter_quick_and_full(codes: List[str]) -> Iterator[Tuple[str, StockResult, bool]]:
+    """速報（iter_quick_quotes）と本計算（iter_fuyaseru_bundle）を同時に走らせ、届いた順に (コード, 結果, 本計算か) を返す。
+    本計算が先に届いた銘柄の速報は返さない。本計算の例外はそのまま呼び出し側に投げる。"""
+    events: "queue.Queue" = queue.Queue()
+
+    def pump(tier: Iterator[Tuple[str, StockResult]], final: bool) -> None:
+        try:
+            for code, result in tier: events.put((code, result, final))
+        except BaseException as e:
+            events.put(e)
+        finally:
+            events.put(None)
+
+    threads = [threading.Thread(target=pump, args=(tier, final), daemon=True)
+               for tier, final in [(iter_quick_quotes(codes), False), (iter_fuyaseru_bundle(codes), True)]]
+    for t in threads: t.start()
+    finished = set()
+    running = len(threads)
+    while running:
+        event = events.get()
+        if event is None:
+            running -= 1
+        elif isinstance(event, BaseException):
+            raise event
+        else:
+            code, result, final = event
+            if code in finished: continue
+            if final: finished.add(code)
+            yield code, result, final
+
+def calc_fuyaseru_bundle(codes: List[str], progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, StockResult]:
+    """全銘柄の結果を入力順で返す。progress(済み件数, 全件数) を渡すと1銘柄ごとに呼ぶ。
+    progress を渡さずに Streamlit の画面から呼んだ時だけ進捗バーを出す（エンジン自体は Streamlit 無しで動く）。"""
+    out = {}
+    total = len(codes)
+    progress_bar = None
+    if progress is None and total > 1 and "streamlit" in sys.modules:
+        try:
+            import streamlit as st
+            progress_bar = st.progress(0)
+        except: pass
+
+    for code, result in iter_fuyaseru_bundle(codes):
+        out[code] = result
+        if progress is not None: progress(len(out), total)
+        if progress_bar: progress_bar.progress(len(out) / total)
     if progress_bar: progress_bar.empty()
-    return out
+    return {code: out[code] for code in codes}
@@ -0,0 +1,208 @@
+"""売買シグナルの指標（RSI・75日線・ボリンジャーバンド）を1本ずつ足して更新する状態。
+
+日々の更新では6ヶ月分を計算し直さず、窓の合計（値上がり幅・値下がり幅の合計、終値の合計・二乗和）に
+新しい足を足して窓から外れた足を引くだけで済ませる（足1本あたり O(1)）。
+場中に取った最終足の差し替えに備えて、窓より少し長く終値を持っておき、最後の足を取り消せるようにしている。
+値は _calc_rsi / _calc_bollinger_bands（pandas の rolling）と浮動小数点の誤差の範囲で一致する。
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence
+import math
+import numpy as np
+
+RSI_PERIOD = 14
+MA_WINDOW = 75
+BB_WINDOW = 20
+NUM_STD = 2
+KEEP_BARS = 128      # 持っておく終値の本数（窓 75 本＋取り消せる本数）
+RESYNC_EVERY = 250   # 足し引きの誤差がたまらないよう、この本数ごとに合計を計算し直す
+
+class IndicatorState:
+    """1銘柄分の指標の途中状態。to_dict / from_dict で保存・復元する。
+    dates は足の日付を表す値（照合にしか使わないので、日足の DatetimeIndex.asi8 の整数でも文字列でもよい）。"""
+    __slots__ = ("dates", "closes", "s_ma", "s_bb", "q_bb", "anchor", "gain", "loss", "ups", "downs", "since_resync")
+
+    def __init__(self):
+        self.dates: List[Any] = []
+        self.closes: List[float] = []
+        self.s_ma = 0.0         # 直近 MA_WINDOW 本の終値の合計
+        self.s_bb = 0.0         # 直近 BB_WINDOW 本の (終値 - anchor) の合計
+        self.q_bb = 0.0         # 同じく二乗和（anchor を引いておくと桁落ちしにくい）
+        self.anchor = 0.0
+        self.gain = 0.0         # 直近 RSI_PERIOD 本の値上がり幅の合計
+        self.loss = 0.0         # 同じく値下がり幅の合計
+        self.ups = 0            # 窓の中の値上がりの本数（0 なら gain はちょうど 0 にする）
+        self.downs = 0
+        self.since_resync = 0
+
+    @classmethod
+    def from_history(cls, dates: Sequence[Any], closes: Sequence[float]) -> "IndicatorState":
+        state = cls()
+        for date, close in zip(dates, closes):
+            state.push(date, close)
+        state.resync()
+        return state
+
+    @property
+    def last_date(self) -> Any:
+        return self.dates[-1] if self.dates else None
+
+    # --- 足の追加・取り消し ---
+    def _delta(self, i: int):
+        """buffer の i 本目の前日比（値上がり幅, 値下がり幅）。i == 0 は pandas と同じく 0 扱い。"""
+        if i <= 0: return 0.0, 0.0
+        d = self.closes[i] - self.closes[i - 1]
+        return (d, 0.0) if d > 0 else (0.0, -d if d < 0 else 0.0)
+
+    def _apply_delta(self, i: int, sign: int) -> None:
+        g, l = self._delta(i)
+        self.gain += sign * g
+        self.loss += sign * l
+        self.ups += sign * (g > 0)
+        self.downs += sign * (l > 0)
+
+    def push(self, date: Any, close: float) -> None:
+        if not self.closes: self.anchor = close
+        self.dates.append(date)
+        self.closes.append(close)
+        n = len(self.closes) - 1  # 追加した足の位置
+        self.s_ma += close
+        if n >= MA_WINDOW: self.s_ma -= self.closes[n - MA_WINDOW]
+        x = close - self.anchor
+        self.s_bb += x
+        self.q_bb += x * x
+        if n >= BB_WINDOW:
+            y = self.closes[n - BB_WINDOW] - self.anchor
+            self.s_bb -= y
+            self.q_bb -= y * y
+        self._apply_delta(n, 1)
+        if n >= RSI_PERIOD: self._apply_delta(n - RSI_PERIOD, -1)
+        self.since_resync += 1
+        # 古い足は捨てる（まとめて捨てるので1本あたりは O(1)）
+        if len(self.closes) > 2 * KEEP_BARS:
+            del self.closes[:-KEEP_BARS]
+            del self.dates[:-KEEP_BARS]
+        if self.since_resync >= RESYNC_EVERY: self.resync()
+
+    def can_pop(self) -> bool:
+        # 取り消した後も窓から外れた足を戻せるだけの本数が残っていること
+        return len(self.closes) > MA_WINDOW + 1
+
+    def pop(self) -> None:
+        """最後の足を取り消す（push の逆）。"""
+        n = len(self.closes) - 1
+        close = self.closes[n]
+        self.s_ma -= close
+        if n >= MA_WINDOW: self.s_ma += self.closes[n - MA_WINDOW]
+        x = close - self.anchor
+        self.s_bb -= x
+        self.q_bb -= x * x
+        if n >= BB_WINDOW:
+            y = self.closes[n - BB_WINDOW] - self.anchor
+            self.s_bb += y
+            self.q_bb += y * y
+        self._apply_delta(n, -1)
+        if n >= RSI_PERIOD: self._apply_delta(n - RSI_PERIOD, 1)
+        self.closes.pop()
+        self.dates.pop()
+
+    def resync(self) -> None:
+        """持っている終値から窓の合計を計算し直す（誤差のリセット）。"""
+        closes = self.closes
+        n = len(closes)
+        if not n: return
+        self.anchor = closes[max(0, n - BB_WINDOW)]
+        self.s_ma = math.fsum(closes[max(0, n - MA_WINDOW):])
+        bb = [c - self.anchor for c in closes[max(0, n - BB_WINDOW):]]
+        self.s_bb = math.fsum(bb)
+        self.q_bb = math.fsum(x * x for x in bb)
+        self.gain = self.loss = 0.0
+        self.ups = self.downs = 0
+        for i in range(max(0, n - RSI_PERIOD), n):
+            self._apply_delta(i, 1)
+        self.since_resync = 0
+
+    # --- 指標 ---
+    def values(self) -> Dict[str, float]:
+        """最終足の RSI・75日線・ボリンジャーバンド上下（足りない分は NaN）"""
+        n = len(self.closes)
+        nan = float("nan")
+        rsi = nan
+        if n >= RSI_PERIOD:
+            gain = self.gain / RSI_PERIOD if self.ups else 0.0
+            loss = self.loss / RSI_PERIOD if self.downs else 0.0
+            if loss > 0: rsi = 100 - (100 / (1 + gain / loss))
+            elif gain > 0: rsi = 100.0
+        ma = self.s_ma / MA_WINDOW if n >= MA_WINDOW else nan
+        upper = lower = nan
+        if n >= BB_WINDOW:
+            mean = self.s_bb / BB_WINDOW
+            std = math.sqrt(max(0.0, (self.q_bb - self.s_bb * mean) / (BB_WINDOW - 1)))
+            upper = self.anchor + mean + std * NUM_STD
+            lower = self.anchor + mean - std * NUM_STD
+        return {"rsi": rsi, "ma75": ma, "upper": upper, "lower": lower}
+
+    def flat_window(self) -> bool:
+        """直近 BB_WINDOW 本の終値がすべて同じか。この時の pandas の rolling の標準偏差は 0 にならず誤差が残り、
+        終値がバンドの下限ちょうどかどうかが誤差次第になるので、足し引きの値では同じ判定を再現できない。"""
+        window = self.closes[-BB_WINDOW:]
+        return len(window) == BB_WINDOW and max(window) == min(window)
+
+    def signal_score(self) -> int:
+        """calc_signal_panel と同じ配点の売買スコア（現在値は最終足の終値）"""
+        v = self.values()
+        price = self.closes[-1]
+        rsi = v["rsi"]
+        score = 0
+        if rsi <= 30: score += 2
+        elif rsi <= 40: score += 1
+        elif rsi >= 70: score -= 2
+        elif rsi >= 60: score -= 1
+        score += 1 if price > v["ma75"] else -1
+        if price <= v["lower"]: score += 2
+        elif price >= v["upper"]: score -= 2
+        return score
+
+    # --- 保存 ---
+    def to_dict(self) -> Dict[str, Any]:
+        data = {key: getattr(self, key) for key in self.__slots__}
+        data["dates"] = self.dates[-KEEP_BARS:]  # 窓の計算に要るのは直近の足だけ
+        data["closes"] = self.closes[-KEEP_BARS:]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional["IndicatorState"]:
+        state = cls()
+        try:
+            for key in cls.__slots__:
+                value = data[key]
+                setattr(state, key, list(value) if isinstance(value, list) else value)
+        except (KeyError, TypeError):
+            return None
+        return state
+
+def _find(dates: Sequence[Any], date: Any) -> Optional[int]:
+    # 状態の最後の足はたいてい日足の末尾近くにあるので後ろから探す
+    for i in range(len(dates) - 1, -1, -1):
+        if dates[i] == date: return i
+        if dates[i] < date: return None
+    return None
+
+def sync_state(state: Optional[IndicatorState], dates: Sequence[Any], closes: np.ndarray) -> Optional[IndicatorState]:
+    """保存済みの状態を最新の日足（dates / closes は古い順）に合わせる。
+    日付・終値が食い違う最後の足は取り消してから新しい足を足す。合わせられない時（分割・長い空白など）は作り直す。
+    終値に NaN がある場合は None（呼び出し側で従来の一括計算を使う）。"""
+    closes = np.asarray(closes, dtype=float)
+    tail = max(0, len(closes) - KEEP_BARS)
+    if not len(closes) or np.isnan(closes[tail:]).any(): return None
+    if state is not None and state.closes:
+        # 状態の最後の足が日足と同じ日付・同じ終値になるまで取り消す
+        i = _find(dates, state.last_date)
+        while state.can_pop() and (i is None or closes[i] != state.closes[-1]):
+            state.pop()
+            i = _find(dates, state.last_date)
+        if i is not None and closes[i] == state.closes[-1] and len(state.closes) > MA_WINDOW:
+            for j in range(i + 1, len(dates)):
+                state.push(dates[j], float(closes[j]))
+            return state
+    return IndicatorState.from_history(list(dates[tail:]), closes[tail:].tolist())
@@ -0,0 +1,300 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# ⚙️ 設定
+# ==========================================
+DATA_DIR = os.environ.get(
+    "FUYASERU_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fuyaseru_data")
+)
+OHLCV_DIR = os.path.join(DATA_DIR, "ohlcv")
+FUNDAMENTALS_DIR = os.path.join(DATA_DIR, "fundamentals")
+INDICATORS_DIR = os.path.join(DATA_DIR, "indicators")
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+try:
+    import pyarrow  # noqa: F401  Parquet の読み書きに必要
+    PARQUET_OK = True
+except Exception:
+    PARQUET_OK = False
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+def _lock_for(code: str) -> threading.Lock:
+    with _locks_guard:
+        if code not in _locks: _locks[code] = threading.Lock()
+        return _locks[code]
+
+def _tmp_path(path: str) -> str:
+    # バッチのワーカーは fork で作るのでスレッド ID だけだとプロセス間で重なりうる
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def _ohlcv_path(code: str) -> str:
+    return os.path.join(OHLCV_DIR, f"{code}.parquet")
+
+# ==========================================
+# 🗜️ メモリ上のコンパクトな日足（DataFrame の代わりに持つ配列）
+# ==========================================
+class OhlcvArrays:
+    """日足を float32（価格）/ int64（出来高）の配列で持つ。日付はタイムゾーンを外した現地時刻。"""
+    __slots__ = ("dates", "open", "high", "low", "close", "volume")
+
+    def __init__(self, dates: np.ndarray, open: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray):
+        self.dates = dates
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_frame(cls, hist: pd.DataFrame) -> "OhlcvArrays":
+        index = pd.DatetimeIndex(hist.index)
+        if index.tz is not None: index = index.tz_localize(None)
+        return cls(
+            dates=index.to_numpy(dtype="datetime64[ns]"),
+            open=hist["Open"].to_numpy(dtype=np.float32),
+            high=hist["High"].to_numpy(dtype=np.float32),
+            low=hist["Low"].to_numpy(dtype=np.float32),
+            close=hist["Close"].to_numpy(dtype=np.float32),
+            volume=np.nan_to_num(hist["Volume"].to_numpy(dtype=float)).astype(np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+# ==========================================
+# 📦 日足OHLCVの保存（銘柄ごとに1ファイルのParquet）
+# ==========================================
+def load_ohlcv(code: str) -> Optional[pd.DataFrame]:
+    """保存済みの日足を返す。無い・読めない場合は None。"""
+    if not PARQUET_OK: return None
+    path = _ohlcv_path(code)
+    if not os.path.exists(path): return None
+    try:
+        df = pd.read_parquet(path)
+    except Exception:
+        return None
+    if df.empty: return None
+    return df
+
+def has_ohlcv(code: str) -> bool:
+    return PARQUET_OK and os.path.exists(_ohlcv_path(code))
+
+def ohlcv_age(code: str) -> Optional[float]:
+    """最後に保存してからの経過秒数。保存が無ければ None。"""
+    try: return time.time() - os.path.getmtime(_ohlcv_path(code))
+    except OSError: return None
+
+def save_ohlcv(code: str, hist: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """取得した日足を保存済みデータに追記（同じ日付は新しい方で上書き）して保存し、結合後を返す。"""
+    if hist is None or hist.empty: return None
+    new = hist[[c for c in OHLCV_COLUMNS if c in hist.columns]]
+    if not PARQUET_OK: return new
+    with _lock_for(code):
+        old = load_ohlcv(code)
+        if old is not None:
+            merged = pd.concat([old, new])
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        else:
+            merged = new.sort_index()
+        merged.index.name = "Date"
+        try:
+            os.makedirs(OHLCV_DIR, exist_ok=True)
+            path = _ohlcv_path(code)
+            tmp = _tmp_path(path)
+            merged.to_parquet(tmp)
+            os.replace(tmp, path)  # 読み込み中の他スレッドが壊れたファイルを見ないように差し替え
+        except Exception:
+            pass
+    return merged
+
+def replace_ohlcv(code: str, hist: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """分割・配当で過去の調整後株価が変わった時用。保存済みを捨てて丸ごと入れ替える。"""
+    delete_ohlcv(code)
+    return save_ohlcv(code, hist)
+
+def delete_ohlcv(code: str) -> None:
+    with _lock_for(code):
+        try: os.remove(_ohlcv_path(code))
+        except OSError: pass
+    delete_indicator_state(code)  # 日足を入れ替えたら指標の途中状態も作り直す
+
+def clear_ohlcv() -> None:
+    clear_indicator_states()
+    if not os.path.isdir(OHLCV_DIR): return
+    for name in os.listdir(OHLCV_DIR):
+        if name.endswith(".parquet"): delete_ohlcv(name[:-len(".parquet")])
+
+def ohlcv_stats() -> Dict[str, float]:
+    files = 0
+    size = 0
+    if os.path.isdir(OHLCV_DIR):
+        for name in os.listdir(OHLCV_DIR):
+            if not name.endswith(".parquet"): continue
+            files += 1
+            try: size += os.path.getsize(os.path.join(OHLCV_DIR, name))
+            except OSError: pass
+    return {"tickers": files, "bytes": size}
+
+# ==========================================
+# 📑 財務データの保存（銘柄ごとに1ファイルのJSON）
+# ==========================================
+_fundamentals_memo: Dict[str, Dict[str, Any]] = {}
+_fundamentals_guard = threading.Lock()
+
+def _fundamentals_path(code: str) -> str:
+    return os.path.join(FUNDAMENTALS_DIR, f"{code}.json")
+
+def load_fundamentals(code: str, max_age: float) -> Optional[Dict[str, Any]]:
+    """max_age 秒以内に保存した財務データを返す。無い・古い場合は None。"""
+    with _fundamentals_guard:
+        entry = _fundamentals_memo.get(code)
+    if entry is None:
+        try:
+            with open(_fundamentals_path(code), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with _fundamentals_guard:
+            _fundamentals_memo[code] = entry
+    if time.time() - entry.get("fetched_at", 0) >= max_age: return None
+    return entry["data"]
+
+def save_fundamentals(code: str, data: Dict[str, Any]) -> None:
+    entry = {"fetched_at": time.time(), "data": data}
+    with _fundamentals_guard:
+        _fundamentals_memo[code] = entry
+    try:
+        os.makedirs(FUNDAMENTALS_DIR, exist_ok=True)
+        path = _fundamentals_path(code)
+        tmp = _tmp_path(path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+def clear_fundamentals() -> None:
+    with _fundamentals_guard:
+        _fundamentals_memo.clear()
+    if not os.path.isdir(FUNDAMENTALS_DIR): return
+    for name in os.listdir(FUNDAMENTALS_DIR):
+        try: os.remove(os.path.join(FUNDAMENTALS_DIR, name))
+        except OSError: pass
+
+def fundamentals_stats() -> Dict[str, int]:
+    files = 0
+    if os.path.isdir(FUNDAMENTALS_DIR):
+        files = sum(1 for name in os.listdir(FUNDAMENTALS_DIR) if name.endswith(".json"))
+    return {"tickers": files}
+
+# ==========================================
+# 🚫 取得元が「存在しない」と返した銘柄（{証券コード: 判定した時刻} を1ファイルのJSON）
+# ==========================================
+MISSING_PATH = os.path.join(DATA_DIR, "missing.json")
+
+def load_missing_codes() -> Dict[str, float]:
+    try:
+        with open(MISSING_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {str(k): float(v) for k, v in data.items()} if isinstance(data, dict) else {}
+
+def save_missing_codes(codes: Dict[str, float]) -> None:
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp = _tmp_path(MISSING_PATH)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(codes, f)
+        os.replace(tmp, MISSING_PATH)
+    except (OSError, TypeError, ValueError):
+        pass
+
+# ==========================================
+# 📐 売買シグナルの指標の途中状態（indicators.IndicatorState.to_dict をそのまま JSON に）
+# ==========================================
+_indicator_memo: Dict[str, Dict[str, Any]] = {}
+_indicator_guard = threading.Lock()
+
+def _indicator_path(code: str) -> str:
+    return os.path.join(INDICATORS_DIR, f"{code}.json")
+
+def load_indicator_state(code: str) -> Optional[Dict[str, Any]]:
+    with _indicator_guard:
+        data = _indicator_memo.get(code)
+    if data is None:
+        try:
+            with open(_indicator_path(code), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with _indicator_guard:
+            _indicator_memo[code] = data
+    return data
+
+def save_indicator_state(code: str, data: Dict[str, Any]) -> None:
+    with _indicator_guard:
+        _indicator_memo[code] = data
+    try:
+        os.makedirs(INDICATORS_DIR, exist_ok=True)
+        path = _indicator_path(code)
+        tmp = _tmp_path(path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data))  # dump より dumps（C の encoder）の方が速い
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+def delete_indicator_state(code: str) -> None:
+    with _indicator_guard:
+        _indicator_memo.pop(code, None)
+    try: os.remove(_indicator_path(code))
+    except OSError: pass
+
+def clear_indicator_states() -> None:
+    with _indicator_guard:
+        _indicator_memo.clear()
+    if not os.path.isdir(INDICATORS_DIR): return
+    for name in os.listdir(INDICATORS_DIR):
+        try: os.remove(os.path.join(INDICATORS_DIR, name))
+        except OSError: pass
+
+# ==========================================
+# 🔭 全銘柄スクリーナーの結果（1ファイル）
+# ==========================================
+SCREENER_PATH = os.path.join(DATA_DIR, "screener.parquet" if PARQUET_OK else "screener.pkl")
+
+def save_screener(df: pd.DataFrame) -> None:
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp = _tmp_path(SCREENER_PATH)
+        if PARQUET_OK: df.to_parquet(tmp)
+        else: df.to_pickle(tmp)
+        os.replace(tmp, SCREENER_PATH)
+    except Exception:
+        pass
+
+def load_screener() -> Optional[pd.DataFrame]:
+    if not os.path.exists(SCREENER_PATH): return None
+    try:
+        return pd.read_parquet(SCREENER_PATH) if PARQUET_OK else pd.read_pickle(SCREENER_PATH)
+    except Exception:
+        return None
+
+def screener_age() -> Optional[float]:
+    try: return time.time() - os.path.getmtime(SCREENER_PATH)
+    except OSError: return None
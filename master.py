@@ -0,0 +1,134 @@
+"""上場銘柄の一覧（証券コード → 銘柄名・市場区分・ETF/REIT かどうか・業種）をローカルのファイルから引く。
+
+JPX の「東証上場銘柄一覧」（data_j.xls）を CSV にしたもの（「コード」「銘柄名」「市場・商品区分」「33業種区分」列）をそのまま置けばよい。
+英語の列名（code / name / market / sector）でもよい。Excel のまま置く場合は xlrd / openpyxl が必要。
+初回に1回だけ読み込んでメモリに持ち、ファイルを置き換えると次の参照（最長 CHECK_INTERVAL 秒後）で読み直す。
+銘柄名を Yahoo!ファイナンスのページから取る通信や、銘柄名の文字列から ETF/REIT を推測する判定の代わりに使う。
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import os
+import re
+import threading
+import time
+import unicodedata
+import pandas as pd
+import local_store
+
+# ==========================================
+# ⚙️ 設定
+# ==========================================
+MASTER_FILE = os.environ.get("FUYASERU_MASTER_FILE", os.path.join(local_store.DATA_DIR, "master.csv"))
+CHECK_INTERVAL = 60.0  # ファイルが置き換わったかを確かめる間隔（秒）
+
+# 列名の候補（JPX の見出し → 英語の見出し）
+COLUMNS = {
+    "code": ["コード", "code"],
+    "name": ["銘柄名", "name"],
+    "market": ["市場・商品区分", "市場区分", "market"],
+    "sector": ["33業種区分", "業種", "sector"],
+}
+# 市場・商品区分にこれらを含む銘柄は ETF/REIT など（グレアム数の対象外）
+FUND_MARKETS = ("ETF", "ETN", "REIT", "ファンド")
+
+class Listing:
+    """1銘柄分の情報"""
+    __slots__ = ("code", "name", "market", "sector", "is_fund")
+
+    def __init__(self, code: str, name: Optional[str], market: Optional[str], sector: Optional[str]):
+        self.code = code
+        self.name = name
+        self.market = market
+        self.sector = sector
+        self.is_fund = bool(market) and any(key in market for key in FUND_MARKETS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+# ==========================================
+# 📖 読み込み
+# ==========================================
+def _read_table(path: str) -> Optional[pd.DataFrame]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xls", ".xlsx"):
+        try: return pd.read_excel(path, dtype=str)
+        except Exception: return None
+    # JPX の一覧を Excel で CSV にすると Shift_JIS になる
+    for encoding in ("utf-8-sig", "cp932"):
+        try: return pd.read_csv(path, dtype=str, encoding=encoding)
+        except UnicodeDecodeError: continue
+        except (OSError, ValueError): return None
+    return None
+
+def _text(value: Any) -> Optional[str]:
+    if value is None or (isinstance(value, float) and value != value): return None
+    text = str(value).strip()
+    return text if text and text != "-" else None
+
+def load(path: Optional[str] = None) -> Dict[str, Listing]:
+    """一覧ファイルを読み込んで {証券コード: Listing} を返す。ファイルが無い・読めない場合は空。"""
+    df = _read_table(path or MASTER_FILE)
+    if df is None or df.empty: return {}
+    names = {str(c).strip().lower(): c for c in df.columns}
+    cols = {key: next((names[c.lower()] for c in candidates if c.lower() in names), None) for key, candidates in COLUMNS.items()}
+    if cols["code"] is None: return {}
+
+    def column(key: str) -> List[Any]:
+        return df[cols[key]].tolist() if cols[key] is not None else [None] * len(df)
+
+    out: Dict[str, Listing] = {}
+    for code, name, market, sector in zip(column("code"), column("name"), column("market"), column("sector")):
+        m = re.search(r"[0-9A-Z]{4}", str(code).strip().upper())
+        if not m: continue
+        # JPX の銘柄名は英数字が全角なので、Yahoo の銘柄名と同じ半角にそろえる
+        name = _text(name)
+        out[m.group(0)] = Listing(m.group(0), unicodedata.normalize("NFKC", name) if name else None, _text(market), _text(sector))
+    return out
+
+# ==========================================
+# 🔎 参照（プロセス内で1つだけ持つ）
+# ==========================================
+_lock = threading.Lock()
+_index: Dict[str, Listing] = {}
+_state: Dict[str, Any] = {"path": None, "mtime": None, "checked_at": 0.0, "loaded_at": None}
+
+def _refresh(force: bool = False) -> None:
+    now = time.time()
+    if not force and now - _state["checked_at"] < CHECK_INTERVAL: return
+    with _lock:
+        if not force and now - _state["checked_at"] < CHECK_INTERVAL: return
+        _state["checked_at"] = now
+        path = MASTER_FILE
+        try: mtime = os.path.getmtime(path)
+        except OSError: mtime = None
+        if not force and path == _state["path"] and mtime == _state["mtime"]: return
+        global _index
+        _index = load(path) if mtime is not None else {}
+        _state.update(path=path, mtime=mtime, loaded_at=now if mtime is not None else None)
+
+def reload() -> int:
+    """一覧ファイルを今すぐ読み直す。読み込んだ銘柄数を返す。"""
+    _refresh(force=True)
+    return len(_index)
+
+def get(code: str) -> Optional[Listing]:
+    _refresh()
+    return _index.get(code)
+
+def is_listed(code: str) -> Optional[bool]:
+    """一覧に載っているか。一覧ファイルが無い（判定できない）時は None。"""
+    _refresh()
+    return (code in _index) if _index else None
+
+def codes() -> List[str]:
+    """一覧にある全銘柄の証券コード（ファイルの並び順）"""
+    _refresh()
+    return list(_index)
+
+def stats() -> Dict[str, Any]:
+    _refresh()
+    index = _index
+    return {
+        "entries": len(index), "funds": sum(1 for x in index.values() if x.is_fund),
+        "path": _state["path"], "loaded_at": _state["loaded_at"],
+    }
@@ -0,0 +1,173 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List, Optional
+from collections import deque
+from contextlib import contextmanager
+import io
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# ⏱️ 段階ごとの所要時間（銘柄ごと・実行ごと）
+# ==========================================
+# 銘柄ごとの段階（それぞれ重ならないように計る）
+#   wait        レート制限の待ち          history     個別の株価履歴取得
+#   backoff     リトライ前の待ち          info        t.info
+#   fast_info   fast_info の時価総額      scrape      日本語名の取得
+#   indicators  需給の壁・シグナル・グレアム数の計算
+#   total       その銘柄の処理全体
+# 一括処理の段階（チャンク単位）
+#   wait / download  一括取得のレート制限待ち・yf.download
+#   history_batch    保存データの読み書きを含む一括取得全体（wait / download を含む）
+#   signals          売買シグナルの一括計算
+TICKER_STAGES = ["wait", "history", "backoff", "info", "fast_info", "scrape", "indicators", "total"]
+MAX_RUNS = 20  # 保持する実行の数
+
+_local = threading.local()
+
+class RunMetrics:
+    """1回の分析実行（calc_fuyaseru_bundle / iter_fuyaseru_bundle 1回分）の計測結果"""
+
+    def __init__(self, total: int):
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{id(self) % 10000:04d}"
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.total = total
+        self.cache_hits = 0
+        self.shared = 0  # 他のセッションが取得中だったので結果を受け取った銘柄数
+        self.rejected = 0  # 上場銘柄一覧に無い・存在しないと分かっている銘柄（取得せずに返した数）
+        self.tickers: Dict[str, Dict[str, float]] = {}
+        self.retries: Dict[str, int] = {}
+        self.batches: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, code: Optional[str], stage: str, seconds: float) -> None:
+        with self._lock:
+            if code is None:
+                self.batches.setdefault(stage, []).append(seconds)
+            else:
+                rec = self.tickers.setdefault(code, {})
+                rec[stage] = rec.get(stage, 0.0) + seconds
+
+    def add_retry(self, code: Optional[str]) -> None:
+        if code is None: return
+        with self._lock:
+            self.retries[code] = self.retries.get(code, 0) + 1
+
+    def finish(self) -> None:
+        self.finished_at = time.time()
+
+    def summary(self) -> pd.DataFrame:
+        """段階ごとの件数・合計・p50・p95・最大（秒）。"""
+        with self._lock:
+            tickers = {code: dict(rec) for code, rec in self.tickers.items()}
+            batches = {stage: list(v) for stage, v in self.batches.items()}
+            retries = dict(self.retries)
+        rows = []
+        for stage in TICKER_STAGES:
+            values = [rec[stage] for rec in tickers.values() if stage in rec]
+            if values: rows.append(_stats("銘柄", stage, values))
+        for stage, values in batches.items():
+            rows.append(_stats("一括", stage, values))
+        if retries:
+            rows.append(_stats("銘柄", "retries（回）", list(retries.values())))
+        return pd.DataFrame(rows, columns=["scope", "stage", "count", "sum", "p50", "p95", "max"])
+
+    def ticker_frame(self) -> pd.DataFrame:
+        """銘柄ごとの各段階の秒数（1行1銘柄）"""
+        with self._lock:
+            rows = [{"run_id": self.run_id, "code": code, **rec, "retries": self.retries.get(code, 0)}
+                    for code, rec in self.tickers.items()]
+        return pd.DataFrame(rows, columns=["run_id", "code"] + TICKER_STAGES + ["retries"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = {stage: list(v) for stage, v in self.batches.items()}
+            tickers = [{"code": code, **rec, "retries": self.retries.get(code, 0)} for code, rec in self.tickers.items()]
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "total": self.total,
+            "cache_hits": self.cache_hits,
+            "shared": self.shared,
+            "rejected": self.rejected,
+            "summary": self.summary().to_dict(orient="records"),
+            "tickers": tickers,
+            "batches": batches,
+        }
+
+def _stats(scope: str, stage: str, values: List[float]) -> Dict[str, Any]:
+    arr = np.asarray(values, dtype=float)
+    return {
+        "scope": scope, "stage": stage, "count": len(arr), "sum": float(arr.sum()),
+        "p50": float(np.percentile(arr, 50)), "p95": float(np.percentile(arr, 95)), "max": float(arr.max()),
+    }
+
+# ==========================================
+# 🧵 計測先の切り替え（スレッドごと）
+# ==========================================
+@contextmanager
+def bind(run: Optional[RunMetrics], code: Optional[str] = None) -> Iterator[None]:
+    """このスレッドで計った時間を run（code 指定時はその銘柄）に記録する。"""
+    prev = (getattr(_local, "run", None), getattr(_local, "code", None))
+    _local.run, _local.code = run, code
+    try:
+        yield
+    finally:
+        _local.run, _local.code = prev
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    run = getattr(_local, "run", None)
+    if run is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.add(_local.code, name, time.perf_counter() - t0)
+
+def count_retry() -> None:
+    run = getattr(_local, "run", None)
+    if run is not None: run.add_retry(_local.code)
+
+# ==========================================
+# 🗂️ 直近の実行
+# ==========================================
+_runs: "deque[RunMetrics]" = deque(maxlen=MAX_RUNS)
+_runs_lock = threading.Lock()
+
+def start_run(total: int) -> RunMetrics:
+    run = RunMetrics(total)
+    with _runs_lock:
+        _runs.append(run)
+    return run
+
+def recent_runs() -> List[RunMetrics]:
+    with _runs_lock:
+        return list(_runs)
+
+def last_run() -> Optional[RunMetrics]:
+    with _runs_lock:
+        return _runs[-1] if _runs else None
+
+def clear_runs() -> None:
+    with _runs_lock:
+        _runs.clear()
+
+def export_csv(runs: Optional[List[RunMetrics]] = None) -> str:
+    """銘柄ごとの段階別秒数（全実行分）をCSVで返す。"""
+    runs = recent_runs() if runs is None else runs
+    frames = [r.ticker_frame() for r in runs]
+    df = pd.concat(frames, ignore_index=True) if frames else RunMetrics(0).ticker_frame()
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    return buf.getvalue()
+
+def export_json(runs: Optional[List[RunMetrics]] = None) -> str:
+    runs = recent_runs() if runs is None else runs
+    return json.dumps({"runs": [r.to_dict() for r in runs]}, ensure_ascii=False, indent=2)
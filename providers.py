@@ -0,0 +1,293 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import json
+import os
+import pickle
+import random
+import re
+import threading
+import time
+import pandas as pd
+
+# yfinance / requests は読み込みが重いので、Yahoo から実際に取得する時まで読み込まない
+yf = None
+
+def _yf():
+    global yf
+    if yf is None:
+        import yfinance
+        # yfinance 1.x は既定で取得エラーを握りつぶして空の表を返す（メンテナンス画面・HTTP エラーも「データなし」に見える）。
+        # 例外を出させて、一時的な失敗と存在しない銘柄を YahooProvider.history で分ける
+        yfinance.config.debug.hide_exceptions = False
+        yf = yfinance
+    return yf
+
+# ==========================================
+# 🔌 市場データの取得元（株価履歴・財務データ・銘柄名）
+# ==========================================
+class ProviderError(Exception):
+    """取得元の一時的な失敗（通信エラー・拒否など）。呼び出し側でリトライの対象になる。"""
+
+class MarketDataProvider:
+    """計算エンジンが使う取得処理の一覧。symbol は "7203.T" 形式、code は4桁の証券コード。"""
+
+    # market_cap() 1回で実際に送るリクエスト数（リクエスト間隔の管理で数える）
+    market_cap_requests = 1
+
+    def history(self, symbol: str, period: str = "6mo") -> Optional[pd.DataFrame]:
+        raise NotImplementedError
+
+    def download(self, symbols: List[str], start: Optional[str] = None, threads: int = 1) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の日足（start 指定が無ければ6ヶ月分）。取れなかった銘柄は結果に含めない。"""
+        raise NotImplementedError
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def market_cap(self, symbol: str) -> Optional[float]:
+        raise NotImplementedError
+
+    def name(self, code: str) -> Optional[str]:
+        """日本語の銘柄名（Yahoo!ファイナンス日本版のページタイトル）"""
+        raise NotImplementedError
+
+    def quote(self, symbol: str) -> Dict[str, Optional[float]]:
+        """現在値 price（速報用の軽い取得。リクエスト1回分）。既定は直近5日の日足の終値。
+        時価総額は取りに行かない（速報では保存済みの財務データから出す）。"""
+        hist = self.history(symbol, period="5d")
+        close = hist["Close"].dropna() if hist is not None and not hist.empty else None
+        return {"price": float(close.iloc[-1]) if close is not None and not close.empty else None}
+
+# ==========================================
+# 🌐 Yahoo（yfinance ＋ finance.yahoo.co.jp）
+# ==========================================
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+class YahooProvider(MarketDataProvider):
+    # fast_info.market_cap は1年分の日足と発行済株式数を別々に取りに行く
+    market_cap_requests = 2
+
+    def __init__(self):
+        # yf.download は内部でグローバルな作業領域を使うため同時に1つだけ実行する
+        self._download_lock = threading.Lock()
+
+    def history(self, symbol: str, period: str = "6mo") -> Optional[pd.DataFrame]:
+        """日足。Yahoo が「データが無い」と答えた時（上場廃止・存在しないコード）だけ None。
+        通信エラー・メンテナンス画面・HTTP エラーなどは ProviderError（存在しない銘柄と決めつけない）。"""
+        yf = _yf()
+        from yfinance.exceptions import YFPricesMissingError
+        try:
+            hist = yf.Ticker(symbol).history(period=period)
+        except YFPricesMissingError as e:
+            # 応答が HTTP エラーだった時も同じ例外になるので、ステータスコード付きのものは一時的な失敗とする
+            if "status_code" in (e.debug_info or ""): raise ProviderError(str(e)) from e
+            return None
+        except Exception as e:
+            raise ProviderError(f"{symbol}: {e!r}") from e
+        return hist if hist is not None and not hist.empty else None
+
+    def download(self, symbols: List[str], start: Optional[str] = None, threads: int = 1) -> Dict[str, pd.DataFrame]:
+        if not symbols: return {}
+        period_args = {"start": start} if start else {"period": "6mo"}
+        with self._download_lock:
+            data = _yf().download(
+                symbols, **period_args, group_by="ticker", auto_adjust=True,
+                actions=False, ignore_tz=False, progress=False, threads=max(1, threads)
+            )
+        if data is None or data.empty or not isinstance(data.columns, pd.MultiIndex):
+            return {}
+
+        out: Dict[str, pd.DataFrame] = {}
+        fetched = set(data.columns.get_level_values(0))
+        for sym in symbols:
+            if sym not in fetched: continue
+            # 他の銘柄に合わせて結合された日付（全列NaNの行）は落とす
+            hist = data[sym].dropna(how="all")
+            if hist.empty or hist["Close"].dropna().empty: continue
+            hist.columns.name = None
+            out[sym] = hist
+        return out
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        return _yf().Ticker(symbol).info or {}
+
+    def market_cap(self, symbol: str) -> Optional[float]:
+        return getattr(_yf().Ticker(symbol).fast_info, "market_cap", None)
+
+    def name(self, code: str) -> Optional[str]:
+        import requests
+        url = f"https://finance.yahoo.co.jp/quote/{code}.T"
+        res = requests.get(url, headers=HEADERS, timeout=5)
+        if res.status_code != 200: return None
+        match = re.search(r'<title>(.*?)【', res.text)
+        return match.group(1).strip() if match else None
+
+# ==========================================
+# 📼 記録と再生（オフラインで同じ結果を再現するためのフィクスチャ）
+# ==========================================
+# fixture_dir/
+#   history/7203.T.pkl      日足（DataFrame をそのまま pickle。取れなかった銘柄は None）
+#   info/7203.T.json        t.info
+#   market_cap/7203.T.json  fast_info.market_cap
+#   name/7203.json          日本語の銘柄名
+#   quote/7203.T.json       速報用の現在値
+def _fixture_path(fixture_dir: str, kind: str, key: str) -> str:
+    ext = "pkl" if kind == "history" else "json"
+    return os.path.join(fixture_dir, kind, f"{key}.{ext}")
+
+class RecordingProvider(MarketDataProvider):
+    """実際の取得元 inner を呼び、その応答をフィクスチャとして保存する。"""
+
+    def __init__(self, inner: MarketDataProvider, fixture_dir: str):
+        self.inner = inner
+        self.fixture_dir = fixture_dir
+        self.market_cap_requests = inner.market_cap_requests
+
+    def _write(self, kind: str, key: str, value: Any) -> None:
+        path = _fixture_path(self.fixture_dir, kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if kind == "history":
+            with open(tmp, "wb") as f: pickle.dump(value, f)
+        else:
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(value, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+
+    def _merge_history(self, symbol: str, hist: Optional[pd.DataFrame]) -> None:
+        # 差分取得分も含めて、銘柄ごとに取れた日足を全部ためておく
+        if hist is not None and not hist.empty:
+            old = _read_history(self.fixture_dir, symbol)
+            if old is not None and not old.empty:
+                hist = pd.concat([old, hist])
+                hist = hist[~hist.index.duplicated(keep="last")].sort_index()
+        elif os.path.exists(_fixture_path(self.fixture_dir, "history", symbol)):
+            return
+        self._write("history", symbol, hist)
+
+    def history(self, symbol: str, period: str = "6mo") -> Optional[pd.DataFrame]:
+        hist = self.inner.history(symbol, period=period)
+        self._merge_history(symbol, hist)
+        return hist
+
+    def download(self, symbols: List[str], start: Optional[str] = None, threads: int = 1) -> Dict[str, pd.DataFrame]:
+        out = self.inner.download(symbols, start=start, threads=threads)
+        for sym in symbols:
+            self._merge_history(sym, out.get(sym))
+        return out
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        info = self.inner.info(symbol)
+        self._write("info", symbol, info)
+        return info
+
+    def market_cap(self, symbol: str) -> Optional[float]:
+        value = self.inner.market_cap(symbol)
+        self._write("market_cap", symbol, value)
+        return value
+
+    def name(self, code: str) -> Optional[str]:
+        value = self.inner.name(code)
+        self._write("name", code, value)
+        return value
+
+    def quote(self, symbol: str) -> Dict[str, Optional[float]]:
+        value = self.inner.quote(symbol)
+        self._write("quote", symbol, value)
+        return value
+
+def _read_history(fixture_dir: str, symbol: str) -> Optional[pd.DataFrame]:
+    try:
+        with open(_fixture_path(fixture_dir, "history", symbol), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+class ReplayProvider(MarketDataProvider):
+    """記録済みフィクスチャを返す。通信は一切しない。
+    latency（秒）と jitter（秒）で応答待ちを、error_rate（0〜1）で一時的な失敗を擬似的に起こせる。
+    seed を固定すれば待ち時間・失敗の発生順も再現する。"""
+
+    def __init__(self, fixture_dir: str, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(self, what: str) -> None:
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+        if delay > 0: time.sleep(delay)
+        if fail: raise ProviderError(f"injected error: {what}")
+
+    def _read_json(self, kind: str, key: str) -> Any:
+        try:
+            with open(_fixture_path(self.fixture_dir, kind, key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def history(self, symbol: str, period: str = "6mo") -> Optional[pd.DataFrame]:
+        self._simulate(f"history {symbol}")
+        return _read_history(self.fixture_dir, symbol)
+
+    def download(self, symbols: List[str], start: Optional[str] = None, threads: int = 1) -> Dict[str, pd.DataFrame]:
+        self._simulate(f"download {len(symbols)} symbols")
+        out: Dict[str, pd.DataFrame] = {}
+        for sym in symbols:
+            hist = _read_history(self.fixture_dir, sym)
+            if hist is None or hist.empty: continue
+            if start is not None:
+                hist = hist[hist.index >= pd.Timestamp(start, tz=hist.index.tz)]
+                if hist.empty: continue
+            out[sym] = hist
+        return out
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        self._simulate(f"info {symbol}")
+        return self._read_json("info", symbol) or {}
+
+    def market_cap(self, symbol: str) -> Optional[float]:
+        self._simulate(f"market_cap {symbol}")
+        return self._read_json("market_cap", symbol)
+
+    def name(self, code: str) -> Optional[str]:
+        self._simulate(f"name {code}")
+        return self._read_json("name", code)
+
+    def quote(self, symbol: str) -> Dict[str, Optional[float]]:
+        value = self._read_json("quote", symbol)
+        if isinstance(value, dict):
+            self._simulate(f"quote {symbol}")
+            return value
+        # 速報を記録していないフィクスチャは日足から作る
+        return super().quote(symbol)
+
+# ==========================================
+# ⚙️ 環境変数からの選択
+# ==========================================
+def from_env(default_fixture_dir: str) -> MarketDataProvider:
+    """FUYASERU_PROVIDER = yahoo（既定）/ record / replay
+    record・replay のフィクスチャは FUYASERU_FIXTURE_DIR（既定は default_fixture_dir）に置く。"""
+    mode = os.environ.get("FUYASERU_PROVIDER", "yahoo").strip().lower()
+    fixture_dir = os.environ.get("FUYASERU_FIXTURE_DIR", default_fixture_dir)
+    if mode == "record":
+        return RecordingProvider(YahooProvider(), fixture_dir)
+    if mode == "replay":
+        def _f(name: str, default: float) -> float:
+            try: return float(os.environ.get(name, default))
+            except (TypeError, ValueError): return default
+        seed = os.environ.get("FUYASERU_REPLAY_SEED")
+        return ReplayProvider(
+            fixture_dir,
+            latency=_f("FUYASERU_REPLAY_LATENCY", 0.0),
+            jitter=_f("FUYASERU_REPLAY_JITTER", 0.0),
+            error_rate=_f("FUYASERU_REPLAY_ERROR_RATE", 0.0),
+            seed=int(seed) if seed and seed.lstrip("-").isdigit() else None,
+        )
+    return YahooProvider()
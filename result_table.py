@@ -0,0 +1,151 @@
+from __future__ import annotations
+from typing import Any, List
+import numpy as np
+import pandas as pd
+import fair_value_calc_y4 as fv
+
+# ==========================================
+# 📊 分析結果の表（表示用の整形・ランク付け）
+# ==========================================
+# ★フォーマット関数（列ごとにまとめて整形する。数値の配列を受け取り、NaN は「—」）
+def _fmt_values(values: np.ndarray, fmt: str) -> np.ndarray:
+    out = np.full(len(values), "—", dtype=object)
+    ok = ~np.isnan(values)
+    out[ok] = [fmt.format(v) for v in values[ok].tolist()]
+    return out
+def fmt_yen_values(values: np.ndarray) -> np.ndarray:
+    return _fmt_values(values, "{:,.0f} 円")
+def fmt_pct_values(values: np.ndarray) -> np.ndarray:
+    return _fmt_values(values, "{:.2f}%")
+def fmt_market_cap_values(values: np.ndarray) -> np.ndarray:
+    out = _fmt_values(values, "{:,.0f} 円")
+    cho = values >= 1e12
+    oku = (values >= 1e8) & ~cho
+    out[cho] = _fmt_values(values[cho] / 1e12, "{:.2f} 兆円")
+    out[oku] = _fmt_values(values[oku] / 1e8, "{:.0f} 億円")
+    return out
+def fmt_big_prob_values(values: np.ndarray) -> np.ndarray:
+    out = _fmt_values(values, "{:.0f}%")
+    for low, icon in [(40, "👀"), (60, "⚡"), (80, "🔥")]:
+        hit = values >= low
+        out[hit] = _fmt_values(values[hit], icon + " {:.0f}%")
+    return out
+
+# ★割安度評価（★の数）: 上昇余地 0 / 5 / 15 / 30 / 50% 以上で 1〜5。NaN・マイナスは 0
+RATING_EDGES = [0, 5, 15, 30, 50]
+STARS = np.array(["★" * n + "☆" * (5 - n) for n in range(6)], dtype=object)
+def calc_ratings(upside_pct: np.ndarray) -> np.ndarray:
+    return np.digitize(np.nan_to_num(upside_pct, nan=-np.inf), RATING_EDGES)
+def to_stars_values(ratings: np.ndarray) -> np.ndarray:
+    return STARS[np.clip(ratings, 0, 5)]
+
+def highlight_errors(val):
+    if val == "存在しない銘柄" or val == "エラー":
+        return 'color: #ff4b4b; font-weight: bold;'
+    return ''
+
+# ★ランクの色分け関数
+def highlight_rank_color(val):
+    if val == "SSS":
+        return 'background-color: #FFD700; color: #000000; font-weight: bold;'
+    elif val == "SS":
+        return 'background-color: #FF4500; color: #ffffff; font-weight: bold;'
+    elif val == "S":
+        return 'background-color: #FF69B4; color: #ffffff; font-weight: bold;'
+    elif val == "A":
+        return 'background-color: #22c55e; color: #ffffff; font-weight: bold;'
+    elif val == "B":
+        return 'background-color: #3b82f6; color: #ffffff; font-weight: bold;'
+    elif val == "C":
+        return 'background-color: #94a3b8; color: #ffffff; font-weight: bold;'
+    elif val in ["D", "E"]:
+        return 'background-color: #a855f7; color: #ffffff; font-weight: bold;'
+    return ''
+
+# ★ランク付け用のスコア計算（列ごとにまとめて計算）
+# 上昇余地 最大40点 ＋ 大口介入 最大30点 ＋ 事業の勢い 最大20点 ＋ 業績 最大10点
+RANKS = ["SSS", "SS", "S", "A", "B", "C", "D", "E"]
+RANK_MIN_SCORES = [95, 90, 85, 75, 60, 45, 30, 0]
+def calc_rank_scores(upside_pct, big_prob, growth, weather) -> np.ndarray:
+    up = np.nan_to_num(np.asarray(upside_pct, dtype=float), nan=0.0)
+    prob = np.nan_to_num(np.asarray(big_prob, dtype=float), nan=0.0)
+    gr = np.nan_to_num(np.asarray(growth, dtype=float), nan=0.0)
+    w = np.asarray(weather, dtype=object)
+    score = np.select([up >= 50, up >= 30, up >= 15, up > 0], [40, 30, 20, 10], 0)
+    score += np.select([prob >= 80, prob >= 60, prob >= 40], [30, 20, 10], 0)
+    score += np.select([gr >= 30, gr >= 10], [20, 10], 0)
+    score += np.select([w == "☀", w == "☁"], [10, 5], 0)
+    return score
+def score_to_rank(score) -> np.ndarray:
+    score = np.asarray(score)
+    return np.select([score >= s for s in RANK_MIN_SCORES], RANKS, "E").astype(object)
+
+TABLE_FIELDS = ["name", "weather", "price", "fair_value", "upside_pct", "dividend", "dividend_amount", "growth", "market_cap", "big_prob", "note", "signal_icon", "volume_wall"]
+
+def _num_values(values: List[Any]) -> np.ndarray:
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=float, copy=True)
+
+def _fill_dash(values: np.ndarray) -> np.ndarray:
+    return np.where(pd.isna(values), "—", values).astype(object)
+
+def bundle_to_df(bundle: Any, codes: List[str]) -> pd.DataFrame:
+    if isinstance(bundle, dict):
+        tickers = list(codes)
+        items = [bundle.get(code) for code in codes]
+    else:
+        tickers = [",".join(codes)]
+        items = [bundle]
+    is_result = [isinstance(v, fv.StockResult) for v in items]
+    # StockResult 以外（想定外の値）は「存在しない銘柄」として1行にする
+    cols = {key: np.array([getattr(v, key) if ok else None for v, ok in zip(items, is_result)], dtype=object) for key in TABLE_FIELDS}
+    missing = ~np.array(is_result, dtype=bool)
+    cols["name"][missing] = "存在しない銘柄"
+    cols["note"][missing] = "—"
+
+    failed = (cols["note"] == "データ取得不可(Yahoo拒否)") | (cols["name"] == "エラー") | (cols["name"] == "計算エラー")
+    cols["name"][failed] = "存在しない銘柄"
+    for key in ["note", "volume_wall", "signal_icon", "weather"]:
+        cols[key][failed] = "—"
+    cols["note"][cols["note"] == "ETF/REIT対象外"] = "ETF/REITのため対象外"
+
+    n = len(tickers)
+    error_mask = cols["name"] == "存在しない銘柄"
+    price = _num_values(cols["price"])
+    fair_value = _num_values(cols["fair_value"])
+    upside = _num_values(cols["upside_pct"])
+    growth = _num_values(cols["growth"])
+    big_prob = _num_values(cols["big_prob"])
+    price[error_mask] = np.nan
+    fair_value[error_mask] = np.nan
+
+    stars = to_stars_values(calc_ratings(upside))
+    stars[error_mask] = "—"
+    rank = score_to_rank(calc_rank_scores(upside, big_prob, growth, cols["weather"]))
+    rank[error_mask] = "—"
+    # 速報の行（株価履歴を使う列がまだ無い）は大口介入が入らないのでランクは出さない
+    quick = np.array([ok and not v.has_history for v, ok in zip(items, is_result)], dtype=bool)
+    rank[quick] = "—"
+    cols["note"][error_mask] = "—"
+
+    return pd.DataFrame({
+        "ランク": rank,
+        "証券コード": tickers,
+        "銘柄名": _fill_dash(cols["name"]),
+        "現在値": fmt_yen_values(price),
+        "理論株価": fmt_yen_values(fair_value),
+        "上昇余地": fmt_pct_values(upside),
+        "評価": stars,
+        "売買": _fill_dash(cols["signal_icon"]),
+        "需給の壁": _fill_dash(cols["volume_wall"]),
+        "詳細": np.zeros(n, dtype=bool),
+        "配当利回り": fmt_pct_values(_num_values(cols["dividend"])),
+        "年間配当": fmt_yen_values(_num_values(cols["dividend_amount"])),
+        "事業の勢い": fmt_pct_values(growth),
+        "業績": _fill_dash(cols["weather"]),
+        "時価総額": fmt_market_cap_values(_num_values(cols["market_cap"])),
+        "大口介入": fmt_big_prob_values(big_prob),
+        "根拠【グレアム数】": _fill_dash(cols["note"]),
+    }, index=pd.RangeIndex(1, n + 1))
@@ -0,0 +1,188 @@
+"""決まった時刻に株価履歴・財務データ・計算結果を先回りで更新するワーカー。
+
+Streamlit のセッションとは無関係にプロセス内で1本だけ動く（app.py から start() で起動）。
+単体で動かす場合:  python scheduler.py          # 常駐して決まった時刻に実行
+                   python scheduler.py --now    # 1回だけ今すぐ実行
+（単体で動かした場合に温まるのはローカル保存の株価履歴・財務データまで。計算結果のキャッシュはプロセスごと）
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from collections import deque
+import datetime as dt
+import json
+import os
+import threading
+import time
+import fair_value_calc_y4 as fv
+import local_store
+
+# ==========================================
+# ⚙️ 設定
+# ==========================================
+JST = dt.timezone(dt.timedelta(hours=9))
+# 実行時刻（日本時間・カンマ区切り）。既定は大引け（15:30）後
+PREFETCH_TIMES = os.environ.get("FUYASERU_PREFETCH_TIMES", "15:45")
+PREFETCH_WEEKDAYS_ONLY = os.environ.get("FUYASERU_PREFETCH_WEEKDAYS_ONLY", "1") != "0"
+PREFETCH_TOP = fv._env_int("FUYASERU_PREFETCH_TOP", 200)  # よく分析される銘柄を上位何件まで先回りするか
+WATCHLISTS_PATH = os.path.join(local_store.DATA_DIR, "watchlists.json")
+REQUEST_COUNTS_PATH = os.path.join(local_store.DATA_DIR, "request_counts.json")
+
+def _parse_times(text: str) -> List[dt.time]:
+    times = []
+    for part in text.split(","):
+        try:
+            hh, mm = part.strip().split(":")
+            times.append(dt.time(int(hh), int(mm)))
+        except ValueError:
+            continue
+    return sorted(times)
+
+# ==========================================
+# 📋 対象銘柄（ウォッチリスト＋よく分析される銘柄）
+# ==========================================
+_io_lock = threading.Lock()
+
+def _read_json(path: str, default: Any) -> Any:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def _write_json(path: str, data: Any) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def load_watchlists() -> Dict[str, List[str]]:
+    with _io_lock:
+        data = _read_json(WATCHLISTS_PATH, {})
+    return {str(name): [str(c) for c in codes] for name, codes in data.items()} if isinstance(data, dict) else {}
+
+def save_watchlist(name: str, codes: List[str]) -> None:
+    """ウォッチリストを登録（同名は上書き、空なら削除）"""
+    with _io_lock:
+        data = _read_json(WATCHLISTS_PATH, {})
+        if not isinstance(data, dict): data = {}
+        if codes: data[name] = list(dict.fromkeys(codes))
+        else: data.pop(name, None)
+        _write_json(WATCHLISTS_PATH, data)
+
+def record_request(codes: List[str]) -> None:
+    """ユーザーが分析した銘柄を数えておく（先回り対象の「よく分析される銘柄」の元データ）"""
+    if not codes: return
+    with _io_lock:
+        counts = _read_json(REQUEST_COUNTS_PATH, {})
+        if not isinstance(counts, dict): counts = {}
+        for code in codes:
+            counts[code] = int(counts.get(code, 0)) + 1
+        _write_json(REQUEST_COUNTS_PATH, counts)
+
+def top_requested(n: int = PREFETCH_TOP) -> List[str]:
+    with _io_lock:
+        counts = _read_json(REQUEST_COUNTS_PATH, {})
+    if not isinstance(counts, dict): return []
+    return [code for code, _ in sorted(counts.items(), key=lambda kv: (-int(kv[1]), kv[0]))[:max(0, n)]]
+
+def prefetch_codes() -> List[str]:
+    codes: List[str] = []
+    for watchlist in load_watchlists().values():
+        codes.extend(watchlist)
+    codes.extend(top_requested())
+    return list(dict.fromkeys(codes))
+
+# ==========================================
+# 🏃 実行
+# ==========================================
+class _PrefetchWorker:
+    def __init__(self, times: List[dt.time]):
+        self.times = times
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+        self.history: "deque[Dict[str, Any]]" = deque(maxlen=10)
+        self.status: Dict[str, Any] = {"running": False, "next_run_at": None, "current": None}
+
+    def next_run(self, now: Optional[dt.datetime] = None) -> Optional[dt.datetime]:
+        if not self.times: return None
+        now = now or dt.datetime.now(JST)
+        for days in range(8):
+            day = (now + dt.timedelta(days=days)).date()
+            if PREFETCH_WEEKDAYS_ONLY and day.weekday() >= 5: continue
+            for t in self.times:
+                at = dt.datetime.combine(day, t, tzinfo=JST)
+                if at > now: return at
+        return None
+
+    def run_once(self, codes: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """対象銘柄を取り直して計算結果のキャッシュを入れ替える。実行中なら何もしない。"""
+        if not self._run_lock.acquire(blocking=False): return None
+        codes = prefetch_codes() if codes is None else codes
+        record = {"started_at": time.time(), "codes": len(codes), "done": 0, "failed": 0, "duration": None, "error": None}
+        self.status["running"] = True
+        self.status["current"] = record
+        try:
+            # キャッシュに残っている結果も使わずに取り直す（株価履歴は差分、財務データは期限切れ分だけ）
+            for _, result in (fv.iter_fuyaseru_bundle(codes, use_cache=False) if codes else []):
+                record["done"] += 1
+                if result.is_missing: record["failed"] += 1
+        except Exception as e:
+            record["error"] = str(e)
+        finally:
+            record["duration"] = time.time() - record["started_at"]
+            self.history.append(record)
+            self.status["running"] = False
+            self.status["current"] = None
+            self._run_lock.release()
+        return record
+
+    def _loop(self) -> None:
+        while True:
+            at = self.next_run()
+            self.status["next_run_at"] = at.timestamp() if at else None
+            if at is None: return
+            # 時刻変更やスリープ復帰に備えて長くても1分ごとに起きて確認する
+            while dt.datetime.now(JST) < at:
+                time.sleep(min(60.0, max(0.0, (at - dt.datetime.now(JST)).total_seconds())))
+            self.run_once()
+
+    def start(self) -> bool:
+        if self._thread is not None and self._thread.is_alive(): return False
+        self._thread = threading.Thread(target=self._loop, name="fuyaseru-prefetch", daemon=True)
+        self._thread.start()
+        return True
+
+    def run_now(self) -> bool:
+        """別スレッドで今すぐ1回実行する（管理者メニューのボタン用）"""
+        if self.status["running"]: return False
+        threading.Thread(target=self.run_once, name="fuyaseru-prefetch-now", daemon=True).start()
+        return True
+
+_worker = _PrefetchWorker(_parse_times(PREFETCH_TIMES))
+
+def start() -> bool:
+    return _worker.start()
+
+def run_now() -> bool:
+    return _worker.run_now()
+
+def get_status() -> Dict[str, Any]:
+    status = dict(_worker.status)
+    if status["current"] is not None: status["current"] = dict(status["current"])
+    status["history"] = list(_worker.history)
+    status["times"] = [t.strftime("%H:%M") for t in _worker.times]
+    return status
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="株価履歴・財務データ・計算結果の先回り更新")
+    parser.add_argument("--now", action="store_true", help="1回だけ今すぐ実行して終了")
+    args = parser.parse_args()
+    if args.now:
+        print(_worker.run_once())
+    else:
+        _worker._loop()
@@ -0,0 +1,136 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import os
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+import fair_value_calc_y4 as fv
+import local_store
+import master
+from result_table import RANKS, RANK_MIN_SCORES, calc_rank_scores, score_to_rank
+
+# ==========================================
+# ⚙️ 設定
+# ==========================================
+# 上場銘柄一覧（CSV）。「コード」または「code」列、無ければ先頭列を証券コードとして読む
+# ファイルが無ければ master（JPX の上場銘柄一覧）の全銘柄を対象にする
+UNIVERSE_FILE = os.environ.get("FUYASERU_UNIVERSE_FILE", os.path.join(local_store.DATA_DIR, "universe.csv"))
+SNAPSHOT_EVERY = 500  # 途中経過を保存する間隔（銘柄数）
+
+COLUMNS = [
+    "code", "name", "rank", "score", "price", "fair_value", "upside_pct", "pbr", "market_cap",
+    "dividend", "growth", "big_prob", "weather", "signal_icon", "volume_wall", "note",
+]
+
+# ==========================================
+# 📜 対象銘柄
+# ==========================================
+def load_universe(path: Optional[str] = None) -> List[str]:
+    """上場銘柄一覧のCSVから4桁の証券コードを読み込む（重複は除く）。
+    path を省略して UNIVERSE_FILE も無い時は master の銘柄一覧、それも無ければ空。"""
+    if path is None and not os.path.exists(UNIVERSE_FILE): return master.codes()
+    path = path or UNIVERSE_FILE
+    try:
+        df = pd.read_csv(path, dtype=str, encoding="utf-8-sig")
+    except (OSError, ValueError):
+        return []
+    if df.empty: return []
+    col = next((c for c in df.columns if str(c).strip().lower() in ("コード", "code")), df.columns[0])
+    codes: List[str] = []
+    for x in df[col].dropna():
+        m = re.search(r"[0-9A-Z]{4}", str(x).strip().upper())
+        if m: codes.append(m.group(0))
+    return list(dict.fromkeys(codes))
+
+# ==========================================
+# 📋 計算結果の表
+# ==========================================
+def results_to_frame(results: List[fv.StockResult]) -> pd.DataFrame:
+    """分析結果を数値のままの表にする（存在しない銘柄は除く）。"""
+    rows = [r.to_dict() for r in results if not r.is_missing]
+    df = pd.DataFrame(rows, columns=list(fv.StockResult.FIELDS))
+    for col in ["price", "fair_value", "upside_pct", "pbr", "market_cap", "dividend", "growth", "big_prob"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["score"] = calc_rank_scores(df["upside_pct"], df["big_prob"], df["growth"], df["weather"])
+    df["rank"] = score_to_rank(df["score"])
+    return df[COLUMNS].sort_values(["score", "upside_pct"], ascending=False, na_position="last").reset_index(drop=True)
+
+# ==========================================
+# 🔎 絞り込み（保存済みの表に対する列演算だけなので即時）
+# ==========================================
+def filter_results(df: pd.DataFrame, min_rank: Optional[str] = None, max_pbr: Optional[float] = None,
+                   market_cap_oku: Optional[tuple] = None, min_upside: Optional[float] = None) -> pd.DataFrame:
+    mask = np.ones(len(df), dtype=bool)
+    if min_rank in RANKS:
+        mask &= df["score"].to_numpy() >= RANK_MIN_SCORES[RANKS.index(min_rank)]
+    if max_pbr is not None:
+        pbr = df["pbr"].to_numpy(dtype=float)
+        mask &= (pbr > 0) & (pbr < max_pbr)
+    if market_cap_oku is not None:
+        mc = df["market_cap"].to_numpy(dtype=float) / 1e8
+        mask &= (mc >= market_cap_oku[0]) & (mc <= market_cap_oku[1])
+    if min_upside is not None:
+        mask &= df["upside_pct"].to_numpy(dtype=float) >= min_upside
+    return df[mask]
+
+# ==========================================
+# 🏃 バックグラウンド計算（プロセス内で1本だけ）
+# ==========================================
+class _ScreenerJob:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._partial: Optional[pd.DataFrame] = None
+        self.status: Dict[str, Any] = {"running": False, "done": 0, "total": 0, "started_at": None, "finished_at": None, "error": None}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, codes: Optional[List[str]] = None) -> bool:
+        """計算を開始する。既に実行中・対象銘柄が無い場合は False。"""
+        with self._lock:
+            if self.running: return False
+            codes = codes if codes is not None else load_universe()
+            if not codes: return False
+            self.status = {"running": True, "done": 0, "total": len(codes), "started_at": time.time(), "finished_at": None, "error": None}
+            self._thread = threading.Thread(target=self._run, args=(codes,), name="fuyaseru-screener", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, codes: List[str]) -> None:
+        results: List[fv.StockResult] = []
+        try:
+            # 株価履歴の一括取得・シグナルの一括計算は iter_fuyaseru_bundle 側でまとめて行う
+            for _, result in fv.iter_fuyaseru_bundle(codes):
+                results.append(result)
+                self.status["done"] = len(results)
+                if len(results) % SNAPSHOT_EVERY == 0:
+                    self._partial = results_to_frame(results)
+            df = results_to_frame(results)
+            local_store.save_screener(df)
+            self._partial = None
+        except Exception as e:
+            self.status["error"] = str(e)
+        finally:
+            self.status["running"] = False
+            self.status["finished_at"] = time.time()
+
+    def partial(self) -> Optional[pd.DataFrame]:
+        return self._partial
+
+_job = _ScreenerJob()
+
+def start_screening(codes: Optional[List[str]] = None) -> bool:
+    return _job.start(codes)
+
+def get_status() -> Dict[str, Any]:
+    return dict(_job.status)
+
+def load_results() -> Optional[pd.DataFrame]:
+    """最新の計算結果。計算中は途中経過、無ければ前回保存分を返す。"""
+    partial = _job.partial()
+    if partial is not None: return partial
+    return local_store.load_screener()
@@ -0,0 +1,716 @@
+"""高速化した処理が元の処理と同じ結果を出すかの確認（合成データで新旧を突き合わせる）。
+
+    python verify.py                          # 全部
+    python verify.py signal-panel graham      # 名前を指定（一覧は --list）
+
+元の処理は1銘柄ずつ pandas で計算する素直な書き方で、ここに参照実装として残してある。
+1件でも食い違えば詳細を表示して終了コード 1 を返す。通信は一切しない。
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+# 保存先は確認専用の一時ディレクトリにする（local_store の読み込み前に設定）
+os.environ.setdefault("FUYASERU_DATA_DIR", tempfile.mkdtemp(prefix="fuyaseru_verify_"))
+os.environ.setdefault("FUYASERU_REQUESTS_PER_SEC", "0")
+
+import numpy as np
+import pandas as pd
+import fair_value_calc_y4 as fv
+
+SEED = 0
+CHECKS: List[Tuple[str, str, Callable[[], List[str]]]] = []
+
+def check(name: str, title: str):
+    """確認を登録する。name はコマンドラインで指定する名前。関数は食い違いの説明のリストを返す（空なら一致）。"""
+    def register(fn: Callable[[], List[str]]) -> Callable[[], List[str]]:
+        CHECKS.append((name, title, fn))
+        return fn
+    return register
+
+# ==========================================
+# 🧪 合成データ
+# ==========================================
+def make_hists(n: int, seed: int = SEED, bars: Tuple[int, int] = (60, 300)) -> Dict[str, pd.DataFrame]:
+    """値動きの荒い日足。横ばいの期間・終値の欠け（NaN）・丸めた株価・足りない本数を混ぜる。"""
+    rng = np.random.default_rng(seed)
+    hists = {}
+    for i in range(n):
+        size = int(rng.integers(*bars))
+        close = rng.uniform(50, 20000) * np.exp(np.cumsum(rng.normal(0, 0.02, size)))
+        close = np.round(close, int(rng.integers(0, 2)))
+        if i % 3 == 0:
+            for _ in range(int(rng.integers(1, 6))):
+                start = int(rng.integers(0, max(1, size - 30)))
+                close[start:start + int(rng.integers(2, 30))] = close[start]
+        if i % 7 == 0:
+            close[rng.integers(0, size, int(rng.integers(1, 4)))] = np.nan
+        index = pd.bdate_range(end="2026-10-16", periods=size, tz="Asia/Tokyo", name="Date")
+        volume = rng.integers(0, 3_000_000, size).astype(float)
+        hists[str(1300 + i)] = pd.DataFrame({"Close": close, "Volume": volume}, index=index)
+    return hists
+
+# ==========================================
+# 📈 売買シグナル
+# ==========================================
+def reference_signal_icon(hist: pd.DataFrame) -> str:
+    """一括計算にする前の _fetch_single_stock の判定（1銘柄ずつ pandas の rolling）"""
+    close = hist["Close"]
+    if len(hist) <= 75 or close.dropna().empty: return "—"
+    price = close.dropna().iloc[-1]
+    score = 0
+    # RSI・ボリンジャーバンドも元の _calc_rsi / _calc_bollinger_bands をそのまま書いておく（本体側の変更に引きずられないように）
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    rsi = (100 - (100 / (1 + gain / loss))).iloc[-1]
+    if rsi <= 30: score += 2
+    elif rsi <= 40: score += 1
+    elif rsi >= 70: score -= 2
+    elif rsi >= 60: score -= 1
+    score += 1 if price > close.rolling(window=75).mean().iloc[-1] else -1
+    rolling_mean = close.rolling(window=20).mean()
+    rolling_std = close.rolling(window=20).std()
+    upper = rolling_mean + (rolling_std * 2)
+    lower = rolling_mean - (rolling_std * 2)
+    if price <= lower.iloc[-1]: score += 2
+    elif price >= upper.iloc[-1]: score -= 2
+    if score >= 3: return "↑◎"
+    if score >= 1: return "↗〇"
+    if score == 0: return "→△"
+    if score >= -2: return "↘▲"
+    return "↓✖"
+
+def _diff_icons(expected: Dict[str, str], actual: Dict[str, str], limit: int = 10) -> List[str]:
+    bad = [f"{code}: {expected[code]} != {actual.get(code, '—')}" for code in expected if expected[code] != actual.get(code, "—")]
+    return bad[:limit] + ([f"… ほか {len(bad) - limit} 件"] if len(bad) > limit else [])
+
+@check("signal-panel", "calc_signal_icons（パネル一括）＝ 1銘柄ずつの判定")
+def check_signal_panel() -> List[str]:
+    hists = make_hists(1500)
+    return _diff_icons({code: reference_signal_icon(h) for code, h in hists.items()}, fv.calc_signal_icons(hists))
+
+def make_halted_hists(n: int, seed: int = SEED) -> Dict[str, pd.DataFrame]:
+    """make_hists に、銘柄ごとに違う休場・売買停止の日（足ごと抜ける）と上場前・上場廃止後の期間を加えたもの"""
+    rng = np.random.default_rng(seed)
+    hists = {}
+    for code, hist in make_hists(n, seed=seed, bars=(80, 320)).items():
+        keep = rng.random(len(hist)) >= rng.choice([0.0, 0.01, 0.05])
+        hists[code] = hist[keep].iloc[:len(hist) - int(rng.integers(0, 30))]
+    return hists
+
+@check("backtest-signals", "backtest の日ごとの判定 ＝ その日までの日足での1銘柄ずつの判定")
+def check_backtest_signals() -> List[str]:
+    import backtest
+    rng = np.random.default_rng(SEED + 22)
+    hists = make_halted_hists(300, seed=SEED + 22)
+    panels = backtest.build_panels(hists)
+    labels = np.array(backtest.SIGNAL_LABELS + ["—"], dtype=object)
+    icons = labels[backtest.signal_buckets(backtest.signal_score_history(panels["close"], panels["present"]))]
+    expected, actual = {}, {}
+    for j, code in enumerate(panels["codes"]):
+        hist = hists[code]
+        rows = panels["dates"].get_indexer(pd.DatetimeIndex(hist.index).tz_localize(None).normalize())
+        close = hist["Close"].to_numpy()
+        # 終値のある日だけ（終値が無い日はバックテストでは買えないので判定しない）
+        for k in rng.choice(np.flatnonzero(~np.isnan(close)), size=8):
+            expected[f"{code}@{k}"] = reference_signal_icon(hist.iloc[:k + 1])
+            actual[f"{code}@{k}"] = icons[rows[k], j]
+    return _diff_icons(expected, actual)
+
+@check("incremental-signals", "calc_signal_icons_incremental（1本ずつ更新）＝ calc_signal_icons（全部計算し直し）")
+def check_incremental_signals() -> List[str]:
+    import local_store
+    rng = np.random.default_rng(SEED + 23)
+    hists = make_hists(200, seed=SEED + 23, bars=(130, 300))
+    # 値動きの後で20本以上横ばいになる銘柄（rolling の標準偏差に誤差が残る形）を混ぜる
+    for code in list(hists)[1::5]:
+        hist = hists[code]
+        start = len(hist) - int(rng.integers(5, 45))
+        hist.iloc[start:, 0] = hist["Close"].iloc[start - 1]
+    local_store.clear_indicator_states()
+    problems: List[str] = []
+    # 最初は80本、以降は1日ずつ足を増やす。ときどき場中の値（後で差し替わる最終足）を挟む
+    for end in range(80, 301):
+        current = {}
+        for code, hist in hists.items():
+            if end > len(hist): continue
+            part = hist.iloc[:end]
+            if rng.random() < 0.15:
+                part = part.copy()
+                part.iloc[-1, 0] = part.iloc[-1, 0] * (1 + rng.normal(0, 0.01))
+            current[code] = part
+        if not current: break
+        incremental = fv.calc_signal_icons_incremental(current)
+        problems += [f"{end} 本目 {line}" for line in _diff_icons(fv.calc_signal_icons(current), incremental, limit=3)]
+        # ときどき元の1銘柄ずつの判定とも突き合わせる
+        if end % 20 == 0:
+            expected = {code: reference_signal_icon(hist) for code, hist in current.items()}
+            problems += [f"{end} 本目（元の判定）{line}" for line in _diff_icons(expected, incremental, limit=3)]
+        if len(problems) >= 10: break
+    saved = sum(local_store.load_indicator_state(code) is not None for code in hists)
+    if saved < len(hists) // 2: problems.append(f"途中状態が保存されていない（{saved} 銘柄）")
+    return problems[:10]
+
+# ==========================================
+# 🧱 価格帯別出来高（需給の壁）
+# ==========================================
+def reference_volume_profile(hist: pd.DataFrame, current_price: float, bins: int = 50) -> Tuple[np.ndarray, np.ndarray, str]:
+    """calc_volume_profile にする前の _calc_volume_profile_wall（pd.cut + groupby）。(帯の中央値, 出来高, 表示) を返す。"""
+    hist = hist.copy()
+    p_min = min(hist["Close"].min(), current_price * 0.9)
+    p_max = max(hist["Close"].max(), current_price * 1.1)
+    hist["bin"] = pd.cut(hist["Close"], bins=np.linspace(p_min, p_max, bins))
+    vol_profile = hist.groupby("bin", observed=False)["Volume"].sum()
+    wall_df = pd.DataFrame({"price": [b.mid for b in vol_profile.index], "volume": vol_profile.values})
+    upper_zone = wall_df[wall_df["price"] > current_price]
+    lower_zone = wall_df[wall_df["price"] < current_price]
+    upper_wall = upper_zone.loc[upper_zone["volume"].idxmax(), "price"] if not upper_zone.empty else None
+    lower_wall = lower_zone.loc[lower_zone["volume"].idxmax(), "price"] if not lower_zone.empty else None
+    if upper_wall and abs(upper_wall - current_price) / current_price < 0.03:
+        label = f"🔥上壁激戦中 ({upper_wall:,.0f}円)"
+    elif lower_wall and abs(lower_wall - current_price) / current_price < 0.03:
+        label = f"⚠️下壁激戦中 ({lower_wall:,.0f}円)"
+    else:
+        parts = ([f"🚧上壁 {upper_wall:,.0f}円"] if upper_wall else []) + ([f"🛡️下壁 {lower_wall:,.0f}円"] if lower_wall else [])
+        label = " / ".join(parts) if parts else "壁なし"
+    return wall_df["price"].to_numpy(), wall_df["volume"].to_numpy(), label
+
+@check("volume-profile", "calc_volume_profile（searchsorted + bincount）＝ pd.cut + groupby")
+def check_volume_profile() -> List[str]:
+    problems = []
+    for code, hist in make_hists(1000, seed=SEED + 6, bars=(31, 200)).items():
+        price = float(hist["Close"].dropna().iloc[-1])
+        mids, volumes, label = reference_volume_profile(hist, price)
+        profile = fv.calc_volume_profile(hist["Close"].to_numpy(), hist["Volume"].to_numpy(), price)
+        if not np.array_equal(mids, profile["mids"]): problems.append(f"{code}: 帯の中央値が違う")
+        elif not np.array_equal(volumes, profile["volumes"]): problems.append(f"{code}: 出来高が違う")
+        elif label != fv._volume_wall_label(profile, price): problems.append(f"{code}: {label} != {fv._volume_wall_label(profile, price)}")
+    return problems[:10]
+
+# ==========================================
+# 💴 理論株価（グレアム数）
+# ==========================================
+def reference_graham(price, bps, eps_trail, eps_fwd, is_fund) -> Tuple[Optional[float], str]:
+    """calc_graham_fair_value に切り出す前の _fetch_single_stock の計算"""
+    fair_value = None
+    note = "OK"
+    calc_eps = None
+    is_forecast = False
+    if is_fund: note = "ETF/REITのため対象外"
+    elif not price: note = "現在値不明"
+    elif bps is None: note = "財務データ取得失敗"
+    else:
+        if eps_trail is not None and eps_trail > 0:
+            calc_eps = eps_trail
+        elif eps_fwd is not None and eps_fwd > 0:
+            calc_eps = eps_fwd
+            is_forecast = True
+        if calc_eps is None:
+            if eps_trail is not None and eps_trail < 0: note = "赤字のため算出不可"
+            else: note = "算出不能"
+        else:
+            product = 22.5 * calc_eps * bps
+            if product > 0:
+                fair_value = round(np.sqrt(product), 0)
+                if is_forecast: note = f"※予想EPS {calc_eps:,.1f} × BPS {bps:,.0f}"
+                else: note = f"EPS {calc_eps:,.1f} × BPS {bps:,.0f}"
+            else: note = "資産毀損リスクあり"
+    return fair_value, note
+
+@check("graham", "calc_graham_fair_value ＝ 切り出す前の計算")
+def check_graham() -> List[str]:
+    rng = np.random.default_rng(SEED + 12)
+    # 欠損・ゼロ・マイナスを多めに混ぜる
+    def pick(values):
+        return values[int(rng.integers(len(values)))] if rng.random() < 0.3 else float(rng.uniform(-300, 4000))
+    problems = []
+    for _ in range(5000):
+        args = (pick([None, 0.0]), pick([None, 0.0, -100.0]), pick([None, 0.0, -5.0]), pick([None, 0.0, -5.0]), bool(rng.random() < 0.1))
+        expected, actual = reference_graham(*args), fv.calc_graham_fair_value(*args)
+        if expected != actual: problems.append(f"{args}: {expected} != {actual}")
+    return problems[:10]
+
+# ==========================================
+# 📋 結果の表
+# ==========================================
+def _ref_fmt(x, fmt) -> str:
+    if x is None or pd.isna(x) or str(x).lower() == 'nan': return "—"
+    try: return fmt(float(x))
+    except: return "—"
+def _ref_market_cap(v: float) -> str:
+    if v >= 1e12: return f"{v/1e12:.2f} 兆円"
+    elif v >= 1e8: return f"{v/1e8:.0f} 億円"
+    else: return f"{v:,.0f} 円"
+def _ref_big_prob(v: float) -> str:
+    if v >= 80: return f"🔥 {v:.0f}%"
+    if v >= 60: return f"⚡ {v:.0f}%"
+    if v >= 40: return f"👀 {v:.0f}%"
+    return f"{v:.0f}%"
+def _ref_rank(row) -> str:
+    up, prob, growth = [0 if pd.isna(row[key]) else row[key] for key in ("upside_pct_num", "prob_num", "growth_num")]
+    score = 40 if up >= 50 else 30 if up >= 30 else 20 if up >= 15 else 10 if up > 0 else 0
+    score += 30 if prob >= 80 else 20 if prob >= 60 else 10 if prob >= 40 else 0
+    score += 20 if growth >= 30 else 10 if growth >= 10 else 0
+    score += 10 if row["weather"] == '☀' else 5 if row["weather"] == '☁' else 0
+    for rank, low in zip(["SSS", "SS", "S", "A", "B", "C", "D"], [95, 90, 85, 75, 60, 45, 30]):
+        if score >= low: return rank
+    return "E"
+def _ref_rating(up) -> int:
+    if up is None or pd.isna(up): return 0
+    return next((n for n, low in zip([5, 4, 3, 2, 1], [50, 30, 15, 5, 0]) if up >= low), 0)
+
+def reference_bundle_to_df(bundle: Any, codes: List[str]) -> pd.DataFrame:
+    """列ごとの計算にする前の bundle_to_df（1行ずつ apply）"""
+    rows = []
+    if isinstance(bundle, dict):
+        for code in codes:
+            v = bundle.get(code)
+            if isinstance(v, fv.StockResult):
+                row = {"ticker": code, **v.to_dict()}
+                if row["note"] == "データ取得不可(Yahoo拒否)" or row["name"] == "エラー" or row["name"] == "計算エラー":
+                    row.update(name="存在しない銘柄", note="—", volume_wall="—", signal_icon="—", weather="—")
+                if row["note"] == "ETF/REIT対象外": row["note"] = "ETF/REITのため対象外"
+            else:
+                row = {"ticker": code, "name": "存在しない銘柄", "note": "—", "value": v}
+            rows.append(row)
+    else:
+        rows.append({"ticker": ",".join(codes), "name": "存在しない銘柄", "note": "—", "value": bundle})
+    df = pd.DataFrame(rows)
+    for col in ["name", "weather", "price", "fair_value", "upside_pct", "dividend", "dividend_amount", "growth", "market_cap", "big_prob", "note", "signal_icon", "volume_wall"]:
+        if col not in df.columns: df[col] = None
+    def _as_float(x):
+        try: return float(x)
+        except: return None
+    for src, dst in [("upside_pct", "upside_pct_num"), ("dividend", "div_num"), ("dividend_amount", "div_amount_num"),
+                     ("growth", "growth_num"), ("market_cap", "mc_num"), ("big_prob", "prob_num")]:
+        df[dst] = df[src].apply(_as_float)
+    df["stars"] = df["upside_pct_num"].apply(_ref_rating).apply(lambda n: "★" * n + "☆" * (5 - n))
+    error_mask = df["name"] == "存在しない銘柄"
+    df.loc[error_mask, "stars"] = "—"
+    df.loc[error_mask, "price"] = None
+    df.loc[error_mask, "fair_value"] = None
+    df.loc[error_mask, "note"] = "—"
+    df["ランク"] = df.apply(_ref_rank, axis=1)
+    df.loc[error_mask, "ランク"] = "—"
+    yen = lambda x: _ref_fmt(x, lambda v: f"{v:,.0f} 円")
+    pct = lambda x: _ref_fmt(x, lambda v: f"{v:.2f}%")
+    out = pd.DataFrame({
+        "ランク": df["ランク"], "証券コード": df["ticker"], "銘柄名": df["name"].fillna("—"),
+        "現在値": df["price"].apply(yen), "理論株価": df["fair_value"].apply(yen), "上昇余地": df["upside_pct_num"].apply(pct),
+        "評価": df["stars"], "売買": df["signal_icon"].fillna("—"), "需給の壁": df["volume_wall"].fillna("—"), "詳細": False,
+        "配当利回り": df["div_num"].apply(pct), "年間配当": df["div_amount_num"].apply(yen), "事業の勢い": df["growth_num"].apply(pct),
+        "業績": df["weather"].fillna("—"), "時価総額": df["mc_num"].apply(lambda x: _ref_fmt(x, _ref_market_cap)),
+        "大口介入": df["prob_num"].apply(lambda x: _ref_fmt(x, _ref_big_prob)), "根拠【グレアム数】": df["note"].fillna("—"),
+    })
+    out.index = out.index + 1
+    return out
+
+def make_bundle(n: int, seed: int = SEED) -> Dict[str, Any]:
+    """表の境目（★・ランク・兆円/億円・大口介入のアイコン）付近の値と欠損・エラーの行を混ぜた結果"""
+    rng = np.random.default_rng(seed)
+    def num(edges, scale):
+        r = rng.random()
+        if r < 0.1: return None
+        if r < 0.15: return float("nan")
+        if r < 0.4: return float(edges[int(rng.integers(len(edges)))])
+        return float(rng.uniform(-0.3, 1.2) * scale)
+    bundle: Dict[str, Any] = {}
+    for code in [str(1300 + i) for i in range(n)]:
+        r = rng.random()
+        if r < 0.03:
+            bundle[code] = None if r < 0.015 else "想定外"
+            continue
+        name = ["銘柄A", "銘柄B", fv.MISSING_NAME, "エラー", "計算エラー"][int(rng.choice(5, p=[0.5, 0.35, 0.05, 0.05, 0.05]))]
+        note = ["OK", "EPS 1.0 × BPS 2", "データ取得不可(Yahoo拒否)", "ETF/REIT対象外", None][int(rng.choice(5, p=[0.5, 0.3, 0.05, 0.1, 0.05]))]
+        bundle[code] = fv.StockResult(
+            code, name=name, weather=["☀", "☁", "☂", "—", None][int(rng.integers(5))],
+            price=num([0, 1, 999.5], 5000), fair_value=num([0, 1500.5], 8000), upside_pct=num([0, 5, 15, 30, 50, -0.001], 80),
+            note=note, dividend=num([0, 3.005], 6), dividend_amount=num([0, 10], 200), growth=num([10, 30, 9.999], 60),
+            market_cap=num([1e8, 1e12, 99_999_999, 999_999_999_999.9], 3e12), big_prob=num([40, 60, 80, 79.6], 100),
+            signal_icon=["↑◎", "→△", None][int(rng.integers(3))], volume_wall=["壁なし", None][int(rng.integers(2))],
+            has_history=True,
+        )
+    return bundle
+
+@check("result-table", "bundle_to_df（列ごとの計算）＝ 1行ずつの apply")
+def check_bundle_to_df() -> List[str]:
+    from result_table import bundle_to_df
+    # 速報の行（has_history=False）のランクを出さない扱いは後から足したものなので、ここでは全行を確定済みにする
+    problems = []
+    bundle = make_bundle(3000, seed=SEED + 14)
+    cases = [(bundle, list(bundle)), (bundle, list(bundle)[::-1][:50] + ["9999"]), ("取得失敗", ["1301", "1302"])]
+    for bundle, codes in cases:
+        expected, actual = reference_bundle_to_df(bundle, codes), bundle_to_df(bundle, codes)
+        if list(expected.columns) != list(actual.columns):
+            problems.append(f"列が違う: {list(actual.columns)}")
+            continue
+        if list(expected.index) != list(actual.index): problems.append("行番号が違う")
+        for col in expected.columns:
+            bad = [i for i, (a, b) in enumerate(zip(expected[col].tolist(), actual[col].tolist())) if a != b]
+            if bad: problems.append(f"{col}: {len(bad)} 行 (例 {expected[col].iloc[bad[0]]!r} != {actual[col].iloc[bad[0]]!r})")
+    return problems
+
+# ==========================================
+# 🏭 一括計算（プロセスプール）
+# ==========================================
+def write_fixtures(fixture_dir: str, codes: List[str], seed: int = SEED) -> None:
+    """providers.ReplayProvider が読む形のフィクスチャ（日足・財務データ・銘柄名）。最後の1銘柄は日足なし。"""
+    from bench import make_history, make_info
+    rng = np.random.default_rng(seed)
+    for kind in ("history", "info", "name"): os.makedirs(os.path.join(fixture_dir, kind), exist_ok=True)
+    for i, code in enumerate(codes):
+        hist = make_history(rng, bars=int(rng.integers(60, 250))) if i < len(codes) - 1 else None
+        with open(os.path.join(fixture_dir, "history", f"{code}.T.pkl"), "wb") as f: pickle.dump(hist, f)
+        with open(os.path.join(fixture_dir, "info", f"{code}.T.json"), "w", encoding="utf-8") as f: json.dump(make_info(rng, code), f)
+        with open(os.path.join(fixture_dir, "name", f"{code}.json"), "w", encoding="utf-8") as f: json.dump(f"検証{code}", f)
+
+def _run_batch(fixture_dir: str, codes: List[str], workers: int, out: str, data_dir: str) -> Optional[str]:
+    env = dict(os.environ, FUYASERU_PROVIDER="replay", FUYASERU_FIXTURE_DIR=fixture_dir, FUYASERU_DATA_DIR=data_dir)
+    proc = subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch.py"),
+                           *codes, "--workers", str(workers), "--chunk-size", "40", "--out", out, "--quiet"],
+                          env=env, capture_output=True, text=True)
+    return None if proc.returncode == 0 else proc.stderr.strip().splitlines()[-1:]
+
+@check("batch", "batch.py（1プロセス / 複数プロセス）＝ アプリの calc_fuyaseru_bundle")
+def check_batch() -> List[str]:
+    import providers
+    import screener
+    work = tempfile.mkdtemp(prefix="fuyaseru_verify_fixtures_")
+    codes = [str(2000 + i) for i in range(240)]
+    write_fixtures(work, codes, seed=SEED + 21)
+    # 日足なしの銘柄をチャンクごとに置く（missing.json にワーカー全部の分が残るか見る）
+    missing = set(codes[39::40])
+    for code in missing:
+        with open(os.path.join(work, "history", f"{code}.T.pkl"), "wb") as f: pickle.dump(None, f)
+    # アプリと同じ経路（このプロセスで逐次）の結果
+    fv.set_provider(providers.ReplayProvider(work))
+    fv.clear_cache()
+    bundle = fv.calc_fuyaseru_bundle(codes)
+    expected_path = os.path.join(work, "app.csv")
+    screener.results_to_frame([bundle[c] for c in codes]).to_csv(expected_path, index=False, encoding="utf-8-sig")
+    expected = pd.read_csv(expected_path, dtype={"code": str}).sort_values("code").reset_index(drop=True)
+    problems = []
+    for workers in (1, 3):
+        out = os.path.join(work, f"batch_{workers}.csv")
+        data_dir = tempfile.mkdtemp(prefix="fuyaseru_verify_batch_")
+        error = _run_batch(work, codes, workers, out, data_dir)
+        if error:
+            problems.append(f"workers={workers}: batch.py が失敗 {error}")
+            continue
+        with open(os.path.join(data_dir, "missing.json"), encoding="utf-8") as f: saved = set(json.load(f))
+        if saved != missing: problems.append(f"workers={workers}: missing.json の銘柄が違う（足りない {sorted(missing - saved)} / 余分 {sorted(saved - missing)}）")
+        actual = pd.read_csv(out, dtype={"code": str}).sort_values("code").reset_index(drop=True)
+        if len(actual) != len(expected): problems.append(f"workers={workers}: {len(actual)} 行 != {len(expected)} 行")
+        elif not actual.equals(expected):
+            cols = [c for c in expected.columns if not actual[c].equals(expected[c])]
+            problems.append(f"workers={workers}: 列 {cols} が違う")
+    return problems
+
+# ==========================================
+# 🔄 保存済み日足の差分更新
+# ==========================================
+@check("history-delta", "保存済みの日足は差分だけ取り足し、分割で過去の株価が変わった銘柄は丸ごと取り直す")
+def check_history_delta() -> List[str]:
+    import local_store
+    from bench import make_history
+    work = tempfile.mkdtemp(prefix="fuyaseru_verify_fixtures_")
+    os.makedirs(os.path.join(work, "history"), exist_ok=True)
+    rng = np.random.default_rng(SEED + 4)
+    # 3400: 古い保存に差分を足す / 3401: 保存後に 1:2 の分割（過去の調整後株価が半分になった）/ 3402: 保存したばかり
+    delta, split, fresh = "3400", "3401", "3402"
+    source = {code: make_history(rng, bars=150) for code in (delta, split, fresh)}
+    for code, hist in source.items():
+        with open(os.path.join(work, "history", f"{code}.T.pkl"), "wb") as f: pickle.dump(hist, f)
+        local_store.replace_ohlcv(code, hist.iloc[:-5] * (2 if code == split else 1))
+        if code != fresh:
+            old = time.time() - fv.OHLCV_FRESH_SEC - 60
+            os.utime(local_store._ohlcv_path(code), (old, old))
+    stored_before = {code: local_store.load_ohlcv(code) for code in source}
+    provider = _counting_replay(work)
+    fv.set_provider(provider)
+    problems = []
+    try:
+        got = fv._load_history_batch(list(source))
+        # 差分は古い方の2銘柄まとめて最後から2本目の足から、分割の銘柄だけ期間指定なしで取り直す
+        since = min(stored_before[c].index[-2] for c in (delta, split)).strftime("%Y-%m-%d")
+        expected = [([f"{delta}.T", f"{split}.T"], since), ([f"{split}.T"], None)]
+        if provider.downloads != expected: problems.append(f"一括取得 {provider.downloads} != {expected}")
+        for code in source:
+            stored = local_store.load_ohlcv(code)
+            want = stored_before[fresh] if code == fresh else source[code]
+            if stored is None or len(stored) != len(want) or not np.allclose(stored["Close"], want["Close"]):
+                problems.append(f"{code}: 保存された日足が {len(stored) if stored is not None else None} 本（{len(want)} 本のはず）か終値が違う")
+            if code not in got or not np.allclose(got[code]["Close"], fv._last_six_months(want)["Close"]):
+                problems.append(f"{code}: 返した日足が保存と合わない")
+        if not local_store.load_ohlcv(delta).index[:len(stored_before[delta])].equals(stored_before[delta].index):
+            problems.append(f"{delta}: 差分を足した時に前の足が変わった")
+    finally:
+        for code in source: local_store.delete_ohlcv(code)
+    return problems
+
+# ==========================================
+# ⚡ 速報
+# ==========================================
+def _counting_replay(fixture_dir: str):
+    """取得元へのリクエストを数える ReplayProvider（calls に "history 3100.T" のような文字列が並ぶ）。
+    一括取得は downloads に (銘柄, start) でも残す。"""
+    import providers
+
+    class CountingReplay(providers.ReplayProvider):
+        def __init__(self, fixture_dir: str, **kwargs):
+            super().__init__(fixture_dir, **kwargs)
+            self.calls: List[str] = []
+            self.downloads: List[Tuple[List[str], Optional[str]]] = []
+
+        def _simulate(self, what: str) -> None:
+            with self._lock: self.calls.append(what)
+            super()._simulate(what)
+
+        def download(self, symbols: List[str], start: Optional[str] = None, threads: int = 1) -> Dict[str, pd.DataFrame]:
+            with self._lock: self.downloads.append((sorted(symbols), start))
+            return super().download(symbols, start=start, threads=threads)
+
+    return CountingReplay(fixture_dir)
+
+@check("quick-tier", "速報は財務データ未保存の銘柄を取りに行かない・ネガティブキャッシュのヒットは1回だけ数える")
+def check_quick_tier() -> List[str]:
+    work = tempfile.mkdtemp(prefix="fuyaseru_verify_fixtures_")
+    codes = [str(3100 + i) for i in range(10)]
+    write_fixtures(work, codes, seed=SEED + 19)
+    provider = _counting_replay(work)
+    fv.set_provider(provider)
+    fv.clear_cache()
+    problems = []
+    try:
+        quick = dict(fv.iter_quick_quotes(codes))
+        if provider.calls: problems.append(f"財務データ未保存なのに速報で {len(provider.calls)} 回取得: {provider.calls[:3]}")
+        if len(quick) != len(codes): problems.append(f"速報が {len(quick)} 件（{len(codes)} 件のはず）")
+        full = fv.calc_fuyaseru_bundle(codes)
+        if not full[codes[-1]].is_missing: problems.append(f"{codes[-1]}: 日足なしなのに存在しない銘柄にならない")
+        # 結果キャッシュだけ捨てて、速報と本計算の両方がネガティブキャッシュを見る状態にする
+        fv._result_cache.clear()
+        before = fv.get_missing_stats()["hits"]
+        both = list(fv.iter_quick_and_full(codes))
+        hits = fv.get_missing_stats()["hits"] - before
+        if hits != 1: problems.append(f"ネガティブキャッシュのヒットが {hits} 回（1回のはず）")
+        if not any(code == codes[-1] and final for code, _, final in both): problems.append(f"{codes[-1]}: 本計算の結果が届かない")
+    finally:
+        fv.clear_cache()
+    return problems
+
+# ==========================================
+# 🗃️ 結果キャッシュのメモリ上限
+# ==========================================
+@check("result-cache-budget", "結果キャッシュは合計バイト数を上限以下に保ち、最後に使われたのが古い順に捨てる")
+def check_result_cache_budget() -> List[str]:
+    results = [r for r in make_bundle(400, seed=SEED + 17).values() if isinstance(r, fv.StockResult)]
+    sizes = [fv._result_nbytes(r) for r in results]
+    budget = sum(sizes[:20])  # 20件前後しか入らない上限
+    cache = fv._ResultCache(3600, budget)
+    problems = []
+    for i, result in enumerate(results):
+        cache.put(f"{i:04d}", result)
+        # 最初の1件は使い続ける（LRU なら追い出されない）
+        if cache.get("0000") is None: problems.append(f"{i} 件目: ずっと使っている 0000 が追い出された")
+        if cache.bytes > budget: problems.append(f"{i} 件目: {cache.bytes:,} バイト > 上限 {budget:,}")
+        if problems: break
+    stats = cache.stats()
+    kept = [code for code in (f"{i:04d}" for i in range(len(results))) if cache.peek(code) is not None]
+    if cache.bytes != sum(sizes[int(code)] for code in kept): problems.append(f"bytes {cache.bytes:,} が残っている {len(kept)} 件の合計と違う")
+    if not stats["evictions"]: problems.append("上限を超えても1件も捨てていない")
+    if cache.peek(f"{len(results) - 1:04d}") is None: problems.append("最後に入れた1件が残っていない")
+    # 1件で上限を超えるものは入れない（入れると他が全部追い出される）
+    cache.put("huge", fv.StockResult("huge", name="x" * (budget + 1)))
+    if cache.peek("huge") is not None or cache.peek("0000") is None: problems.append("上限より大きい1件で中身が入れ替わった")
+    return problems
+
+# ==========================================
+# 🤝 同じ銘柄を同時に計算する時の相乗り
+# ==========================================
+@check("single-flight", "同じ銘柄を2つのセッションが同時に計算しても取得は1回")
+def check_single_flight() -> List[str]:
+    import threading
+    work = tempfile.mkdtemp(prefix="fuyaseru_verify_fixtures_")
+    codes = ["3300", "3301"]
+    write_fixtures(work, codes + ["3399"], seed=SEED + 16)  # 最後の1銘柄は日足なしなので使わない
+    # 応答を遅くして、2つ目のセッションが1つ目の取得中に来るようにする
+    provider = _counting_replay(work)
+    provider.latency = 0.3
+    fv.set_provider(provider)
+    fv.clear_cache()
+    problems = []
+    try:
+        list(fv.iter_fuyaseru_bundle([codes[0]]))
+        alone = len(provider.calls)  # 1セッションだけで計算した時のリクエスト数
+        del provider.calls[:]
+        before = fv.get_singleflight_stats()
+        gate = threading.Barrier(2)
+        results: List[Any] = [None, None]
+
+        def session(i: int) -> None:
+            gate.wait()
+            results[i] = dict(fv.iter_fuyaseru_bundle([codes[1]]))[codes[1]]
+
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(2)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        after = fv.get_singleflight_stats()
+        if len(provider.calls) != alone: problems.append(f"同時に2セッションで {len(provider.calls)} 回リクエスト（1セッションなら {alone} 回）")
+        if after["shared"] - before["shared"] != 1: problems.append(f"相乗りが {after['shared'] - before['shared']} 回（1回のはず）")
+        if results[0] is None or results[0] is not results[1]: problems.append("2つのセッションが同じ結果を受け取っていない")
+        if after["in_flight"]: problems.append(f"取得中のまま残った銘柄 {after['in_flight']}")
+    finally:
+        fv.clear_cache()
+    return problems
+
+# ==========================================
+# 📋 上場銘柄一覧（JPX の data_j.xls を Excel で CSV にしたもの）
+# ==========================================
+JPX_HEADER = ["日付", "コード", "銘柄名", "市場・商品区分", "33業種コード", "33業種区分", "17業種コード", "17業種区分", "規模コード", "規模区分"]
+JPX_ROWS = [
+    ["20261016", "1305", "ｉＦｒｅｅＥＴＦ　ＴＯＰＩＸ（年１回決算型）", "ETF・ETN", "-", "-", "-", "-", "-", "-"],
+    ["20261016", "7013", "ＩＨＩ", "プライム（内国株式）", "3600", "機械", "10", "機械", "4", "TOPIX Mid400"],
+    ["20261016", "7203", "トヨタ自動車", "プライム（内国株式）", "3700", "輸送用機器", "6", "自動車・輸送機", "1", "TOPIX Core30"],
+    ["20261016", "285A", "キオクシアホールディングス", "プライム（内国株式）", "3650", "電気機器", "9", "電機・精密", "-", "-"],
+    ["20261016", "8951", "日本ビルファンド投資法人", "REIT・ベンチャーファンド・カントリーファンド・インフラファンド", "-", "-", "-", "-", "-", "-"],
+]
+# コード → (銘柄名, ETF/REIT か, 業種)
+JPX_EXPECTED = {
+    "1305": ("iFreeETF TOPIX(年1回決算型)", True, None),
+    "7013": ("IHI", False, "機械"),
+    "7203": ("トヨタ自動車", False, "輸送用機器"),
+    "285A": ("キオクシアホールディングス", False, "電気機器"),
+    "8951": ("日本ビルファンド投資法人", True, None),
+}
+
+@check("master-cp932", "Shift_JIS（cp932）の JPX 形式の一覧を master.load で読める")
+def check_master_cp932() -> List[str]:
+    import master
+    path = os.path.join(tempfile.mkdtemp(prefix="fuyaseru_verify_master_"), "data_j.csv")
+    pd.DataFrame(JPX_ROWS, columns=JPX_HEADER).to_csv(path, index=False, encoding="cp932")
+    problems = []
+    index = master.load(path)
+    if sorted(index) != sorted(JPX_EXPECTED): problems.append(f"読めた銘柄 {sorted(index)}")
+    for code, (name, is_fund, sector) in JPX_EXPECTED.items():
+        listing = index.get(code)
+        if listing is None: continue
+        actual = (listing.name, listing.is_fund, listing.sector)
+        if actual != (name, is_fund, sector): problems.append(f"{code}: {actual} != {(name, is_fund, sector)}")
+    # アプリが参照する一覧として置いた時も同じように引ける
+    saved = master.MASTER_FILE
+    master.MASTER_FILE = path
+    try:
+        master.reload()
+        if master.is_listed("285A") is not True or master.is_listed("9999") is not False: problems.append("master.is_listed が一覧と合わない")
+    finally:
+        master.MASTER_FILE = saved
+        master.reload()
+    return problems
+
+# ==========================================
+# 🚫 存在しない銘柄のネガティブキャッシュ
+# ==========================================
+class _OutageYF:
+    """yfinance の代わり（hide_exceptions を切った時と同じく、失敗は例外で返す）。failures[symbol] が残っている間は失敗する。"""
+
+    def __init__(self, failures: Dict[str, List[Exception]], hists: Dict[str, pd.DataFrame], infos: Dict[str, Dict[str, Any]]):
+        outer = self
+        self.failures = failures
+        self.requests: Dict[str, int] = {}  # 銘柄ごとの history の呼び出し回数
+
+        class Ticker:
+            def __init__(self, symbol: str):
+                self.symbol = symbol
+                self.info = dict(infos.get(symbol[:4], {}))
+                self.fast_info = type("FastInfo", (), {"market_cap": self.info.get("marketCap")})()
+
+            def history(self, period: str = "6mo", **kwargs):
+                outer.requests[self.symbol] = outer.requests.get(self.symbol, 0) + 1
+                pending = outer.failures.get(self.symbol)
+                if pending: raise pending.pop(0)
+                return hists[self.symbol[:4]]
+
+        self.Ticker = Ticker
+
+    @staticmethod
+    def download(*args, **kwargs):
+        # 一括取得は全部失敗（個別取得に回る）
+        return pd.DataFrame()
+
+@check("missing-cache", "一時的な取得失敗はネガティブキャッシュに入らない（存在しない銘柄だけ入る）")
+def check_missing_cache() -> List[str]:
+    import providers
+    import requests
+    from bench import make_history, make_info
+    from yfinance.exceptions import YFDataException, YFPricesMissingError
+    rng = np.random.default_rng(SEED + 25)
+    if providers._yf().config.debug.hide_exceptions: return ["yfinance の hide_exceptions が有効のまま"]
+    codes = ["9001", "9002", "9003", "9004", "9005"]
+    maintenance = YFDataException("*** YAHOO! FINANCE IS CURRENTLY DOWN! ***")
+    failures = {
+        "9001.T": [maintenance] * fv.MAX_RETRIES,
+        "9002.T": [requests.exceptions.ConnectionError("connection reset")] * fv.MAX_RETRIES,
+        "9003.T": [YFPricesMissingError("9003.T", "(period=6mo)(Yahoo status_code = 503)")] * fv.MAX_RETRIES,
+        "9004.T": [YFPricesMissingError("9004.T", "(period=6mo)", yahoo_reason="No data found, symbol may be delisted")] * fv.MAX_RETRIES,
+        "9005.T": [maintenance],  # 1回だけ失敗して再試行で取れる
+    }
+    fake = _OutageYF(failures, {c: make_history(rng) for c in codes}, {c: make_info(rng, c) for c in codes})
+    saved_yf, saved_delay = providers.yf, fv.RETRY_DELAY
+    providers.yf, fv.RETRY_DELAY = fake, 0.0
+    problems = []
+    try:
+        fv.set_provider(providers.YahooProvider())
+        fv.clear_cache()
+        fv.local_store.clear_ohlcv()
+        got = fv.calc_fuyaseru_bundle(codes)
+        expect = {"9001": "error", "9002": "error", "9003": "error", "9004": "missing", "9005": "ok"}
+        for code, kind in expect.items():
+            res = got[code]
+            actual = "error" if res.is_error else "missing" if res.is_missing else "ok"
+            if actual != kind: problems.append(f"{code}: {kind} のはずが {actual}（{res.name}）")
+            if fv.is_known_missing(code) != (kind == "missing"):
+                problems.append(f"{code}: ネガティブキャッシュ {'に無い' if kind == 'missing' else 'に入った'}")
+        # 「データなし」は取得元の答えなので聞き直さない（リトライで枠を使わない）
+        if fake.requests.get("9004.T") != 1: problems.append(f"9004: データなしの銘柄に {fake.requests.get('9004.T')} 回リクエスト（1回のはず）")
+        if fake.requests.get("9005.T") != 2: problems.append(f"9005: 一時的な失敗の後 {fake.requests.get('9005.T')} 回リクエスト（再試行して2回のはず）")
+        # 障害が明けたら、一時的に失敗した銘柄はすぐ取り直せる
+        fake.failures.clear()
+        again = fv.calc_fuyaseru_bundle(["9001", "9002", "9003"])
+        problems += [f"{code}: 障害の後も取れない（{res.name}）" for code, res in again.items() if res.is_missing or res.is_error]
+    finally:
+        providers.yf, fv.RETRY_DELAY = saved_yf, saved_delay
+        fv.clear_cache()
+    return problems
+
+# ==========================================
+# ▶️ 実行
+# ==========================================
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if "--list" in args:
+        for name, title, _ in CHECKS: print(f"{name:<22}{title}")
+        return 0
+    unknown = set(args) - {name for name, _, _ in CHECKS}
+    if unknown:
+        print(f"そんな確認はありません: {' '.join(sorted(unknown))}（一覧は --list）")
+        return 2
+    failed = 0
+    for name, title, fn in CHECKS:
+        if args and name not in args: continue
+        t0 = time.perf_counter()
+        problems = fn()
+        status = "OK" if not problems else "NG"
+        print(f"[{status}] {name}  {title}  ({time.perf_counter() - t0:.1f} 秒)")
+        for line in problems: print(f"       {line}")
+        failed += bool(problems)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
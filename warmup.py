@@ -0,0 +1,77 @@
+"""起動直後の下準備（重いモジュールの先読み・先回り更新ワーカーの起動）と読み込み時間の計測。
+
+app.py はログイン画面を出すのに必要な streamlit だけを読み込み、残りはここで別スレッドから読み込む。
+ログインする頃には読み込みが終わっているので、ログイン後の最初の表示も待たされない。
+    python warmup.py    # 新しいプロセスで読み込み時間を計って表示する
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import importlib
+import sys
+import threading
+import time
+
+# 読み込む順番（前のモジュールが読み込んだ依存分は後ろのモジュールの時間に含まれない）
+HEAVY_MODULES = [
+    "numpy", "pandas", "requests", "yfinance", "plotly.graph_objects", "plotly.subplots",
+    "fair_value_calc_y4", "result_table", "charts", "screener", "scheduler",
+]
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_report: Dict[str, Any] = {"running": False, "started_at": None, "finished_at": None, "modules": []}
+
+def import_modules(modules: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """順番に読み込み、1つずつの所要時間（秒）を返す。読み込み済みのものは 0 秒・loaded=True。"""
+    rows = []
+    for name in (HEAVY_MODULES if modules is None else modules):
+        loaded = name in sys.modules
+        error = None
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        rows.append({"module": name, "seconds": time.perf_counter() - t0, "loaded": loaded, "error": error})
+    return rows
+
+def _run() -> None:
+    try:
+        for row in import_modules():
+            _report["modules"].append(row)
+        # 大引け後などに株価履歴・財務データ・計算結果を先回りで更新（プロセス内で1本だけ起動）
+        import scheduler
+        scheduler.start()
+    finally:
+        _report["running"] = False
+        _report["finished_at"] = time.time()
+
+def start() -> bool:
+    """下準備を別スレッドで1回だけ始める（2回目以降は何もしない）。"""
+    global _thread
+    with _lock:
+        if _thread is not None: return False
+        _report.update(running=True, started_at=time.time(), finished_at=None, modules=[])
+        _thread = threading.Thread(target=_run, name="fuyaseru-warmup", daemon=True)
+        _thread.start()
+        return True
+
+def wait(timeout: Optional[float] = None) -> None:
+    """下準備が終わるまで待つ（始まっていなければ何もしない）"""
+    if _thread is not None: _thread.join(timeout)
+
+def get_report() -> Dict[str, Any]:
+    report = dict(_report)
+    report["modules"] = list(_report["modules"])
+    report["total"] = sum(row["seconds"] for row in report["modules"])
+    return report
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    import streamlit  # noqa: F401  ログイン画面までに必ず必要な分
+    print(f"{'streamlit':>22}  {(time.perf_counter() - t0) * 1000:8.1f} ms  （ログイン画面までに必要）")
+    rows = import_modules()
+    for row in rows:
+        note = "  読み込み済み" if row["loaded"] else (f"  {row['error']}" if row["error"] else "")
+        print(f"{row['module']:>22}  {row['seconds'] * 1000:8.1f} ms{note}")
+    print(f"{'先読み合計':>18}  {sum(r['seconds'] for r in rows) * 1000:8.1f} ms")